@@ -0,0 +1,3 @@
+from .harness import *
+from .generators import *
+from . import editor_benchmarks
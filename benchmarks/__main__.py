@@ -0,0 +1,54 @@
+"""
+Run the benchmarks and write the results as JSON.
+
+    python -m benchmarks --profile quick --output results.json
+    python -m benchmarks --filter serialization --compare baseline.json
+"""
+import argparse
+import pathlib
+import sys
+
+import benchmarks
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[1])
+    parser.add_argument("--profile", choices=benchmarks.PROFILES, default="quick")
+    parser.add_argument("--filter", help="Only run benchmarks whose name (group.name) contains this")
+    parser.add_argument("--output", type=pathlib.Path, help="Write the report to this JSON file")
+    parser.add_argument("--compare", type=pathlib.Path, help="Compare with the report in this JSON file")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=None,
+        help="With --compare, fail if a benchmark is more than this ratio slower than the baseline",
+    )
+    args = parser.parse_args()
+
+    def progress(result: benchmarks.BenchmarkResult) -> None:
+        extra = " ".join(f"{name}={value:g}" for name, value in result.extra.items())
+        print(f"{result.group}.{result.name}: {result.median * 1e3:.3f} ms (±{result.stdev * 1e3:.3f}) {extra}")
+
+    profile = benchmarks.PROFILES[args.profile]
+    report = benchmarks.run_benchmarks(benchmarks.get_benchmarks(args.filter), profile, progress)
+    if args.output is not None:
+        args.output.write_text(report.json(indent=2))
+
+    if args.compare is not None:
+        baseline = benchmarks.Report.parse_file(args.compare)
+        if baseline.profile != profile:
+            print(f"Warning: the baseline was run with the {baseline.profile.name} profile", file=sys.stderr)
+        regressions = []
+        for comparison in benchmarks.compare(baseline, report):
+            times = f"{comparison.baseline:.3g}s -> {comparison.current:.3g}s"
+            print(f"{comparison.name}: {comparison.ratio:.2f}x ({times})")
+            if args.max_slowdown is not None and comparison.ratio > args.max_slowdown:
+                regressions.append(comparison.name)
+        if regressions:
+            print(f"Slower than the baseline: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""Benchmarks of model editing, serialization, the websocket protocol and broadcasting to collaborators."""
+import json
+import logging
+import pathlib
+import random
+import tempfile
+
+import websockets.frames
+from websockets.legacy.protocol import State
+
+from benchmarks import generators
+from benchmarks.harness import Profile, benchmark
+from src.editor import collaboration
+from src.editor import commands
+from src.editor import encodings
+from src.editor import process_model_controller
+from src.process_model import petri_net
+from src.process_model import process_model
+
+
+class FakeWebSocket:
+    """
+    Stands in for a connected client. Broadcast messages are framed as on a real connection, and the frames are
+    counted instead of written to a socket.
+    """
+
+    def __init__(self, port: int) -> None:
+        self.remote_address = ("127.0.0.1", port)
+        self.state = State.OPEN
+        self.logger = logging.getLogger(__name__)
+        self._fragmented_message_waiter = None
+        self.bytes_received = 0
+
+    def write_frame_sync(self, fin: bool, opcode: websockets.frames.Opcode, data: bytes) -> None:
+        self.bytes_received += len(websockets.frames.Frame(opcode, data, fin).serialize(mask=False))
+
+    async def send(self, message: str | bytes) -> None:
+        self.write_frame_sync(True, *websockets.frames.prepare_data(message))
+
+
+def controller(nodes: int) -> process_model_controller.ProcessModelController:
+    return process_model_controller.ProcessModelController(generators.petri_net_model(nodes))
+
+
+def session_with_clients(
+    profile: Profile, encoding: encodings.Encoding = "json"
+) -> tuple[collaboration.EditorSession, list[FakeWebSocket]]:
+    session = collaboration.EditorSession(generators.petri_net_model(profile.nodes))
+    clients = [FakeWebSocket(port) for port in range(profile.clients)]
+    session._collaborators.update(clients)
+    session._spectators.update(clients)
+    session._encodings.update(dict.fromkeys(clients, encoding))
+    return session, clients
+
+
+@benchmark("model")
+def create_and_undo_node(profile: Profile, extra: dict[str, float]):
+    # Half full, since new node ids are drawn at random below ProcessModel.MAX_NODES.
+    model_controller = controller(profile.nodes // 2)
+    node_kwargs = {"node_type": petri_net.NodeType.PLACE}
+
+    def operation():
+        model_controller.execute(commands.CreateNodeCommand(x=0, y=0, node_kwargs=node_kwargs))
+        model_controller.undo()
+
+    return operation
+
+
+@benchmark("model", setup_each=True)
+def delete_node(profile: Profile, extra: dict[str, float]):
+    model_controller = controller(profile.nodes)
+    return lambda: model_controller.execute(commands.DeleteNodeCommand(node_id=profile.nodes // 2))
+
+
+@benchmark("model")
+def move_node(profile: Profile, extra: dict[str, float]):
+    model_controller = controller(profile.nodes)
+    rng = random.Random(0)
+    return lambda: model_controller.execute(
+        commands.MoveNodeCommand(node_id=rng.randrange(profile.nodes), x=rng.random(), y=rng.random())
+    )
+
+
+@benchmark("model")
+def undo_redo(profile: Profile, extra: dict[str, float]):
+    model_controller = controller(profile.nodes)
+    model_controller.execute(commands.MoveNodeCommand(node_id=0, x=1, y=1))
+
+    def operation():
+        model_controller.undo()
+        model_controller.redo()
+
+    return operation
+
+
+@benchmark("model")
+def bulk_update_inspectables(profile: Profile, extra: dict[str, float]):
+    model_controller = controller(profile.nodes)
+    node_ids = list(range(0, profile.nodes, 2))
+    return lambda: model_controller.execute(
+        commands.BulkUpdateInspectablesCommand(node_ids=node_ids, node_kwargs={"ball_count": 1})
+    )
+
+
+@benchmark("serialization")
+def serialize_petri_net(profile: Profile, extra: dict[str, float]):
+    return generators.petri_net_model(profile.nodes)._serialize_to_dict
+
+
+@benchmark("serialization")
+def serialize_dcr_graph(profile: Profile, extra: dict[str, float]):
+    return generators.dcr_graph_model(profile.nodes)._serialize_to_dict
+
+
+@benchmark("serialization")
+def serialize_flowchart(profile: Profile, extra: dict[str, float]):
+    return generators.flowchart_model(profile.nodes)._serialize_to_dict
+
+
+@benchmark("serialization")
+def content_hash(profile: Profile, extra: dict[str, float]):
+    return generators.petri_net_model(profile.nodes).content_hash
+
+
+@benchmark("serialization")
+def save_large_model(profile: Profile, extra: dict[str, float]):
+    model = generators.petri_net_model(profile.large_nodes)
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as directory:
+        path = pathlib.Path(directory) / "model.pm"
+
+        def operation():
+            model.save(path)
+            extra["file_bytes"] = path.stat().st_size
+
+        yield operation
+
+
+@benchmark("serialization")
+def load_large_model(profile: Profile, extra: dict[str, float]):
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as directory:
+        path = pathlib.Path(directory) / "model.pm"
+        generators.petri_net_model(profile.large_nodes).save(path)
+        extra["file_bytes"] = path.stat().st_size
+        yield lambda: process_model.load_model(path)
+
+
+@benchmark("protocol")
+def parse_move_request(profile: Profile, extra: dict[str, float]):
+    command = {"command_type": "move_node", "node_id": 1, "x": 2, "y": 3}
+    message = json.dumps({"request": {"request_type": "execute_command", "command": command}})
+    return lambda: collaboration.decode_request(message)
+
+
+@benchmark("protocol")
+def parse_bulk_update_request(profile: Profile, extra: dict[str, float]):
+    command = {"command_type": "bulk_update_inspectables", "node_ids": list(range(profile.nodes)), "node_kwargs": {}}
+    message = json.dumps({"request": {"request_type": "execute_command", "command": command}})
+    extra["message_bytes"] = len(message)
+    return lambda: collaboration.decode_request(message)
+
+
+def encode_model_event(profile: Profile, extra: dict[str, float], encoding: encodings.Encoding):
+    model = generators.petri_net_model(profile.nodes)
+
+    def operation():
+        return encodings.encode(dict(collaboration.UpdateModelEvent.from_model(model)), encoding)
+
+    extra["message_bytes"] = len(operation())
+    return operation
+
+
+def broadcast_model(profile: Profile, extra: dict[str, float], encoding: encodings.Encoding):
+    session, clients = session_with_clients(profile, encoding)
+    extra["clients"] = len(clients)
+
+    def operation():
+        received = clients[0].bytes_received
+        session.broadcast_state()
+        extra["bytes_per_client"] = clients[0].bytes_received - received
+
+    return operation
+
+
+@benchmark("protocol")
+def update_model_event(profile: Profile, extra: dict[str, float]):
+    return encode_model_event(profile, extra, "json")
+
+
+@benchmark("collaboration")
+def broadcast_state(profile: Profile, extra: dict[str, float]):
+    return broadcast_model(profile, extra, "json")
+
+
+if encodings.msgpack is not None:
+
+    @benchmark("protocol")
+    def update_model_event_msgpack(profile: Profile, extra: dict[str, float]):
+        return encode_model_event(profile, extra, "msgpack")
+
+    @benchmark("collaboration")
+    def broadcast_state_msgpack(profile: Profile, extra: dict[str, float]):
+        return broadcast_model(profile, extra, "msgpack")
+
+
+@benchmark("collaboration")
+def broadcast_nodes(profile: Profile, extra: dict[str, float]):
+    session, clients = session_with_clients(profile)
+    extra["clients"] = len(clients)
+    return lambda: session.broadcast_nodes([process_model.NodeId(0)])
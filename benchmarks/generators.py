@@ -0,0 +1,93 @@
+"""Synthetic process models of configurable size."""
+import random
+
+from src.process_model import dcr_graph
+from src.process_model import flowchart
+from src.process_model import petri_net
+from src.process_model import process_model
+
+
+def _position(rng: random.Random) -> process_model.Point:
+    return process_model.Point(x=rng.uniform(0, 2000), y=rng.uniform(0, 2000))
+
+
+def petri_net_model(nodes: int, arcs_per_transition: int = 2, seed: int = 0) -> petri_net.PetriNet:
+    """A Petri net of `nodes` nodes, half places and half transitions, with random arcs in and out of transitions."""
+    rng = random.Random(seed)
+    model = petri_net.PetriNet(id=f"petri_net_{nodes}", model_type=process_model.ProcessModelType.PETRI_NET)
+    places, transitions = [], []
+    for node_id in range(nodes):
+        node_type = petri_net.NodeType.PLACE if node_id % 2 == 0 else petri_net.NodeType.TRANSITION
+        (places if node_type == petri_net.NodeType.PLACE else transitions).append(node_id)
+        model.add_node(
+            petri_net.PetriNetNode(
+                id=process_model.NodeId(node_id),
+                position=_position(rng),
+                name=f"{node_type.value} {node_id}",
+                node_type=node_type,
+                ball_count=rng.randrange(3) if node_type == petri_net.NodeType.PLACE else 0,
+            )
+        )
+    for transition in transitions:
+        for _ in range(arcs_per_transition):
+            model.edges.add(petri_net.PetriNetEdge(start_node_id=rng.choice(places), end_node_id=transition))
+            model.edges.add(petri_net.PetriNetEdge(start_node_id=transition, end_node_id=rng.choice(places)))
+    return model
+
+
+def dcr_graph_model(nodes: int, relations_per_event: int = 2, seed: int = 0) -> dcr_graph.DcrGraph:
+    """A DCR graph of `nodes` events with random relations of random types."""
+    rng = random.Random(seed)
+    model = dcr_graph.DcrGraph(id=f"dcr_graph_{nodes}", model_type=process_model.ProcessModelType.DCR_GRAPH)
+    for node_id in range(nodes):
+        model.add_node(
+            dcr_graph.DcrGraphNode(
+                id=process_model.NodeId(node_id),
+                position=_position(rng),
+                name=f"event {node_id}",
+                pending=rng.random() < 0.1,
+                included=rng.random() < 0.9,
+            )
+        )
+    relation_types = list(dcr_graph.DcrRelationType)
+    for node_id in range(nodes):
+        for _ in range(relations_per_event):
+            model.edges.add(
+                dcr_graph.DcrGraphEdge(
+                    start_node_id=node_id, end_node_id=rng.randrange(nodes), relation_type=rng.choice(relation_types)
+                )
+            )
+    return model
+
+
+def flowchart_model(nodes: int, branching: int = 2, seed: int = 0) -> flowchart.Flowchart:
+    """A flowchart from a start node to an end node, where every other task is a decision with forward branches."""
+    rng = random.Random(seed)
+    model = flowchart.Flowchart(id=f"flowchart_{nodes}", model_type=process_model.ProcessModelType.FLOWCHART)
+    for node_id in range(nodes):
+        if node_id == 0:
+            node_type = flowchart.FlowchartNodeType.START
+        elif node_id == nodes - 1:
+            node_type = flowchart.FlowchartNodeType.END
+        elif node_id % 2 == 0:
+            node_type = flowchart.FlowchartNodeType.DECISION
+        else:
+            node_type = flowchart.FlowchartNodeType.TASK
+        model.add_node(
+            flowchart.FlowchartNode(
+                id=process_model.NodeId(node_id),
+                position=_position(rng),
+                name=f"{node_type.value} {node_id}",
+                node_type=node_type,
+                duration=rng.expovariate(1.0),
+            )
+        )
+    for node_id in range(nodes - 1):
+        successors = {node_id + 1}
+        if model.nodes[node_id].node_type == flowchart.FlowchartNodeType.DECISION:
+            successors.update(rng.randrange(node_id + 1, nodes) for _ in range(branching - 1))
+        for successor in successors:
+            model.edges.add(
+                flowchart.FlowchartEdge(start_node_id=node_id, end_node_id=successor, probability=rng.random())
+            )
+    return model
@@ -0,0 +1,186 @@
+import contextlib
+import datetime
+import gc
+import inspect
+import platform
+import statistics
+import subprocess
+import time
+import timeit
+from typing import Callable, Iterator
+
+import pydantic
+
+
+class Profile(pydantic.BaseModel):
+    name: str
+    # Nodes of the models edited, serialized and broadcast.
+    nodes: int
+    # Nodes of the models saved and loaded.
+    large_nodes: int
+    # Clients a session broadcasts to.
+    clients: int
+    repeat: int
+
+
+PROFILES = {
+    "quick": Profile(name="quick", nodes=500, large_nodes=5_000, clients=20, repeat=3),
+    # About 50 MB when saved.
+    "full": Profile(name="full", nodes=10_000, large_nodes=130_000, clients=200, repeat=5),
+}
+
+
+class BenchmarkResult(pydantic.BaseModel):
+    name: str
+    group: str
+    repeat: int
+    # Operations timed per repetition.
+    number: int
+    # Seconds per operation of each repetition.
+    times: list[float]
+    min: float
+    median: float
+    mean: float
+    stdev: float
+    # Other measurements of the benchmark, like sizes in bytes.
+    extra: dict[str, float] = {}
+
+
+class Report(pydantic.BaseModel):
+    commit: str | None
+    python: str
+    platform: str
+    created: datetime.datetime
+    profile: Profile
+    results: list[BenchmarkResult]
+
+
+# A benchmark prepares its state for a profile, records extra measurements in the dict, and returns the operation.
+# Benchmarks whose state needs cleaning up, like temporary files, yield the operation instead, and are resumed to clean
+# up once it has been timed.
+BenchmarkFunction = Callable[[Profile, dict[str, float]], Callable[[], object] | Iterator[Callable[[], object]]]
+
+
+class Benchmark:
+    def __init__(self, function: BenchmarkFunction, group: str, setup_each: bool) -> None:
+        self.function = function
+        self.name = function.__name__
+        self.group = group
+        self.setup_each = setup_each
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.group}.{self.name}"
+
+    @contextlib.contextmanager
+    def _prepare(self, profile: Profile, extra: dict[str, float]) -> Iterator[Callable[[], object]]:
+        prepared = self.function(profile, extra)
+        if not inspect.isgenerator(prepared):
+            yield prepared
+            return
+        with contextlib.closing(prepared):
+            yield next(prepared)
+
+    def run(self, profile: Profile) -> BenchmarkResult:
+        """
+        Time the operation. Benchmarks with `setup_each` change their state, so it is prepared again before every
+        repetition and the operation is timed once. Otherwise the operation is repeated as often as needed for a
+        reliable timing, as `timeit` does.
+        """
+        extra: dict[str, float] = {}
+        if self.setup_each:
+            number, times = 1, []
+            for _ in range(profile.repeat):
+                with self._prepare(profile, extra) as operation:
+                    gc.collect()
+                    gc.disable()
+                    try:
+                        start = time.perf_counter()
+                        operation()
+                        times.append(time.perf_counter() - start)
+                    finally:
+                        gc.enable()
+        else:
+            with self._prepare(profile, extra) as operation:
+                timer = timeit.Timer(operation)
+                number, _ = timer.autorange()
+                times = [total / number for total in timer.repeat(profile.repeat, number)]
+        return BenchmarkResult(
+            name=self.name,
+            group=self.group,
+            repeat=profile.repeat,
+            number=number,
+            times=times,
+            min=min(times),
+            median=statistics.median(times),
+            mean=statistics.fmean(times),
+            stdev=statistics.stdev(times) if len(times) > 1 else 0.0,
+            extra=extra,
+        )
+
+
+_benchmarks: list[Benchmark] = []
+
+
+def benchmark(group: str, setup_each: bool = False) -> Callable[[BenchmarkFunction], BenchmarkFunction]:
+    def register(function: BenchmarkFunction) -> BenchmarkFunction:
+        _benchmarks.append(Benchmark(function, group, setup_each))
+        return function
+
+    return register
+
+
+def get_benchmarks(pattern: str | None = None) -> list[Benchmark]:
+    """Registered benchmarks whose full name (`group.name`) contains `pattern`."""
+    return [bench for bench in _benchmarks if pattern is None or pattern in bench.full_name]
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    benchmarks: list[Benchmark], profile: Profile, progress: Callable[[BenchmarkResult], None] | None = None
+) -> Report:
+    results = []
+    for bench in benchmarks:
+        result = bench.run(profile)
+        if progress is not None:
+            progress(result)
+        results.append(result)
+    return Report(
+        commit=current_commit(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        created=datetime.datetime.now(datetime.timezone.utc),
+        profile=profile,
+        results=results,
+    )
+
+
+class Comparison(pydantic.BaseModel):
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+
+def compare(baseline: Report, current: Report) -> list[Comparison]:
+    """Compare the median times of the benchmarks that are in both reports."""
+    baseline_results = {f"{result.group}.{result.name}": result for result in baseline.results}
+    comparisons = []
+    for result in current.results:
+        full_name = f"{result.group}.{result.name}"
+        if full_name in baseline_results:
+            comparisons.append(
+                Comparison(name=full_name, baseline=baseline_results[full_name].median, current=result.median)
+            )
+    return comparisons
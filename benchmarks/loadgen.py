@@ -0,0 +1,432 @@
+"""
+Load test of the collaborative editor's websocket server.
+
+    python -m benchmarks.loadgen --start-server --sessions 10 --collaborators 5 --watchers 15 --duration 30
+
+Every session edits its own generated Petri net. Collaborators join the session and replay a scripted stream of
+edits (drags, node creations, undo and redo), and watchers only receive the broadcasts. The clients are split over
+`--processes` processes of asyncio clients, so the load generator does not become the bottleneck itself.
+
+Drags put the time they were sent in the x coordinate of the dragged node, and every client that receives a model
+or nodes with a newer time for one of the dragged nodes records the latency from command to broadcast. The times
+are from the monotonic clock, which is shared between processes on the same machine.
+
+With `--encoding msgpack`, the clients send and receive MessagePack instead of JSON, and with `--operations` they
+receive the operations of edits instead of the changed model or nodes. With `--relay-url ws://localhost:8002`,
+watchers connect to the spectator relay instead of the editor server, and `--start-server` starts main_relay.py too.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import pathlib
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import urllib.parse
+from typing import Callable, Iterator, Literal
+
+import pydantic
+import websockets
+import websockets.exceptions
+
+from benchmarks import generators
+from benchmarks.harness import current_commit
+from src.editor import collaboration
+from src.editor import commands
+from src.editor import encodings
+from src.process_model import petri_net
+from src.process_model import process_model
+
+# Relative frequency of the gestures of a collaborator.
+GESTURE_WEIGHTS = {"drag": 8, "create": 1, "undo": 2, "redo": 1}
+# Moves sent by a drag.
+DRAG_STEPS = (5, 30)
+# Time allowed for the broadcasts of the last commands to arrive.
+GRACE_PERIOD = 1.0
+
+RequestFactory = Callable[[float], pydantic.BaseModel]
+
+
+class LoadConfig(pydantic.BaseModel):
+    url: str = "ws://localhost:8001"
+    sessions: int = 1
+    # Clients per session.
+    collaborators: int = 5
+    watchers: int = 15
+    nodes: int = 100
+    # Commands per second of each collaborator.
+    rate: float = 10.0
+    duration: float = 30.0
+    # Seconds over which the clients connect before the measurement starts.
+    ramp_up: float = 5.0
+    processes: int = 1
+    seed: int = 0
+    encoding: encodings.Encoding = "json"
+    operations: bool = False
+    # Where watchers connect, the editor server if None.
+    relay_url: str | None = None
+
+
+class Client(pydantic.BaseModel):
+    index: int
+    model_path: str
+    # The node this client drags, or None for a watcher.
+    node_id: process_model.NodeId | None
+    # The nodes dragged in the client's session.
+    dragged_nodes: list[process_model.NodeId]
+
+
+class ClientStats(pydantic.BaseModel):
+    # Seconds from drag to broadcast, as received by every client of the session.
+    latencies: list[float] = []
+    # The same, as received by the client that sent the drag.
+    own_latencies: list[float] = []
+    commands: int = 0
+    events: int = 0
+    bytes_received: int = 0
+    disconnects: int = 0
+    # Fraction of the wall time the process spent on the CPU.
+    cpu: float = 0.0
+
+
+class Latency(pydantic.BaseModel):
+    samples: int
+    p50: float
+    p99: float
+    max: float
+
+    @classmethod
+    def of(cls, samples: list[float]) -> "Latency | None":
+        if len(samples) < 2:
+            return None
+        quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+        return cls(samples=len(samples), p50=quantiles[49], p99=quantiles[98], max=max(samples))
+
+
+class LoadReport(pydantic.BaseModel):
+    commit: str | None
+    config: LoadConfig
+    commands_per_second: float
+    events_per_second: float
+    bytes_per_second: float
+    latency: Latency | None
+    own_latency: Latency | None
+    disconnects: int
+    # Highest CPU use of a load generator process. Near 1.0 the generator itself limits the load.
+    client_cpu: float
+    # Resident memory of the server, if it runs on this machine.
+    server_memory_start: int | None
+    server_memory_peak: int | None
+    server_memory_end: int | None
+
+
+def _move(node_id: process_model.NodeId, y: float, now: float) -> collaboration.ExecuteCommandRequest:
+    return collaboration.ExecuteCommandRequest(
+        request_type="execute_command", command=commands.MoveNodeCommand(node_id=node_id, x=now, y=y)
+    )
+
+
+def _create(x: float, y: float, now: float) -> collaboration.ExecuteCommandRequest:
+    return collaboration.ExecuteCommandRequest(
+        request_type="execute_command",
+        command=commands.CreateNodeCommand(x=x, y=y, node_kwargs={"node_type": petri_net.NodeType.PLACE}),
+    )
+
+
+def edit_script(rng: random.Random, node_id: process_model.NodeId) -> Iterator[RequestFactory]:
+    """An endless stream of edits by a collaborator. Each edit is built with the time it is sent."""
+    gestures, weights = list(GESTURE_WEIGHTS), list(GESTURE_WEIGHTS.values())
+    while True:
+        match rng.choices(gestures, weights)[0]:
+            case "drag":
+                y = rng.uniform(0, 2000)
+                for step in range(rng.randint(*DRAG_STEPS)):
+                    yield functools.partial(_move, node_id, y + step)
+            case "create":
+                yield functools.partial(_create, rng.uniform(0, 2000), rng.uniform(0, 2000))
+            case "undo":
+                yield lambda now: collaboration.UndoRequest(request_type="undo")
+            case "redo":
+                yield lambda now: collaboration.RedoRequest(request_type="redo")
+
+
+async def _receive(
+    websocket: websockets.WebSocketClientProtocol, client: Client, stats: ClientStats, measure_from: float
+) -> None:
+    # Positions before the run, and those restored by undo, are older than the newest drag seen.
+    newest = dict.fromkeys(client.dragged_nodes, measure_from)
+    async for message in websocket:
+        received = time.monotonic()
+        if received < measure_from:
+            continue
+        stats.events += 1
+        stats.bytes_received += len(message)
+        event = encodings.decode(message)
+        match event["event_type"]:
+            case "update_model":
+                nodes = event["model"]["nodes"]
+            case "update_nodes":
+                nodes = event["nodes"]
+            case "operations":
+                nodes = {
+                    operation["node_id"]: operation["fields"]
+                    for operation in event["operations"]
+                    if "position" in operation.get("fields", {})
+                }
+            case _:
+                continue
+        for node_id in client.dragged_nodes:
+            # JSON turns the keys of nodes into strings, MessagePack keeps them.
+            node = nodes.get(node_id, nodes.get(str(node_id)))
+            if node is None or node["position"]["x"] <= newest[node_id]:
+                continue
+            newest[node_id] = node["position"]["x"]
+            stats.latencies.append(received - newest[node_id])
+            if node_id == client.node_id:
+                stats.own_latencies.append(received - newest[node_id])
+
+
+def _encode(request: pydantic.BaseModel, encoding: encodings.Encoding) -> str | bytes:
+    return encodings.encode({"request": dict(request)}, encoding)
+
+
+async def _edit(
+    websocket: websockets.WebSocketClientProtocol,
+    script: Iterator[RequestFactory],
+    encoding: encodings.Encoding,
+    rate: float,
+    stats: ClientStats,
+    start: float,
+    stop: float,
+) -> None:
+    await asyncio.sleep(start - time.monotonic())
+    for i, request in enumerate(script):
+        send_at = start + i / rate
+        if send_at >= stop:
+            return
+        await asyncio.sleep(send_at - time.monotonic())
+        await websocket.send(_encode(request(time.monotonic()), encoding))
+        stats.commands += 1
+
+
+async def run_client(
+    config: LoadConfig, client: Client, stats: ClientStats, connect_at: float, measure_from: float, stop: float
+) -> None:
+    await asyncio.sleep(connect_at - time.monotonic())
+    try:
+        url = config.relay_url if client.node_id is None and config.relay_url is not None else config.url
+        async with websockets.connect(url, max_size=None) as websocket:
+            if client.node_id is None:
+                request = collaboration.WatchSessionRequest(
+                    request_type="watch_session",
+                    model_id=client.model_path,
+                    encoding=config.encoding,
+                    operations=config.operations,
+                )
+            else:
+                request = collaboration.JoinSessionRequest(
+                    request_type="join_session",
+                    model_id=client.model_path,
+                    encoding=config.encoding,
+                    operations=config.operations,
+                )
+            await websocket.send(_encode(request, config.encoding))
+
+            async with asyncio.TaskGroup() as tasks:
+                receiver = tasks.create_task(_receive(websocket, client, stats, measure_from))
+                if client.node_id is not None:
+                    script = edit_script(random.Random(config.seed + client.index), client.node_id)
+                    # Spread the collaborators' commands over the interval between commands.
+                    start = measure_from + random.Random(client.index).random() / config.rate
+                    await _edit(websocket, script, config.encoding, config.rate, stats, start, stop)
+                await asyncio.sleep(stop + GRACE_PERIOD - time.monotonic())
+                receiver.cancel()
+    except* (OSError, websockets.exceptions.WebSocketException):
+        stats.disconnects += 1
+
+
+async def run_clients(config: LoadConfig, clients: list[Client]) -> ClientStats:
+    stats = ClientStats()
+    now = time.monotonic()
+    measure_from, stop = now + config.ramp_up, now + config.ramp_up + config.duration
+    await asyncio.gather(
+        *(
+            run_client(config, client, stats, now + config.ramp_up * i / len(clients), measure_from, stop)
+            for i, client in enumerate(clients)
+        )
+    )
+    return stats
+
+
+def run_process(config: LoadConfig, clients: list[Client]) -> ClientStats:
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    stats = asyncio.run(run_clients(config, clients))
+    stats.cpu = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+    return stats
+
+
+def create_sessions(config: LoadConfig, directory: pathlib.Path) -> list[Client]:
+    """Save a model for every session and assign the clients to them."""
+    clients = []
+    index = itertools.count()
+    dragged_nodes = [process_model.NodeId(i) for i in range(config.collaborators)]
+    for session in range(config.sessions):
+        model = generators.petri_net_model(max(config.nodes, config.collaborators), seed=config.seed + session)
+        # Models are opened by id, so every run and session needs its own.
+        model.id = process_model.ModelId(f"{directory.name}-{session}")
+        path = directory / f"{model.id}.json"
+        model.save(path)
+        for node_id in [*dragged_nodes, *[None] * config.watchers]:
+            clients.append(
+                Client(index=next(index), model_path=str(path), node_id=node_id, dragged_nodes=dragged_nodes)
+            )
+    return clients
+
+
+def resident_memory(pid: int) -> int | None:
+    """Resident memory of a local process in bytes, where /proc is available."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def start_server(url: str, script: str = "main_ws.py", timeout: float = 10.0) -> subprocess.Popen:
+    """Start a websocket server of this checkout and wait until it accepts connections."""
+    server = subprocess.Popen(
+        [sys.executable, script],
+        cwd=pathlib.Path(__file__).parent.parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    address = urllib.parse.urlparse(url)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((address.hostname, address.port or 80), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError(f"The websocket server did not start listening on {url}")
+            time.sleep(0.1)
+
+
+def run(config: LoadConfig, server_pid: int | None = None) -> LoadReport:
+    with tempfile.TemporaryDirectory(prefix="loadgen-") as directory:
+        clients = create_sessions(config, pathlib.Path(directory))
+        memory = [resident_memory(server_pid)] if server_pid is not None else []
+        with concurrent.futures.ProcessPoolExecutor(config.processes) as executor:
+            futures = [
+                executor.submit(run_process, config, clients[process :: config.processes])
+                for process in range(config.processes)
+            ]
+            while concurrent.futures.wait(futures, timeout=0.5).not_done:
+                if server_pid is not None:
+                    memory.append(resident_memory(server_pid))
+            results = [future.result() for future in futures]
+        if server_pid is not None:
+            memory.append(resident_memory(server_pid))
+
+    stats = ClientStats()
+    for result in results:
+        stats.latencies.extend(result.latencies)
+        stats.own_latencies.extend(result.own_latencies)
+        stats.commands += result.commands
+        stats.events += result.events
+        stats.bytes_received += result.bytes_received
+        stats.disconnects += result.disconnects
+    sampled = [sample for sample in memory if sample is not None]
+    return LoadReport(
+        commit=current_commit(),
+        config=config,
+        commands_per_second=stats.commands / config.duration,
+        events_per_second=stats.events / config.duration,
+        bytes_per_second=stats.bytes_received / config.duration,
+        latency=Latency.of(stats.latencies),
+        own_latency=Latency.of(stats.own_latencies),
+        disconnects=stats.disconnects,
+        client_cpu=max(result.cpu for result in results),
+        server_memory_start=memory[0] if memory else None,
+        server_memory_peak=max(sampled, default=None),
+        server_memory_end=memory[-1] if memory else None,
+    )
+
+
+def print_report(report: LoadReport) -> None:
+    config = report.config
+    print(
+        f"{config.sessions} sessions of {config.collaborators} collaborators and {config.watchers} watchers, "
+        f"{config.nodes} nodes, {config.rate:g} commands per second per collaborator"
+    )
+    print(
+        f"commands: {report.commands_per_second:.1f}/s, events: {report.events_per_second:.1f}/s, "
+        f"received: {report.bytes_per_second / 1e6:.2f} MB/s, disconnects: {report.disconnects}"
+    )
+    for name, latency in [("latency", report.latency), ("own latency", report.own_latency)]:
+        if latency is not None:
+            print(
+                f"{name}: p50 {latency.p50 * 1e3:.1f} ms, p99 {latency.p99 * 1e3:.1f} ms, "
+                f"max {latency.max * 1e3:.1f} ms ({latency.samples} samples)"
+            )
+    if report.server_memory_peak is not None:
+        print(
+            f"server memory: {report.server_memory_start / 1e6:.1f} MB at start, "
+            f"{report.server_memory_peak / 1e6:.1f} MB peak, {report.server_memory_end / 1e6:.1f} MB at end"
+        )
+    if report.client_cpu > 0.9:
+        print(f"Warning: a load generator process used {report.client_cpu:.0%} CPU, use more --processes")
+
+
+def main() -> int:
+    defaults = LoadConfig()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen", description=__doc__.splitlines()[1])
+    for name, field in LoadConfig.__fields__.items():
+        if typing.get_origin(field.type_) is Literal:
+            options = {"choices": typing.get_args(field.type_)}
+        elif field.type_ is bool:
+            options = {"action": argparse.BooleanOptionalAction}
+        else:
+            options = {"type": field.type_}
+        parser.add_argument(f"--{name.replace('_', '-')}", default=getattr(defaults, name), **options)
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument(
+        "--start-server",
+        action="store_true",
+        help="Start main_ws.py, and main_relay.py with --relay-url, and stop them afterwards",
+    )
+    server.add_argument("--server-pid", type=int, help="Report the memory of this server process")
+    parser.add_argument("--output", type=pathlib.Path, help="Write the report to this JSON file")
+    args = parser.parse_args()
+    config = LoadConfig(**{name: getattr(args, name) for name in LoadConfig.__fields__})
+
+    processes = []
+    try:
+        if args.start_server:
+            processes.append(start_server(config.url))
+            if config.relay_url is not None:
+                processes.append(start_server(config.relay_url, "main_relay.py"))
+        report = run(config, processes[0].pid if processes else args.server_pid)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    print_report(report)
+    if args.output is not None:
+        args.output.write_text(report.json(indent=2))
+    return 0 if report.disconnects == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
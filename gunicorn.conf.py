@@ -0,0 +1,5 @@
+def post_worker_init(worker) -> None:
+    """Start the simulation workers and the admin endpoints in the worker, which holds the simulations."""
+    import src.server
+
+    src.server.start()
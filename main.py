@@ -1,8 +1,11 @@
-import logging
-import src.server
+import werkzeug.serving
 
-logging.basicConfig(level=logging.INFO)
+import src.server
 
 if __name__ == "__main__":
     app = src.server.app
+    # The reloader runs the app in a child process and only watches the files itself, so only the child starts the
+    # simulation workers and the admin endpoints.
+    if werkzeug.serving.is_running_from_reloader():
+        src.server.start()
     app.run(debug=True)
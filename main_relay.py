@@ -0,0 +1,40 @@
+import asyncio
+import functools
+import os
+import signal
+import websockets
+
+from src import logs
+from src import metrics
+from src.editor import encodings
+from src.editor import relay
+
+
+async def main():
+    logs.configure(os.environ.get("LOG_LEVEL", "INFO"))
+    # Set the stop condition when receiving SIGTERM.
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    loop.add_signal_handler(signal.SIGTERM, stop.set_result, None)
+    handler = functools.partial(
+        relay.handler,
+        upstream_url=os.environ.get("UPSTREAM_URL", "ws://localhost:8001"),
+        tick=float(os.environ.get("RELAY_TICK", 0.1)),
+    )
+    # Without compression by default, since a compressed frame is compressed for every spectator instead of once.
+    async with websockets.serve(
+        handler,
+        "0.0.0.0",
+        int(os.environ.get("RELAY_PORT", 8002)),
+        compression=None,
+        extensions=encodings.deflate_extensions(default_level=0),
+    ):
+        # Not authenticated, so only served on other interfaces than loopback when asked to.
+        admin_handlers = {"/admin/logging": logs.admin_handler}
+        admin_host, admin_port = os.environ.get("ADMIN_HOST", "127.0.0.1"), int(os.environ.get("METRICS_PORT", 9102))
+        async with await metrics.serve(admin_host, admin_port, handlers=admin_handlers):
+            await stop
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,20 +1,43 @@
 import asyncio
-import logging
+import os
 import signal
 import websockets
 
 import src.editor
+from src import logs
+from src import metrics
+from src.editor import encodings
 
-logging.basicConfig(level=logging.INFO)
+
+def session_settings() -> src.editor.SessionSettings:
+    """
+    Settings of the open sessions from SESSION_MAX_OPEN, SESSION_MAX_MEMORY (bytes), SESSION_IDLE_TIMEOUT (seconds),
+    SESSION_HISTORY_LENGTH, SESSION_DIRECTORY and SESSION_COLUMNAR_MIN_NODES, where set.
+    """
+    variables = {name: f"SESSION_{name.upper()}" for name in src.editor.SessionSettings.__fields__}
+    return src.editor.SessionSettings(
+        **{name: os.environ[variable] for name, variable in variables.items() if variable in os.environ}
+    )
 
 
 async def main():
+    logs.configure(os.environ.get("LOG_LEVEL", "INFO"))
+    src.editor.sessions.settings = session_settings()
     # Set the stop condition when receiving SIGTERM.
     loop = asyncio.get_running_loop()
     stop = loop.create_future()
     loop.add_signal_handler(signal.SIGTERM, stop.set_result, None)
-    async with websockets.serve(src.editor.handler, "0.0.0.0", 8001):
-        await stop
+    async with websockets.serve(
+        src.editor.handler, "0.0.0.0", 8001, compression=None, extensions=encodings.deflate_extensions()
+    ):
+        # Metrics and admin endpoints are served on a side port, the websocket port only speaks the editor protocol.
+        # They are not authenticated, so they are only served on other interfaces than loopback when asked to.
+        admin_handlers = {"/admin/profiles": src.editor.profiles_handler, "/admin/logging": logs.admin_handler}
+        admin_host, admin_port = os.environ.get("ADMIN_HOST", "127.0.0.1"), int(os.environ.get("METRICS_PORT", 9101))
+        async with await metrics.serve(admin_host, admin_port, handlers=admin_handlers):
+            await stop
+    # Persist the changes of the open sessions, to restore them after a restart.
+    src.editor.sessions.close()
 
 
 if __name__ == "__main__":
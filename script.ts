@@ -588,23 +588,36 @@ function updateCollaborators(collaborators: string[]) {
 const scheme = window.location.protocol === "https:" ? "wss" : "ws";
 const port = window.location.port ? `:${window.location.port}` : "";
 const ws_url = `${scheme}://${window.location.hostname}${port}/ws`;
+let current_model: any = null;
+
+function renderModel(model: any) {
+    const nodes: Map<string, PetriNetNode> = new Map(Object.entries(model.nodes));
+    const edges: Edge[] = model.edges.map((edge: any) => {
+        return {
+            start_node_id: { id: edge.start_node_id },
+            end_node_id: { id: edge.end_node_id },
+            start_position: nodes.get(edge.start_node_id.toString())!.position,
+            end_position: nodes.get(edge.end_node_id.toString())!.position,
+        };
+    });
+    selectNode(selected_node, ws);
+    updateNodesAndEdges(nodes, edges);
+    madeChange();
+}
+
 const ws = new WebSocket(ws_url);
 ws.addEventListener("message", (event: MessageEvent) => {
     const message = JSON.parse(event.data);
     switch (message.event_type) {
         case "update_model":
-            const nodes: Map<string, PetriNetNode> = new Map(Object.entries(message.model.nodes));
-            const edges: Edge[] = message.model.edges.map((edge: any) => {
-                return {
-                    start_node_id: { id: edge.start_node_id },
-                    end_node_id: { id: edge.end_node_id },
-                    start_position: nodes.get(edge.start_node_id.toString())!.position,
-                    end_position: nodes.get(edge.end_node_id.toString())!.position,
-                };
-            });
-            selectNode(selected_node, ws);
-            updateNodesAndEdges(nodes, edges);
-            madeChange();
+            current_model = message.model;
+            renderModel(current_model);
+            break;
+        case "update_nodes":
+            if (current_model) {
+                Object.assign(current_model.nodes, message.nodes);
+                renderModel(current_model);
+            }
             break;
         case "update_undo_redo":
             state_buttons[State.Undo].toggleAttribute("disabled", !message.can_undo);
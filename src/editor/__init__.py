@@ -1,4 +1,6 @@
 from .commands import *
 from .command_history import *
+from .crdt import *
 from .process_model_controller import *
+from .rendering import *
 from .collaboration import *
@@ -1,25 +1,77 @@
 import asyncio
+import collections
+import hashlib
+import http
+import itertools
+import json
 import logging
 import pathlib
-from typing import Literal
+import time
+from typing import Annotated, Literal
 
 import pydantic
 import websockets
 import websockets.server
 
+from src import logs
+from src import metrics
 from src import process_model
-from src.editor import commands, process_model_controller
-from src import server
+from src import profiling
+from src.editor import commands, crdt, decoding, encodings, process_model_controller, rendering
+
+logger = logging.getLogger(__name__)
+# Requests are logged at debug level, and one in a hundred of each kind at info level.
+request_log = logs.Sampler(logger)
+
+REQUEST_PARSE_SECONDS = metrics.Histogram("editor_request_parse_seconds", "Time to parse a request.")
+COMMAND_SECONDS = metrics.Histogram(
+    "editor_command_seconds", "Time to execute a command, undo or redo.", labelnames=("command_type",)
+)
+EVENT_BUILD_SECONDS = metrics.Histogram(
+    "editor_event_build_seconds", "Time to build a broadcast event from the model.", labelnames=("event_type",)
+)
+EVENT_SERIALIZATION_SECONDS = metrics.Histogram(
+    "editor_event_serialization_seconds",
+    "Time to encode a broadcast event, once for every encoding of its recipients.",
+    labelnames=("event_type", "encoding"),
+)
+EVENT_BYTES = metrics.Histogram(
+    "editor_event_bytes",
+    "Size of encoded broadcast events.",
+    labelnames=("event_type", "encoding"),
+    buckets=metrics.SIZE_BUCKETS,
+)
+BROADCAST_SECONDS = metrics.Histogram(
+    "editor_broadcast_seconds", "Time to send a broadcast event to all its recipients.", labelnames=("event_type",)
+)
+SESSION_EVICTIONS = metrics.Counter(
+    "editor_session_evictions_total", "Idle editor sessions evicted, by reason.", labelnames=("reason",)
+)
+SESSION_RESTORES = metrics.Counter("editor_session_restores_total", "Evicted editor sessions restored.")
+SESSION_PERSIST_SECONDS = metrics.Histogram("editor_session_persist_seconds", "Time to persist an evicted session.")
+
+# Rough bytes of memory per node or edge of a model with its replica, and per command in an undo history, as measured
+# with tracemalloc for Petri nets.
+ELEMENT_BYTES = 1500
+COMMAND_BYTES = 2000
+# Seconds between the evictions of idle sessions.
+REAP_INTERVAL = 5.0
 
 
 class JoinSessionRequest(pydantic.BaseModel):
     request_type: Literal["join_session"]
     model_id: process_model.ModelId
+    # Encoding of the events sent to the client, JSON if the requested encoding is not available.
+    encoding: encodings.Encoding = "json"
+    # Receive the operations of edits instead of the changed model or nodes.
+    operations: bool = False
 
 
 class WatchSessionRequest(pydantic.BaseModel):
     request_type: Literal["watch_session"]
     model_id: process_model.ModelId
+    encoding: encodings.Encoding = "json"
+    operations: bool = False
 
 
 class ExecuteCommandRequest(pydantic.BaseModel):
@@ -40,10 +92,55 @@ class RedoRequest(pydantic.BaseModel):
     request_type: Literal["redo"]
 
 
+Operation = Annotated[crdt.OperationUnion, pydantic.Field(discriminator="operation_type")]
+
+
+class ApplyOperationsRequest(pydantic.BaseModel):
+    """Operations of edits that the client has already applied to its replica of the model."""
+
+    request_type: Literal["apply_operations"]
+    operations: list[Operation]
+
+
+RequestUnion = (
+    JoinSessionRequest
+    | WatchSessionRequest
+    | ExecuteCommandRequest
+    | InspectorRequest
+    | UndoRequest
+    | RedoRequest
+    | ApplyOperationsRequest
+)
+
+
 class Request(pydantic.BaseModel):
-    request: JoinSessionRequest | WatchSessionRequest | ExecuteCommandRequest | InspectorRequest | UndoRequest | RedoRequest = pydantic.Field(
-        ..., discriminator="request_type"
-    )
+    request: RequestUnion = pydantic.Field(..., discriminator="request_type")
+
+
+_request_decoder = decoding.UnionDecoder(Request.__fields__["request"])
+
+
+def decode_request(message: str | bytes) -> RequestUnion:
+    """
+    Parse a request like `Request.parse_raw(message).request`, validating only against the model for its type.
+    Binary messages are MessagePack, see `encodings`.
+    """
+    try:
+        data = encodings.decode(message)
+    except ValueError:
+        return Request.parse_raw(message).request
+    try:
+        return _request_decoder.decode(data["request"])
+    except (ValueError, KeyError, TypeError):
+        # Let pydantic report what is wrong with the message.
+        return Request.parse_obj(data).request
+
+
+class EncodingEvent(pydantic.BaseModel):
+    """Sent first to clients that join or watch a session, always in JSON, with the encoding of the events after it."""
+
+    event_type: Literal["encoding"] = "encoding"
+    encoding: encodings.Encoding
 
 
 class UpdateCollaboratorsEvent(pydantic.BaseModel):
@@ -60,6 +157,15 @@ class UpdateModelEvent(pydantic.BaseModel):
         return cls(model=model._serialize_to_dict())
 
 
+class UpdateNodesEvent(pydantic.BaseModel):
+    event_type: Literal["update_nodes"] = "update_nodes"
+    nodes: dict[process_model.NodeId, dict]
+
+    @classmethod
+    def from_nodes(cls, nodes: list[process_model.Node]) -> "UpdateNodesEvent":
+        return cls(nodes={node.id: node.dict() for node in nodes})
+
+
 class UpdateInspectorEvent(pydantic.BaseModel):
     event_type: Literal["update_inspector"] = "update_inspector"
     node_id: process_model.NodeId
@@ -80,8 +186,24 @@ class UpdateUndoRedoEvent(pydantic.BaseModel):
     can_redo: bool
 
 
+class OperationsEvent(pydantic.BaseModel):
+    event_type: Literal["operations"] = "operations"
+    operations: list[Operation]
+
+
+class SyncReplicaEvent(pydantic.BaseModel):
+    """
+    Sent after the model to clients that receive operations, see `crdt.ModelReplica.state`. Collaborators create their
+    operations as the replica with `replica_id`, which the server assigns so that it is unique in the session.
+    """
+
+    event_type: Literal["sync_replica"] = "sync_replica"
+    replica: dict
+    replica_id: str | None = None
+
+
 class Event(pydantic.BaseModel):
-    event: UpdateModelEvent | UpdateCollaboratorsEvent | UpdateInspectorEvent | UpdateUndoRedoEvent | CloseInspectorEvent = pydantic.Field(
+    event: UpdateModelEvent | UpdateNodesEvent | UpdateCollaboratorsEvent | UpdateInspectorEvent | UpdateUndoRedoEvent | CloseInspectorEvent = pydantic.Field(
         ..., discriminator="event_type"
     )
 
@@ -90,140 +212,538 @@ class EditorSession:
     model_controller: process_model_controller.ProcessModelController
     _collaborators: set[websockets.server.WebSocketServerProtocol]
     _spectators: set[websockets.server.WebSocketServerProtocol]
-
-    def __init__(self, model: process_model.ProcessModel) -> None:
-        model_controller = process_model_controller.ProcessModelController(model)
+    _encodings: dict[websockets.server.WebSocketServerProtocol, encodings.Encoding]
+    # Spectators that receive the operations of edits instead of the model or the changed nodes.
+    _operation_clients: set[websockets.server.WebSocketServerProtocol]
+    _inspector_cache: dict[process_model.NodeId, tuple[tuple, str]]
+    # Encoded events of the model for clients that join, by event type and encoding, and the replica state.
+    _join_frames: dict[tuple[str, encodings.Encoding], tuple[int, str | bytes]]
+    _replica_state: tuple[int, dict] | None
+    # Replica ids assigned to the clients that receive operations.
+    _replica_ids: dict[websockets.server.WebSocketServerProtocol, str]
+    # Monotonic time since when the session has had no clients, or None while it has.
+    idle_since: float | None
+
+    def __init__(self, model: process_model.ProcessModel, history_length: int | None = None) -> None:
+        model_controller = process_model_controller.ProcessModelController(model, history_length=history_length)
         self.model_controller = model_controller
+        self.idle_since = time.monotonic()
         self._collaborators = set()
         self._spectators = set()
+        self._encodings = {}
+        self._operation_clients = set()
+        self._inspector_cache = {}
+        self._join_frames = {}
+        self._replica_state = None
+        self._replica_ids = {}
+        self._next_replica_id = itertools.count(1)
+
+    async def render_inspector(self, node: process_model.Node) -> str:
+        """Render the inspector of a node, reusing the last rendering while its inspectable values are unchanged."""
+        # Keyed on the values rather than the model version, so edits of other nodes keep the rendering.
+        values = (type(node), *(getattr(node, name) for name in node.inspectable_field_factories()))
+        match self._inspector_cache.get(node.id):
+            case (cached_values, html) if cached_values == values:
+                return html
+        html = await inspector_renderer.render_async(
+            node.get_inspectables(), node_id=node.id, model_id=self.model_controller.model.id
+        )
+        self._inspector_cache[node.id] = (values, html)
+        return html
+
+    def encode(self, websocket: websockets.server.WebSocketServerProtocol, event: pydantic.BaseModel) -> str | bytes:
+        """Encode an event in the encoding of a client, like `event.json()` for JSON."""
+        # The fields of events are plain data already, so they are not converted to dicts again.
+        return encodings.encode(dict(event), self._encodings.get(websocket, "json"))
+
+    def _broadcast(self, clients: set[websockets.server.WebSocketServerProtocol], event: pydantic.BaseModel) -> None:
+        """Send an event to clients, encoding it once for every encoding they use."""
+        event_type = event.event_type
+        groups: dict[encodings.Encoding, list[websockets.server.WebSocketServerProtocol]]
+        groups = collections.defaultdict(list)
+        for client in clients:
+            groups[self._encodings.get(client, "json")].append(client)
+        data = dict(event)
+        for encoding, group in groups.items():
+            with EVENT_SERIALIZATION_SECONDS.labels(event_type, encoding).time():
+                message = encodings.encode(data, encoding)
+            EVENT_BYTES.labels(event_type, encoding).observe(len(message))
+            with BROADCAST_SECONDS.labels(event_type).time():
+                websockets.broadcast(group, message)
 
     def broadcast_state(self) -> None:
-        """Broadcast the model state and undo/redo state"""
-        websockets.broadcast(
-            self._spectators,
-            UpdateModelEvent.from_model(self.model_controller.model).json(),
-        )
-        websockets.broadcast(
-            self._collaborators,
-            UpdateUndoRedoEvent(
-                can_undo=self.model_controller.history.can_undo, can_redo=self.model_controller.history.can_redo
-            ).json(),
-        )
+        """Broadcast the model state to the spectators that do not receive operations"""
+        spectators = self._spectators - self._operation_clients
+        if not spectators:
+            return
+        with EVENT_BUILD_SECONDS.labels("update_model").time():
+            event = UpdateModelEvent.from_model(self.model_controller.model)
+        self._broadcast(spectators, event)
+
+    def broadcast_nodes(self, node_ids: list[process_model.NodeId]) -> None:
+        """Broadcast only the given nodes of the model to the spectators that do not receive operations"""
+        spectators = self._spectators - self._operation_clients
+        if not spectators:
+            return
+        model = self.model_controller.model
+        with EVENT_BUILD_SECONDS.labels("update_nodes").time():
+            event = UpdateNodesEvent.from_nodes([model.get_node(node_id) for node_id in node_ids])
+        self._broadcast(spectators, event)
+
+    def broadcast_operations(self, origin: websockets.server.WebSocketServerProtocol | None = None) -> None:
+        """Broadcast the operations of the last edit to the spectators that receive operations, except its origin"""
+        operations = self.model_controller.operations
+        spectators = self._operation_clients - {origin}
+        if operations and spectators:
+            self._broadcast(spectators, OperationsEvent(operations=operations))
+
+    def send_undo_redo(self, client: websockets.server.WebSocketServerProtocol) -> None:
+        history = self.model_controller.user_history(client)
+        self._broadcast({client}, UpdateUndoRedoEvent(can_undo=history.can_undo, can_redo=history.can_redo))
+
+    def publish(
+        self, client: websockets.server.WebSocketServerProtocol, node_ids: list[process_model.NodeId] | None = None
+    ) -> None:
+        """Broadcast an edit of a client, the given nodes or else the whole model, and send its undo/redo state."""
+        self.broadcast_operations()
+        if node_ids is None:
+            self.broadcast_state()
+        else:
+            self.broadcast_nodes(node_ids)
+        self.send_undo_redo(client)
+
+    def execute(
+        self,
+        command: commands.ProcessModelCommand[commands.CommandOutputT],
+        user: websockets.server.WebSocketServerProtocol | None = None,
+    ) -> commands.CommandOutputT:
+        with COMMAND_SECONDS.labels(command.command_type).time():
+            output = self.model_controller.execute(command, user)
+        self.collect_garbage()
+        return output
+
+    def undo(self, user: websockets.server.WebSocketServerProtocol | None = None) -> None:
+        with COMMAND_SECONDS.labels("undo").time():
+            self.model_controller.undo(user)
+        self.collect_garbage()
+
+    def redo(self, user: websockets.server.WebSocketServerProtocol | None = None) -> None:
+        with COMMAND_SECONDS.labels("redo").time():
+            self.model_controller.redo(user)
+        self.collect_garbage()
+
+    def apply(self, operations: list[crdt.OperationUnion]) -> None:
+        with COMMAND_SECONDS.labels("apply_operations").time():
+            self.model_controller.apply(operations)
+
+    def collect_garbage(self) -> None:
+        """Collect the garbage of the replica, unless collaborators may still send operations concurrent with edits."""
+        if not self._operation_clients & self._collaborators:
+            self.model_controller.replica.collect_garbage()
 
     async def process_messages(self, client: websockets.server.WebSocketServerProtocol) -> None:
         """Receive and process messages from client and propagate changes to other client."""
+        model_id = self.model_controller.model.id
         async for message in client:
-            match Request.parse_raw(message).request:
+            with REQUEST_PARSE_SECONDS.time():
+                request = decode_request(message)
+            match request:
                 case ExecuteCommandRequest(command=command) if isinstance(command, commands.SaveModelCommand):
-                    logging.info("Received save request")
-                    self.model_controller.execute(command)
-                    await client.send(SavedSuccessEvent().json())
+                    logger.info("save session=%s", model_id)
+                    self.execute(command)
+                    await client.send(self.encode(client, SavedSuccessEvent()))
+                case ExecuteCommandRequest(command=command) if isinstance(
+                    command, commands.BulkUpdateInspectablesCommand
+                ):
+                    request_log.log(
+                        command.command_type,
+                        "command session=%s command_type=%s nodes=%d",
+                        model_id,
+                        command.command_type,
+                        len(command.node_ids),
+                    )
+                    try:
+                        node_ids = self.execute(command, client)
+                    except pydantic.ValidationError as error:
+                        logger.warning(
+                            "rejected session=%s command_type=%s error=%s", model_id, command.command_type, error
+                        )
+                        continue
+                    self.publish(client, node_ids)
                 case ExecuteCommandRequest(command=command):
-                    logging.info(f"Received command: {command}")
-                    self.model_controller.execute(command)
+                    command_type = command.command_type
+                    request_log.log(command_type, "command session=%s command_type=%s", model_id, command_type)
+                    try:
+                        self.execute(command, client)
+                    except pydantic.ValidationError as error:
+                        logger.warning(
+                            "rejected session=%s command_type=%s error=%s", model_id, command.command_type, error
+                        )
+                        continue
                     if isinstance(command, commands.UndoableCommand):
-                        self.broadcast_state()
+                        self.publish(client)
                 case UndoRequest():
-                    logging.info("Received undo request")
-                    self.model_controller.undo()
-                    self.broadcast_state()
+                    request_log.log("undo", "undo session=%s", model_id)
+                    self.undo(client)
+                    self.publish(client)
                 case RedoRequest():
-                    logging.info("Received redo request")
-                    self.model_controller.redo()
+                    request_log.log("redo", "redo session=%s", model_id)
+                    self.redo(client)
+                    self.publish(client)
+                case ApplyOperationsRequest(operations=operations):
+                    request_log.log(
+                        "apply_operations", "operations session=%s operations=%d", model_id, len(operations)
+                    )
+                    replica_id = self._replica_ids.get(client)
+                    if replica_id is None or any(
+                        crdt.replica_of(operation) not in (None, replica_id) for operation in operations
+                    ):
+                        logger.warning(
+                            "rejected session=%s operations=%d replica=%s error=not the replica of the client",
+                            model_id,
+                            len(operations),
+                            replica_id,
+                        )
+                        continue
+                    try:
+                        self.apply(operations)
+                    except pydantic.ValidationError as error:
+                        logger.warning("rejected session=%s operations=%d error=%s", model_id, len(operations), error)
+                        continue
+                    # The client has applied the operations already.
+                    self.broadcast_operations(client)
                     self.broadcast_state()
                 case InspectorRequest(node_id=node_id):
-                    logging.info("Received inspector request for node: %s", node_id)
+                    request_log.log("inspector", "inspector session=%s node=%s", model_id, node_id)
                     node = self.model_controller.model.get_node(node_id)
                     if node is None:
-                        logging.warning(f"Received inspector request for unknown node: {node_id}")
-                        await client.send(CloseInspectorEvent().json())
+                        logger.warning("unknown node session=%s node=%s", model_id, node_id)
+                        await client.send(self.encode(client, CloseInspectorEvent()))
                         continue
-                    with server.app.app_context():
-                        html = server.flask.render_template(
-                            "inspector_content.html",
-                            properties=node.get_inspectables(),
-                            node_id=node_id,
-                            model_id=self.model_controller.model.id,
-                        )
-                        await client.send(UpdateInspectorEvent(node_id=node_id, inspector_html=html).json())
+                    try:
+                        html = await self.render_inspector(node)
+                    except asyncio.TimeoutError:
+                        logger.warning("inspector timed out session=%s node=%s", model_id, node_id)
+                        await client.send(self.encode(client, CloseInspectorEvent()))
+                        continue
+                    await client.send(self.encode(client, UpdateInspectorEvent(node_id=node_id, inspector_html=html)))
                 case unknown_request:
-                    logging.warning(f"Received unknown request: {unknown_request}")
+                    logger.warning("unknown request session=%s request=%r", model_id, unknown_request)
 
     async def update_collaborators(self) -> None:
         for collaborator in self._collaborators:
-            await collaborator.send(
-                UpdateCollaboratorsEvent(
-                    collaborator_ids=[hash(c.remote_address) for c in self._collaborators if c != collaborator]
-                ).json()
+            event = UpdateCollaboratorsEvent(
+                collaborator_ids=[hash(c.remote_address) for c in self._collaborators if c != collaborator]
             )
-
-    async def join(self, websocket: websockets.server.WebSocketServerProtocol) -> None:
+            await collaborator.send(self.encode(collaborator, event))
+
+    def join_frame(self, event_type: Literal["update_model"], encoding: encodings.Encoding) -> str | bytes:
+        """The encoded model for clients that join, shared by all of them until the model changes."""
+        version = self.model_controller.version
+        match self._join_frames.get((event_type, encoding)):
+            case (cached_version, frame) if cached_version == version:
+                return frame
+        with EVENT_BUILD_SECONDS.labels(event_type).time():
+            event = UpdateModelEvent.from_model(self.model_controller.model)
+        with EVENT_SERIALIZATION_SECONDS.labels(event_type, encoding).time():
+            frame = encodings.encode(dict(event), encoding)
+        self._join_frames[(event_type, encoding)] = (version, frame)
+        return frame
+
+    def sync_frame(self, encoding: encodings.Encoding, replica_id: str) -> str | bytes:
+        """The encoded replica state for a client that receives operations, with the id assigned to its replica."""
+        version = self.model_controller.version
+        match self._replica_state:
+            case (cached_version, state) if cached_version == version:
+                pass
+            case _:
+                with EVENT_BUILD_SECONDS.labels("sync_replica").time():
+                    state = self.model_controller.replica.state()
+                self._replica_state = (version, state)
+        event = SyncReplicaEvent.construct(replica=state, replica_id=replica_id)
+        with EVENT_SERIALIZATION_SECONDS.labels("sync_replica", encoding).time():
+            return encodings.encode(dict(event), encoding)
+
+    def memory_estimate(self) -> int:
+        """Rough bytes of memory used by the session, for the memory budget of the open sessions."""
+        model = self.model_controller.model
+        commands = sum(len(history.commands) for history in self.model_controller.histories.values())
+        cached = sum(len(frame) for _, frame in self._join_frames.values())
+        cached += sum(len(html) for _, html in self._inspector_cache.values())
+        return (len(model.get_nodes()) + len(model.get_edges())) * ELEMENT_BYTES + commands * COMMAND_BYTES + cached
+
+    def _update_idle(self) -> None:
+        if self._collaborators or self._spectators:
+            self.idle_since = None
+        elif self.idle_since is None:
+            self.idle_since = time.monotonic()
+
+    def send_model(self, websocket: websockets.server.WebSocketServerProtocol) -> None:
+        """
+        Send the negotiated encoding and the current state of the model to a client, and of the replica if it receives
+        operations.
+        """
+        encoding = self._encodings.get(websocket, "json")
+        frames = [EncodingEvent(encoding=encoding).json(), self.join_frame("update_model", encoding)]
+        if websocket in self._operation_clients:
+            frames.append(self.sync_frame(encoding, self._replica_ids[websocket]))
+        # Written without waiting, so that no operations are broadcast between the model and the replica state.
+        for frame in frames:
+            websockets.broadcast([websocket], frame)
+
+    async def join(
+        self,
+        websocket: websockets.server.WebSocketServerProtocol,
+        encoding: encodings.Encoding = "json",
+        operations: bool = False,
+    ) -> None:
         self._collaborators.add(websocket)
         self._spectators.add(websocket)
-        logging.info(f"Collaborator joined: {websocket.remote_address}")
-        logging.info(f"Number of collaborators: {len(self._collaborators)}")
+        self._update_idle()
+        self._encodings[websocket] = encodings.negotiate(encoding)
+        if operations:
+            self._operation_clients.add(websocket)
+            self._replica_ids[websocket] = f"client-{next(self._next_replica_id)}"
+        logger.info(
+            "joined session=%s address=%s collaborators=%d encoding=%s operations=%s",
+            self.model_controller.model.id,
+            websocket.remote_address,
+            len(self._collaborators),
+            self._encodings[websocket],
+            operations,
+        )
         try:
-            # Send the current state of the model to the client.
-            await websocket.send(UpdateModelEvent.from_model(self.model_controller.model).json())
+            self.send_model(websocket)
             await self.update_collaborators()
             # Process messages from the client.
             await self.process_messages(websocket)
         finally:
             self._collaborators.remove(websocket)
             self._spectators.remove(websocket)
+            self._encodings.pop(websocket)
+            self._operation_clients.discard(websocket)
+            self._replica_ids.pop(websocket, None)
+            self.model_controller.remove_user(websocket)
+            self.collect_garbage()
+            self._update_idle()
             await self.update_collaborators()
-            await self.close_after_timeout(60)
 
-    async def watch(self, websocket: websockets.server.WebSocketServerProtocol) -> None:
+    async def watch(
+        self,
+        websocket: websockets.server.WebSocketServerProtocol,
+        encoding: encodings.Encoding = "json",
+        operations: bool = False,
+    ) -> None:
         self._spectators.add(websocket)
+        self._update_idle()
+        self._encodings[websocket] = encodings.negotiate(encoding)
+        if operations:
+            self._operation_clients.add(websocket)
+            self._replica_ids[websocket] = f"client-{next(self._next_replica_id)}"
         try:
-            await websocket.send(UpdateModelEvent.from_model(self.model_controller.model).json())
-            await self.update_collaborators()
+            # Spectators are not collaborators, so the collaborators are not updated when they come and go.
+            self.send_model(websocket)
             # Spectators cannot send messages to the server.
             await websocket.wait_closed()
         finally:
             self._spectators.remove(websocket)
-            await self.update_collaborators()
-            await self.close_after_timeout(60)
+            self._encodings.pop(websocket)
+            self._operation_clients.discard(websocket)
+            self._replica_ids.pop(websocket, None)
+            self._update_idle()
+
+
+class SessionSettings(pydantic.BaseModel):
+    # Open sessions, and estimated bytes of memory of them, above which idle sessions are evicted.
+    max_open: int | None = None
+    max_memory: int | None = None
+    # Seconds after which idle sessions are evicted in any case.
+    idle_timeout: float = 60.0
+    # Commands kept in every undo history of a session.
+    history_length: int | None = 1000
+    # Where evicted sessions are persisted.
+    directory: pathlib.Path = pathlib.Path("data/sessions")
+    # Petri nets with at least this many nodes are edited in columnar storage, None to never use it.
+    columnar_min_nodes: int | None = 10_000
+
+
+class SessionManager:
+    """
+    The open editor sessions. A session without clients is idle, and a single reaper task evicts idle sessions after
+    `idle_timeout`, or earlier while the open sessions are over their budget, least recently used first. Evicted
+    sessions with changes are persisted, and restored when their model is opened again, unless the model file has
+    changed since.
+    """
 
-    async def close_after_timeout(self, timeout: float) -> None:
-        # Close the editor session if there are no collaborators or spectators left after the timeout.
-        if self._collaborators or self._spectators:
-            return
-        logging.info(
-            f"Closing editor session for model: {self.model_controller.model.id} in {timeout} seconds if no collaborators or spectators join."
-        )
-        await asyncio.sleep(timeout)
-        if not self._collaborators and not self._spectators:
-            open_editors.pop(self.model_controller.model.id)
-            logging.info(f"Closed editor session for model: {self.model_controller.model.id}")
+    open_editors: dict[process_model.ModelId, EditorSession]
 
+    def __init__(self, settings: SessionSettings | None = None) -> None:
+        self.settings = settings or SessionSettings()
+        self.open_editors = {}
+        # Ids of the models of the open sessions, by the paths they were opened with.
+        self._model_ids: dict[str, process_model.ModelId] = {}
+        self._paths: dict[process_model.ModelId, pathlib.Path] = {}
+        self._reaper: asyncio.Task | None = None
 
-open_editors: dict[process_model.ModelId, EditorSession] = {}
+    def _snapshot_path(self, path: pathlib.Path) -> pathlib.Path:
+        return self.settings.directory / f"{hashlib.sha256(str(path.resolve()).encode()).hexdigest()[:32]}.json"
 
+    def _load(self, path: pathlib.Path) -> EditorSession:
+        """Load the session of a model file, restoring its evicted session if there is one."""
+        snapshot_path = self._snapshot_path(path)
+        try:
+            snapshot = json.loads(snapshot_path.read_text())
+        except FileNotFoundError:
+            snapshot = None
+        if snapshot is not None and snapshot["source_mtime"] != path.stat().st_mtime_ns:
+            # The model was saved or replaced since, which takes precedence.
+            logger.info("discarding evicted session path=%s", path)
+            snapshot_path.unlink(missing_ok=True)
+            snapshot = None
+        settings = self.settings
+        if snapshot is None:
+            return EditorSession(process_model.load_model(path, settings.columnar_min_nodes), settings.history_length)
+        editor = EditorSession(
+            process_model.model_from_dict(snapshot["model"], settings.columnar_min_nodes), settings.history_length
+        )
+        editor.model_controller.replica.sync(snapshot["replica"])
+        SESSION_RESTORES.inc()
+        logger.info("restored session=%s path=%s", editor.model_controller.model.id, path)
+        return editor
+
+    def _persist(self, editor: EditorSession, path: pathlib.Path) -> None:
+        model_controller = editor.model_controller
+        snapshot = {
+            "source_mtime": path.stat().st_mtime_ns,
+            "model": model_controller.model._serialize_to_dict(),
+            "replica": model_controller.replica.state(),
+        }
+        snapshot_path = self._snapshot_path(path)
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        # Replaced at once, so that a snapshot is never read half written.
+        partial_path = snapshot_path.with_suffix(".partial")
+        partial_path.write_text(encodings.encode(snapshot, "json"))
+        partial_path.replace(snapshot_path)
+
+    def open(self, path: str) -> EditorSession:
+        """The open session of a model file, opened or restored if necessary."""
+        self._start_reaper()
+        editor = self.open_editors.get(self._model_ids.get(path))
+        if editor is not None:
+            return editor
+        editor = self._load(pathlib.Path(path))
+        model_id = editor.model_controller.model.id
+        # Another path of an open model.
+        editor = self.open_editors.setdefault(model_id, editor)
+        self._model_ids[path] = model_id
+        self._paths.setdefault(model_id, pathlib.Path(path))
+        self.reap(keep=editor)
+        return editor
+
+    def evict(self, editor: EditorSession, reason: str) -> None:
+        model_id = editor.model_controller.model.id
+        del self.open_editors[model_id]
+        path = self._paths.pop(model_id)
+        self._model_ids = {other: other_id for other, other_id in self._model_ids.items() if other_id != model_id}
+        # Sessions are unchanged until their first edit, whether loaded from the file or restored.
+        if editor.model_controller.version > 0:
+            try:
+                with SESSION_PERSIST_SECONDS.time():
+                    self._persist(editor, path)
+            except OSError as error:
+                logger.error("cannot persist session=%s path=%s error=%s", model_id, path, error)
+        SESSION_EVICTIONS.labels(reason).inc()
+        logger.info("evicted session=%s reason=%s", model_id, reason)
+
+    def reap(self, keep: EditorSession | None = None) -> None:
+        """
+        Evict the idle sessions that timed out, then the least recently used idle sessions while the open sessions are
+        over their budget. `keep` is not evicted.
+        """
+        now, settings = time.monotonic(), self.settings
+        idle = sorted(
+            (editor for editor in self.open_editors.values() if editor.idle_since is not None and editor is not keep),
+            key=lambda editor: editor.idle_since,
+        )
+        while idle and now - idle[0].idle_since >= settings.idle_timeout:
+            self.evict(idle.pop(0), "idle")
+        if settings.max_memory is None:
+            memory = {}
+        else:
+            memory = {id(editor): editor.memory_estimate() for editor in self.open_editors.values()}
+        total_memory = sum(memory.values())
+        for editor in idle:
+            if settings.max_open is not None and len(self.open_editors) > settings.max_open:
+                reason = "sessions"
+            elif settings.max_memory is not None and total_memory > settings.max_memory:
+                reason = "memory"
+            else:
+                break
+            total_memory -= memory.get(id(editor), 0)
+            self.evict(editor, reason)
+
+    async def _reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            self.reap()
+
+    def _start_reaper(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sessions opened outside of an event loop are reaped when they are opened.
+            return
+        if self._reaper is None or self._reaper.done() or self._reaper.get_loop() is not loop:
+            self._reaper = loop.create_task(self._reap_forever())
+
+    def close(self) -> None:
+        """Evict all sessions, persisting their changes."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+        for editor in list(self.open_editors.values()):
+            self.evict(editor, "close")
+
+
+sessions = SessionManager()
+inspector_renderer = rendering.InspectorRenderer()
+
+metrics.Gauge("editor_open_sessions", "Open editor sessions.", function=lambda: len(sessions.open_editors))
+metrics.Gauge(
+    "editor_collaborators",
+    "Collaborators of the open editor sessions.",
+    function=lambda: sum(len(editor._collaborators) for editor in sessions.open_editors.values()),
+)
+metrics.Gauge(
+    "editor_spectators",
+    "Spectators of the open editor sessions, including the collaborators.",
+    function=lambda: sum(len(editor._spectators) for editor in sessions.open_editors.values()),
+)
+metrics.Gauge(
+    "editor_history_length",
+    "Commands in the undo histories of the open editor sessions.",
+    function=lambda: sum(
+        len(history.commands)
+        for editor in sessions.open_editors.values()
+        for history in editor.model_controller.histories.values()
+    ),
+)
+metrics.Gauge(
+    "editor_session_memory_bytes",
+    "Estimated memory of the open editor sessions.",
+    function=lambda: sum(editor.memory_estimate() for editor in sessions.open_editors.values()),
+)
 
-def get_open_editor(path: str | None) -> EditorSession:
-    global open_models
 
+def get_open_editor(path: str | None) -> EditorSession:
     if path is None:
         raise ValueError("Path is None")
 
-    model_type = process_model.ProcessModelType.from_path(pathlib.Path(path))
-    model_class = process_model.model_type_to_class(model_type)
-
     try:
-        model = model_class.load(pathlib.Path(path))
-        if model.id in open_editors:
-            open_editor = open_editors[model.id]
-        else:
-            open_editor = EditorSession(model)
-            open_editors[model.id] = open_editor
+        return sessions.open(path)
     except FileNotFoundError as error:
-        logging.error(f"File not found {path}")
+        logger.error("model not found path=%s", path)
         raise error
 
-    return open_editor
-
 
 async def handler(websocket: websockets.server.WebSocketServerProtocol) -> None:
     """
@@ -231,19 +751,63 @@ async def handler(websocket: websockets.server.WebSocketServerProtocol) -> None:
     """
     message = await websocket.recv()
     try:
-        request = Request.parse_raw(message).request
+        with REQUEST_PARSE_SECONDS.time():
+            request = decode_request(message)
     except pydantic.ValidationError as error:
-        logging.error(f"Invalid request: {message}")
-        logging.error(error)
+        logger.warning("invalid request address=%s bytes=%d error=%s", websocket.remote_address, len(message), error)
+        logger.debug("invalid request message=%s", message)
         await websocket.close(code=1003, reason="Invalid request")
         return
 
     match request:
         case JoinSessionRequest() as join_request:
             editor = get_open_editor(join_request.model_id)
-            await editor.join(websocket)
+            await editor.join(websocket, join_request.encoding, join_request.operations)
         case WatchSessionRequest() as watch_request:
             editor = get_open_editor(watch_request.model_id)
-            await editor.watch(websocket)
+            await editor.watch(websocket, watch_request.encoding, watch_request.operations)
         case unknown_request:
             raise ValueError(f"Unknown request {unknown_request}")
+
+
+async def profiles_handler(method: str, path: str, query: dict[str, str]) -> metrics.Response:
+    """
+    Admin endpoint to profile an editor session, served next to the metrics.
+
+    `POST /admin/profiles?model_id=...&seconds=...` starts profiling the message processing of a model's session, and
+    `GET /admin/profiles/<id>` returns the status of the profile until it is done, then its stacks in folded format.
+    """
+    match method, path:
+        case "POST", "":
+            editor = sessions.open_editors.get(process_model.ModelId(query.get("model_id", "")))
+            if editor is None:
+                return metrics.Response(http.HTTPStatus.NOT_FOUND, b"No open session of the model\n")
+            try:
+                seconds = float(query.get("seconds", 30))
+            except ValueError as error:
+                return metrics.Response(http.HTTPStatus.BAD_REQUEST, f"{error}\n".encode())
+            try:
+                profile = profiling.PROFILER.start(
+                    f"editor session {editor.model_controller.model.id}",
+                    profiling.in_call(
+                        EditorSession.process_messages, lambda frame_locals: frame_locals["self"] is editor
+                    ),
+                    seconds,
+                )
+            except profiling.TooManyProfilesError as error:
+                return metrics.Response(http.HTTPStatus.TOO_MANY_REQUESTS, f"{error}\n".encode())
+            return metrics.Response(http.HTTPStatus.ACCEPTED, json.dumps(profile.status()).encode(), "application/json")
+        case "GET", profile_id if profile_id.isdigit():
+            profile = profiling.PROFILER.get(int(profile_id))
+            if profile is None:
+                return metrics.Response(http.HTTPStatus.NOT_FOUND, b"No such profile\n")
+            if not profile.done.is_set():
+                status = json.dumps(profile.status()).encode()
+                return metrics.Response(http.HTTPStatus.ACCEPTED, status, "application/json")
+            return metrics.Response(
+                http.HTTPStatus.OK,
+                profile.folded().encode(),
+                headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.folded"'},
+            )
+        case _:
+            return metrics.Response(http.HTTPStatus.NOT_FOUND, b"Not found\n")
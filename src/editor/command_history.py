@@ -2,17 +2,28 @@ from src.editor import ProcessModelCommand, UndoableCommand, CommandOutputT
 
 
 class CommandHistory:
-    def __init__(self) -> None:
+    def __init__(self, max_length: int | None = None) -> None:
+        """Keeps at most `max_length` commands, forgetting the oldest ones."""
         self._commands: list[ProcessModelCommand] = []
         self._index: int = -1
+        self.max_length = max_length
 
     def execute(self, command: ProcessModelCommand[CommandOutputT]) -> CommandOutputT:
         output = command.execute()
         if isinstance(command, UndoableCommand):
-            self._commands = self._commands[: self._index + 1] + [command]
-            self._index += 1
+            self.push(command)
         return output
 
+    def push(self, command: UndoableCommand) -> None:
+        """Add a command that has already been executed."""
+        # Drop the undone commands.
+        del self._commands[self._index + 1 :]
+        self._commands.append(command)
+        self._index += 1
+        if self.max_length is not None and len(self._commands) > self.max_length:
+            del self._commands[0]
+            self._index -= 1
+
     def undo(self) -> None:
         if self.can_undo:
             self._commands[self._index].undo()
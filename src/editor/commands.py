@@ -135,20 +135,36 @@ class UpdateInspectablesCommand(ProcessModelCommand, UndoableCommand):
     _old_kwargs: dict[str, Any] = pydantic.PrivateAttr(default_factory=dict)
 
     def execute(self) -> None:
-        node = self._model.get_node(self.node_id)
         node: process_model.Node = self._model.get_node(self.node_id)
-
-        for key, value in self.node_kwargs.items():
-            inspectable = node.get_inspectable(key)
-            if inspectable is not None:
-                self._old_kwargs[key] = inspectable.value
-                node.set_inspectable(key, value)
+        self._old_kwargs = node.update_inspectables(self.node_kwargs)
 
     def undo(self) -> None:
         node: process_model.Node = self._model.get_node(self.node_id)
+        node.update_inspectables(self._old_kwargs)
+
+
+class BulkUpdateInspectablesCommand(ProcessModelCommand, UndoableCommand):
+    """Update the same inspectable fields on a selection of nodes as a single undoable command."""
 
-        for key, value in self._old_kwargs.items():
-            node.set_inspectable(key, value)
+    command_type: Literal["bulk_update_inspectables"] = "bulk_update_inspectables"
+    node_ids: list[process_model.NodeId]
+    node_kwargs: dict[str, Any] = pydantic.Field(default_factory=dict)
+    _old_kwargs: dict[process_model.NodeId, dict[str, Any]] = pydantic.PrivateAttr(default_factory=dict)
+
+    def execute(self) -> list[process_model.NodeId]:
+        """Returns the ids of the updated nodes. Unknown node ids are ignored."""
+        # Nodes selected twice are updated once, so that their old values are not overwritten by the new ones.
+        nodes = [node for node in map(self._model.get_node, dict.fromkeys(self.node_ids)) if node is not None]
+        # Values are validated once per node class rather than once per node.
+        validated_kwargs = {
+            node_class: node_class.validate_inspectables(self.node_kwargs) for node_class in {type(node) for node in nodes}
+        }
+        self._old_kwargs = {node.id: node.assign_inspectables(validated_kwargs[type(node)]) for node in nodes}
+        return list(self._old_kwargs.keys())
+
+    def undo(self) -> None:
+        for node_id, old_kwargs in self._old_kwargs.items():
+            self._model.get_node(node_id).assign_inspectables(old_kwargs)
 
 
 class ClearModelCommand(ProcessModelCommand, UndoableCommand):
@@ -175,6 +191,7 @@ ProcessModelCommandUnion = (
     | CreateEdgeCommand
     | DeleteEdgeCommand
     | UpdateInspectablesCommand
+    | BulkUpdateInspectablesCommand
     | ClearModelCommand
     | SaveModelCommand
 )
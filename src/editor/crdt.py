@@ -0,0 +1,549 @@
+"""
+Replicated process models for concurrent editing.
+
+A `ModelReplica` keeps the metadata that lets concurrent edits of a process model be merged in any order. Nodes and
+edges are observed-remove sets: a removal only removes the additions it has seen, so an addition concurrent with a
+removal wins. Every field of a node is a last-writer-wins register, ordered by Lamport timestamps. Edits are
+exchanged as small operations, which replicas can apply in any order, and more than once, and end up with the same
+model.
+
+The replica keeps its process model up to date, and the process model is still what commands edit and what is
+rendered and saved. After a command, `commit` compares the nodes and edges the command touched with the replica and
+creates the operations for the differences. The returned `Change` is undone by restoring the state of those nodes
+and edges from before the command with new operations, so a user can undo their own edits and keep the later edits
+of others.
+"""
+from typing import Any, Generic, Hashable, Iterable, Literal, NamedTuple, TypeVar
+
+import pydantic
+
+from src import process_model
+from src.editor import commands
+
+T = TypeVar("T")
+ElementT = TypeVar("ElementT", bound=Hashable)
+
+
+class Timestamp(NamedTuple):
+    """Lamport timestamp. Ties are broken by the id of the replica, so timestamps are totally ordered."""
+
+    counter: int
+    replica: str
+
+
+# Timestamp of the nodes, edges and fields of the model that a replica starts from.
+INITIAL = Timestamp(0, "")
+
+
+class LamportClock:
+    def __init__(self, replica: str) -> None:
+        self.replica = replica
+        self.counter = 0
+
+    def tick(self) -> Timestamp:
+        self.counter += 1
+        return Timestamp(self.counter, self.replica)
+
+    def observe(self, timestamp: Timestamp) -> None:
+        self.counter = max(self.counter, timestamp.counter)
+
+
+class LWWRegister(Generic[T]):
+    """A value that is only replaced by values with a later timestamp."""
+
+    __slots__ = ("value", "timestamp")
+
+    def __init__(self, value: T, timestamp: Timestamp) -> None:
+        self.value = value
+        self.timestamp = timestamp
+
+    def set(self, value: T, timestamp: Timestamp) -> bool:
+        """Returns whether the value was replaced."""
+        if timestamp <= self.timestamp:
+            return False
+        self.value = value
+        self.timestamp = timestamp
+        return True
+
+
+class ORSet(Generic[ElementT]):
+    """
+    Observed-remove set. Every addition of an element has a unique tag, and a removal removes the tags it has seen,
+    so the element stays in the set if it was added again concurrently.
+    """
+
+    def __init__(self) -> None:
+        self._tags: dict[ElementT, set[Timestamp]] = {}
+        # So that an addition that arrives after its removal is ignored.
+        self._removed: set[tuple[ElementT, Timestamp]] = set()
+
+    def add(self, element: ElementT, tag: Timestamp) -> bool:
+        """Returns whether the element was not in the set before."""
+        if (element, tag) in self._removed:
+            return False
+        tags = self._tags.get(element)
+        if tags is None:
+            self._tags[element] = {tag}
+            return True
+        tags.add(tag)
+        return False
+
+    def remove(self, element: ElementT, tags: Iterable[Timestamp]) -> bool:
+        """Remove the observed `tags` of an element. Returns whether the element is no longer in the set."""
+        tags = set(tags)
+        self._removed.update((element, tag) for tag in tags)
+        current = self._tags.get(element)
+        if current is None:
+            return False
+        current.difference_update(tags)
+        if current:
+            return False
+        del self._tags[element]
+        return True
+
+    def tags(self, element: ElementT) -> list[Timestamp]:
+        return sorted(self._tags.get(element, ()))
+
+    def collect(self) -> None:
+        """Forget the removed tags, once no addition with one of them can arrive anymore."""
+        self._removed.clear()
+
+    def __contains__(self, element: object) -> bool:
+        return element in self._tags
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+
+class AddNodeOperation(pydantic.BaseModel):
+    operation_type: Literal["add_node"] = "add_node"
+    node_id: process_model.NodeId
+    # All fields of the node except its id.
+    fields: dict[str, Any]
+    tag: Timestamp
+
+
+class RemoveNodeOperation(pydantic.BaseModel):
+    operation_type: Literal["remove_node"] = "remove_node"
+    node_id: process_model.NodeId
+    tags: list[Timestamp]
+
+
+class SetNodeFieldsOperation(pydantic.BaseModel):
+    operation_type: Literal["set_node_fields"] = "set_node_fields"
+    node_id: process_model.NodeId
+    fields: dict[str, Any]
+    timestamp: Timestamp
+
+
+class AddEdgeOperation(pydantic.BaseModel):
+    operation_type: Literal["add_edge"] = "add_edge"
+    edge: dict[str, Any]
+    tag: Timestamp
+
+
+class RemoveEdgeOperation(pydantic.BaseModel):
+    operation_type: Literal["remove_edge"] = "remove_edge"
+    edge: dict[str, Any]
+    tags: list[Timestamp]
+
+
+OperationUnion = (
+    AddNodeOperation | RemoveNodeOperation | SetNodeFieldsOperation | AddEdgeOperation | RemoveEdgeOperation
+)
+
+
+def replica_of(operation: OperationUnion) -> str | None:
+    """
+    The replica that created an addition or a change of fields. None for removals, which any replica that observed the
+    removed tags may create.
+    """
+    match operation:
+        case AddNodeOperation(tag=timestamp) | AddEdgeOperation(tag=timestamp):
+            return timestamp.replica
+        case SetNodeFieldsOperation(timestamp=timestamp):
+            return timestamp.replica
+    return None
+
+
+class Snapshot(NamedTuple):
+    """
+    State of some nodes and edges. Nodes map to their fields, which may be only some of them, or to None if they are
+    absent, and edges to whether they are present.
+    """
+
+    nodes: dict[process_model.NodeId, dict[str, Any] | None]
+    edges: dict[process_model.Edge, bool]
+
+
+class Change(commands.UndoableCommand[None]):
+    """The change of a command to the nodes and edges it touched, undone and redone by restoring their state."""
+
+    def __init__(self, replica: "ModelReplica", before: Snapshot, after: Snapshot) -> None:
+        self.replica = replica
+        self.before = before
+        self.after = after
+
+    def execute(self) -> None:
+        self.replica.restore(self.after)
+
+    def undo(self) -> None:
+        self.replica.restore(self.before)
+
+
+class ModelReplica:
+    def __init__(self, model: process_model.ProcessModel, replica: str = "server") -> None:
+        self.model = model
+        self.clock = LamportClock(replica)
+        self._node_class = model.node_class()
+        self._edge_class = model.edge_class()
+        self._field_names = [name for name in self._node_class.__fields__ if name != "id"]
+        self._settable_fields = {"position", *self._node_class.inspectable_validators()}
+        self._nodes: ORSet[process_model.NodeId] = ORSet()
+        self._fields: dict[process_model.NodeId, dict[str, LWWRegister]] = {}
+        self._edges: ORSet[process_model.Edge] = ORSet()
+        # Edges added to the set, by the ids of their nodes.
+        self._incident: dict[process_model.NodeId, set[process_model.Edge]] = {}
+        # Nodes that were removed since garbage was last collected, whose fields may be forgotten.
+        self._removed_nodes: set[process_model.NodeId] = set()
+        # Operations created since they were last taken.
+        self._operations: list[OperationUnion] = []
+        for node in model.get_nodes():
+            self._add_node(node.id, self._node_fields(node), INITIAL, write=False)
+        for edge in model.get_edges():
+            self._add_edge(edge, INITIAL, write=False)
+
+    def _node_fields(self, node: process_model.Node) -> dict[str, Any]:
+        return {name: getattr(node, name) for name in self._field_names}
+
+    def _values(self, node_id: process_model.NodeId) -> dict[str, Any]:
+        return {name: register.value for name, register in self._fields.get(node_id, {}).items()}
+
+    @staticmethod
+    def _changed_fields(old_fields: dict[str, Any], fields: dict[str, Any]) -> dict[str, Any]:
+        # Unchanged fields are mostly the same objects, and comparing pydantic models is slow.
+        return {
+            name: value
+            for name, value in fields.items()
+            if name not in old_fields or (old_fields[name] is not value and old_fields[name] != value)
+        }
+
+    def _edges_of(self, node_id: process_model.NodeId) -> list[process_model.Edge]:
+        return [edge for edge in self._incident.get(node_id, ()) if edge in self._edges]
+
+    # Applying operations. With `write`, the changes are written to the model, which is already up to date with the
+    # operations of commits.
+
+    def _write_fields(self, node: process_model.Node, fields: dict[str, Any]) -> None:
+        for name, value in fields.items():
+            if name == "position":
+                self.model.move_node(node.id, value.x, value.y)
+            else:
+                setattr(node, name, value)
+
+    def _write_edge(self, edge: process_model.Edge) -> None:
+        if edge in self._edges and edge.start_node_id in self._nodes and edge.end_node_id in self._nodes:
+            self.model.add_edge(edge)
+        else:
+            self.model.discard_edge(edge)
+
+    def _add_node(
+        self, node_id: process_model.NodeId, fields: dict[str, Any], tag: Timestamp, write: bool = True
+    ) -> None:
+        registers = self._fields.setdefault(node_id, {})
+        for name, value in fields.items():
+            register = registers.get(name)
+            if register is None:
+                registers[name] = LWWRegister(value, tag)
+            else:
+                register.set(value, tag)
+        self._nodes.add(node_id, tag)
+        if not write or node_id not in self._nodes:
+            return
+        node = self.model.get_node(node_id)
+        if node is not None:
+            self._write_fields(node, self._values(node_id))
+            return
+        self.model.add_node(self._node_class(id=node_id, **self._values(node_id)))
+        for edge in self._edges_of(node_id):
+            self._write_edge(edge)
+
+    def _remove_node(self, node_id: process_model.NodeId, tags: Iterable[Timestamp], write: bool = True) -> None:
+        if not self._nodes.remove(node_id, tags):
+            return
+        self._removed_nodes.add(node_id)
+        if write and self.model.get_node(node_id) is not None:
+            self.model.delete_node(node_id)
+
+    def _set_fields(
+        self, node_id: process_model.NodeId, fields: dict[str, Any], timestamp: Timestamp, write: bool = True
+    ) -> None:
+        if node_id not in self._nodes:
+            # Set concurrently with the removal of the node.
+            self._removed_nodes.add(node_id)
+        registers = self._fields.setdefault(node_id, {})
+        changed = {}
+        for name, value in fields.items():
+            register = registers.get(name)
+            if register is None:
+                registers[name] = LWWRegister(value, timestamp)
+                changed[name] = value
+            elif register.set(value, timestamp):
+                changed[name] = value
+        node = self.model.get_node(node_id) if write and changed else None
+        if node is not None:
+            self._write_fields(node, changed)
+
+    def _add_edge(self, edge: process_model.Edge, tag: Timestamp, write: bool = True) -> None:
+        self._edges.add(edge, tag)
+        self._incident.setdefault(edge.start_node_id, set()).add(edge)
+        self._incident.setdefault(edge.end_node_id, set()).add(edge)
+        if write:
+            self._write_edge(edge)
+
+    def _remove_edge(self, edge: process_model.Edge, tags: Iterable[Timestamp], write: bool = True) -> None:
+        if self._edges.remove(edge, tags):
+            for node_id in (edge.start_node_id, edge.end_node_id):
+                incident = self._incident.get(node_id)
+                if incident is not None:
+                    incident.discard(edge)
+                    if not incident:
+                        del self._incident[node_id]
+            if write:
+                self._write_edge(edge)
+
+    def _validate_fields(self, fields: dict[str, Any]) -> dict[str, Any]:
+        """Validate the fields that operations may set, dropping any other keys."""
+        validated = {}
+        for name, value in fields.items():
+            if name not in self._settable_fields:
+                continue
+            field = self._node_class.__fields__[name]
+            validated[name], error = field.validate(value, {}, loc=name, cls=self._node_class)
+            if error:
+                raise pydantic.ValidationError([error], self._node_class)
+        return validated
+
+    def _is_valid_edge(self, edge: process_model.Edge, added_nodes: dict[process_model.NodeId, Any]) -> bool:
+        """Whether the model accepts an edge, once the nodes added by earlier operations of the same batch are added."""
+        if self.model.has_edge(edge):
+            # Added again concurrently.
+            return True
+        model = self.model
+        if edge.start_node_id in added_nodes or edge.end_node_id in added_nodes:
+            # Whether a new edge is valid only depends on its nodes, so check it against a model of just those rather
+            # than a copy of the whole model, which may be large or in columnar storage.
+            nodes = {
+                node_id: node
+                for node_id in (edge.start_node_id, edge.end_node_id)
+                if (node := added_nodes.get(node_id) or model.get_node(node_id)) is not None
+            }
+            model = process_model.model_type_to_class(model.model_type).construct(
+                id=model.id, model_type=model.model_type, nodes=nodes, edges=set()
+            )
+        return model.is_valid_edge(edge)
+
+    def _validated(
+        self, operation: OperationUnion, added_nodes: dict[process_model.NodeId, process_model.Node]
+    ) -> OperationUnion:
+        match operation:
+            case AddNodeOperation(node_id=node_id, fields=fields):
+                node = added_nodes[node_id] = self._node_class(**fields | {"id": node_id})
+                return operation.copy(update={"fields": self._node_fields(node)})
+            case SetNodeFieldsOperation(fields=fields):
+                return operation.copy(update={"fields": self._validate_fields(fields)})
+            case AddEdgeOperation(edge=edge):
+                edge = self._edge_class.parse_obj(edge)
+                # The model would not write an invalid edge, and the replica would no longer match it.
+                if not self._is_valid_edge(edge, added_nodes):
+                    error = pydantic.error_wrappers.ErrorWrapper(ValueError(f"invalid edge {edge.id}"), loc="edge")
+                    raise pydantic.ValidationError([error], AddEdgeOperation)
+                return operation.copy(update={"edge": edge})
+            case RemoveEdgeOperation(edge=edge):
+                return operation.copy(update={"edge": self._edge_class.parse_obj(edge)})
+        return operation
+
+    def apply(self, operations: list[OperationUnion]) -> None:
+        """
+        Apply operations of other replicas to the replica and the model. Raises `pydantic.ValidationError`, without
+        applying any of the operations, if the values of one are invalid or one adds an edge the model does not accept.
+        """
+        added_nodes: dict[process_model.NodeId, process_model.Node] = {}
+        for operation in [self._validated(operation, added_nodes) for operation in operations]:
+            match operation:
+                case AddNodeOperation(node_id=node_id, fields=fields, tag=tag):
+                    self.clock.observe(tag)
+                    self._add_node(node_id, fields, tag)
+                case RemoveNodeOperation(node_id=node_id, tags=tags):
+                    self._remove_node(node_id, tags)
+                case SetNodeFieldsOperation(node_id=node_id, fields=fields, timestamp=timestamp):
+                    self.clock.observe(timestamp)
+                    self._set_fields(node_id, fields, timestamp)
+                case AddEdgeOperation(edge=edge, tag=tag):
+                    self.clock.observe(tag)
+                    self._add_edge(edge, tag)
+                case RemoveEdgeOperation(edge=edge, tags=tags):
+                    self._remove_edge(edge, tags)
+
+    def collect_garbage(self) -> None:
+        """
+        Forget the removed tags of nodes and edges and the fields of removed nodes.
+
+        They let the replica merge operations that are concurrent with a removal, or that arrive after it or more than
+        once. Garbage may be collected whenever no such operation can arrive anymore, like on the server while no
+        other replica sends operations, or on a replica that only applies the operations of the server in order.
+        """
+        self._nodes.collect()
+        self._edges.collect()
+        for node_id in self._removed_nodes:
+            if node_id not in self._nodes:
+                self._fields.pop(node_id, None)
+        self._removed_nodes.clear()
+
+    # Creating operations
+
+    def take_operations(self) -> list[OperationUnion]:
+        """The operations created since the last call, to send to the other replicas."""
+        operations, self._operations = self._operations, []
+        return operations
+
+    # Operations of the replica are valid, so they are built without validation.
+
+    def _emit_add_node(self, node_id: process_model.NodeId, fields: dict[str, Any], write: bool) -> None:
+        tag = self.clock.tick()
+        self._add_node(node_id, fields, tag, write)
+        self._operations.append(AddNodeOperation.construct(node_id=node_id, fields=fields, tag=tag))
+
+    def _emit_remove_node(self, node_id: process_model.NodeId, write: bool) -> list[process_model.Edge]:
+        """Remove a node and its edges. Returns the removed edges."""
+        edges = self._edges_of(node_id)
+        for edge in edges:
+            self._emit_edge(edge, False, write)
+        tags = self._nodes.tags(node_id)
+        self._remove_node(node_id, tags, write)
+        self._operations.append(RemoveNodeOperation.construct(node_id=node_id, tags=tags))
+        return edges
+
+    def _emit_set_fields(self, node_id: process_model.NodeId, fields: dict[str, Any], write: bool) -> None:
+        timestamp = self.clock.tick()
+        self._set_fields(node_id, fields, timestamp, write)
+        self._operations.append(SetNodeFieldsOperation.construct(node_id=node_id, fields=fields, timestamp=timestamp))
+
+    def _emit_edge(self, edge: process_model.Edge, present: bool, write: bool) -> None:
+        if present:
+            tag = self.clock.tick()
+            self._add_edge(edge, tag, write)
+            self._operations.append(AddEdgeOperation.construct(edge=edge.dict(), tag=tag))
+        else:
+            tags = self._edges.tags(edge)
+            self._remove_edge(edge, tags, write)
+            self._operations.append(RemoveEdgeOperation.construct(edge=edge.dict(), tags=tags))
+
+    def commit(
+        self,
+        node_ids: Iterable[process_model.NodeId] | None = None,
+        edge_ids: Iterable[process_model.EdgeId] | None = None,
+    ) -> Change:
+        """
+        Create the operations for the changes of a command to the model, comparing the nodes and edges with the given
+        ids with the replica, or all of them for None.
+        """
+        before, after = Snapshot({}, {}), Snapshot({}, {})
+        if node_ids is None:
+            node_ids = {*self._nodes, *(node.id for node in self.model.get_nodes())}
+        for node_id in node_ids:
+            node = self.model.get_node(node_id)
+            if node is None:
+                if node_id in self._nodes:
+                    before.nodes[node_id], after.nodes[node_id] = self._values(node_id), None
+                    for edge in self._emit_remove_node(node_id, write=False):
+                        before.edges[edge], after.edges[edge] = True, False
+                continue
+            fields = self._node_fields(node)
+            if node_id not in self._nodes:
+                before.nodes[node_id], after.nodes[node_id] = None, fields
+                self._emit_add_node(node_id, fields, write=False)
+                continue
+            old_fields = self._values(node_id)
+            changed = self._changed_fields(old_fields, fields)
+            if changed:
+                before.nodes[node_id] = {name: old_fields.get(name) for name in changed}
+                after.nodes[node_id] = changed
+                self._emit_set_fields(node_id, changed, write=False)
+
+        if edge_ids is None:
+            model_edges = set(self.model.get_edges())
+            replica_edges = set(self._edges)
+        elif not edge_ids:
+            model_edges = replica_edges = set()
+        else:
+            edge_ids = set(edge_ids)
+            model_edges = {edge for edge in self.model.get_edges() if edge.id in edge_ids}
+            replica_edges = {edge for edge_id in edge_ids for edge in self._edges_of(edge_id[0]) if edge.id in edge_ids}
+        for edge in model_edges - replica_edges:
+            before.edges[edge], after.edges[edge] = False, True
+            self._emit_edge(edge, True, write=False)
+        for edge in replica_edges - model_edges:
+            before.edges[edge], after.edges[edge] = True, False
+            self._emit_edge(edge, False, write=False)
+        return Change(self, before, after)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """
+        Restore the state of nodes and edges with new operations. Fields of nodes that have been removed since are
+        not restored.
+        """
+        removed = []
+        for node_id, fields in snapshot.nodes.items():
+            if fields is None:
+                removed.append(node_id)
+            elif node_id not in self._nodes:
+                if set(fields) >= set(self._field_names):
+                    self._emit_add_node(node_id, fields, write=True)
+            else:
+                changed = self._changed_fields(self._values(node_id), fields)
+                if changed:
+                    self._emit_set_fields(node_id, changed, write=True)
+        for edge, present in snapshot.edges.items():
+            if present != (edge in self._edges):
+                self._emit_edge(edge, present, write=True)
+        for node_id in removed:
+            if node_id in self._nodes:
+                self._emit_remove_node(node_id, write=True)
+
+    def state(self) -> dict[str, Any]:
+        """The tags and timestamps of the nodes and edges, which other replicas need to create operations."""
+        return {
+            "clock": self.clock.counter,
+            "nodes": {
+                node_id: {
+                    "tags": self._nodes.tags(node_id),
+                    "timestamps": {name: register.timestamp for name, register in self._fields[node_id].items()},
+                }
+                for node_id in self._nodes
+            },
+            "edges": [{"edge": edge.dict(), "tags": self._edges.tags(edge)} for edge in self._edges],
+        }
+
+    def sync(self, state: dict[str, Any]) -> None:
+        """
+        Take the tags and timestamps of another replica's `state`, taken with the model this replica was created
+        from, so that the replica can apply the later operations of the others. Accepts the state decoded from JSON.
+        """
+        self.clock.observe(Timestamp(state["clock"], ""))
+        self._nodes, self._edges, self._incident = ORSet(), ORSet(), {}
+        for node_id, node_state in state["nodes"].items():
+            node_id = process_model.NodeId(int(node_id))
+            for tag in node_state["tags"]:
+                self._nodes.add(node_id, Timestamp(*tag))
+            registers = self._fields.get(node_id, {})
+            for name, timestamp in node_state["timestamps"].items():
+                if name in registers:
+                    registers[name].timestamp = Timestamp(*timestamp)
+        for edge_state in state["edges"]:
+            edge = self._edge_class.parse_obj(edge_state["edge"])
+            for tag in edge_state["tags"]:
+                self._add_edge(edge, Timestamp(*tag), write=False)
@@ -0,0 +1,96 @@
+"""
+Fast validation of decoded JSON messages against pydantic models.
+
+Pydantic validates a discriminated union by wrapping every member in a field of its own, and validates every field
+of a model through its chain of validators. `UnionDecoder` looks up the member by its discriminator and validates
+against that model only, and `ModelDecoder` checks plain scalar fields directly and builds the model with
+`construct`. Whatever the direct checks do not accept is left to pydantic, so invalid data is still rejected with a
+`pydantic.ValidationError`.
+"""
+import typing
+from typing import Any, Callable, Generic, Literal, TypeVar
+
+import pydantic
+import pydantic.fields
+
+ModelT = TypeVar("ModelT", bound=pydantic.BaseModel)
+
+
+class _Unchecked(ValueError):
+    """Raised by a direct check for data that pydantic has to validate."""
+
+
+def _unchecked() -> Any:
+    raise _Unchecked
+
+
+def _scalar_check(field: pydantic.fields.ModelField) -> Callable[[Any], Any] | None:
+    """Check and convert a value of a field as pydantic does, for the fields that need no more than that."""
+    if field.shape != pydantic.fields.SHAPE_SINGLETON or field.class_validators or field.alias != field.name:
+        return None
+    type_ = field.outer_type_
+    while hasattr(type_, "__supertype__"):
+        # NewType
+        type_ = type_.__supertype__
+    if typing.get_origin(type_) is Literal:
+        values = typing.get_args(type_)
+        return lambda value: value if type(value) is str and value in values else _unchecked()
+    if type_ is int:
+        # bool is an int, but pydantic converts it.
+        return lambda value: value if type(value) is int else _unchecked()
+    if type_ is float:
+        return lambda value: float(value) if type(value) in (int, float) else _unchecked()
+    config = field.model_config
+    string_constraints = [config.anystr_strip_whitespace, config.anystr_lower, config.max_anystr_length]
+    if type_ is str and not any(string_constraints) and not config.min_anystr_length:
+        return lambda value: value if type(value) is str else _unchecked()
+    return None
+
+
+class ModelDecoder(Generic[ModelT]):
+    def __init__(self, model: type[ModelT]) -> None:
+        self.model = model
+        self._checks: dict[str, Callable[[Any], Any]] | None = {}
+        self._required = {name for name, field in model.__fields__.items() if field.required}
+        config = model.__config__
+        if model.__pre_root_validators__ or model.__post_root_validators__ or config.extra != pydantic.Extra.ignore:
+            self._checks = None
+            return
+        for name, field in model.__fields__.items():
+            check = UnionDecoder(field).decode if field.discriminator_key is not None else _scalar_check(field)
+            if check is None:
+                self._checks = None
+                return
+            self._checks[name] = check
+
+    def decode(self, data: Any) -> ModelT:
+        if self._checks is None or type(data) is not dict:
+            return self.model.parse_obj(data)
+        values = {}
+        try:
+            for name, check in self._checks.items():
+                if name in data:
+                    values[name] = check(data[name])
+                elif name in self._required:
+                    raise _Unchecked
+        except _Unchecked:
+            return self.model.parse_obj(data)
+        return self.model.construct(_fields_set=set(values), **values)
+
+
+class UnionDecoder:
+    """Decodes data into the member of a discriminated union field chosen by the value of the discriminator."""
+
+    def __init__(self, field: pydantic.fields.ModelField) -> None:
+        if field.discriminator_key is None or field.sub_fields_mapping is None:
+            raise TypeError(f"{field.name} is not a discriminated union")
+        self.discriminator = field.discriminator_alias
+        self.decoders = {value: ModelDecoder(member.type_) for value, member in field.sub_fields_mapping.items()}
+
+    def decode(self, data: Any) -> pydantic.BaseModel:
+        """Raises ValueError if there is no member for the data."""
+        try:
+            decoder = self.decoders[data[self.discriminator]]
+        except (TypeError, KeyError):
+            raise _Unchecked
+        return decoder.decode(data)
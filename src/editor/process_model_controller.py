@@ -1,21 +1,87 @@
+from typing import Hashable, Iterable
+
 from src import process_model
-from src.editor import command_history, commands
+from src.editor import command_history, commands, crdt
+
+
+def _touched(
+    command: commands.UndoableCommand, output: object
+) -> tuple[Iterable[process_model.NodeId] | None, Iterable[process_model.EdgeId] | None]:
+    """Ids of the nodes and edges a command may have changed, None for all of them."""
+    match command:
+        case commands.CreateNodeCommand():
+            return [output.id], []
+        case (
+            commands.DeleteNodeCommand(node_id=node_id)
+            | commands.MoveNodeCommand(node_id=node_id)
+            | commands.UpdateInspectablesCommand(node_id=node_id)
+        ):
+            return [node_id], []
+        case commands.BulkUpdateInspectablesCommand():
+            return output, []
+        case commands.CreateEdgeCommand():
+            return [], [output.id] if output is not None else []
+        case commands.DeleteEdgeCommand(edge_id=edge_id):
+            return [], [edge_id]
+        case _:
+            return None, None
 
 
 class ProcessModelController:
-    def __init__(self, model: process_model.ProcessModel) -> None:
+    def __init__(
+        self, model: process_model.ProcessModel, replica: str = "server", history_length: int | None = None
+    ) -> None:
         self.model = model
-        self.history = command_history.CommandHistory()
+        self.replica = crdt.ModelReplica(model, replica)
+        # Every user undoes their own commands, up to the last `history_length`. Commands executed without a user share
+        # a history.
+        self.histories: dict[Hashable, command_history.CommandHistory] = {}
+        self.history_length = history_length
+        # Operations of the last command, undo, redo or applied operations, for the other replicas.
+        self.operations: list[crdt.OperationUnion] = []
+        # Incremented whenever the model may have changed, used to invalidate derived state.
+        self.version = 0
+
+    @property
+    def history(self) -> command_history.CommandHistory:
+        return self.user_history(None)
 
-    def execute(self, command: commands.ProcessModelCommand[commands.CommandOutputT]) -> commands.CommandOutputT:
+    def user_history(self, user: Hashable) -> command_history.CommandHistory:
+        history = self.histories.get(user)
+        if history is None:
+            history = self.histories[user] = command_history.CommandHistory(self.history_length)
+        return history
+
+    def remove_user(self, user: Hashable) -> None:
+        self.histories.pop(user, None)
+
+    def execute(
+        self, command: commands.ProcessModelCommand[commands.CommandOutputT], user: Hashable = None
+    ) -> commands.CommandOutputT:
         command.set_model(self.model)
-        return self.history.execute(command)
+        output = command.execute()
+        if isinstance(command, commands.UndoableCommand):
+            self.user_history(user).push(self.replica.commit(*_touched(command, output)))
+            self.operations = self.replica.take_operations()
+            self.version += 1
+        return output
+
+    def undo(self, user: Hashable = None) -> None:
+        self.user_history(user).undo()
+        self.operations = self.replica.take_operations()
+        self.version += 1
 
-    def undo(self) -> None:
-        self.history.undo()
+    def redo(self, user: Hashable = None) -> None:
+        self.user_history(user).redo()
+        self.operations = self.replica.take_operations()
+        self.version += 1
 
-    def redo(self) -> None:
-        self.history.redo()
+    def apply(self, operations: list[crdt.OperationUnion]) -> None:
+        """Apply the operations of another replica. Raises `pydantic.ValidationError` if one is invalid."""
+        self.replica.apply(operations)
+        self.operations = operations
+        self.version += 1
 
     def clear(self) -> None:
-        self.history.clear()
+        for history in self.histories.values():
+            history.clear()
@@ -0,0 +1,356 @@
+"""
+Relay of editor sessions to read-only spectators.
+
+The relay serves spectators in a process of its own, so that the work of the editor server for a session does not
+grow with its audience. For every session with spectators, the relay watches the session on the editor server once,
+receiving the operations of edits, and applies them to a replica of the model. Once per tick in which the model
+changed, it builds the events for its spectators, encodes each once per encoding and sends the same frames to all of
+them, so the edits of a tick are coalesced into the latest model. Spectators that join get the encoded model of the
+tick, and spectators that receive operations get the operations of a tick in one event.
+
+Spectators connect to the relay as to the editor server, with a `WatchSessionRequest`. Spectators that are too slow
+to keep up skip models or operations until the frames waiting to be sent to them have drained, then get the latest
+model. A single reaper task stops watching sessions that have had no spectators for `CLOSE_TIMEOUT`.
+"""
+import asyncio
+import collections
+import functools
+import logging
+import time
+from typing import Callable, Literal
+
+import pydantic
+import websockets
+import websockets.exceptions
+import websockets.server
+
+from src import metrics
+from src import process_model
+from src.editor import collaboration, crdt, encodings
+
+logger = logging.getLogger(__name__)
+
+# Seconds before reconnecting to the editor server, before closing a session without spectators, and between checks
+# for such sessions.
+RECONNECT_DELAY = 1.0
+CLOSE_TIMEOUT = 60.0
+REAP_INTERVAL = 5.0
+# Spectators with more bytes waiting to be sent skip models or operations until they have caught up.
+MAX_BUFFERED_BYTES = 1 << 20
+
+TICK_SECONDS = metrics.Histogram("relay_tick_seconds", "Time to build, encode and send the events of a tick.")
+TICK_OPERATIONS = metrics.Histogram(
+    "relay_tick_operations",
+    "Operations coalesced in a tick with changes.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+SKIPPED_MODELS = metrics.Counter(
+    "relay_skipped_models_total", "Models or operations not sent to spectators that were behind."
+)
+
+
+class SessionUnavailable(Exception):
+    """The editor server did not send the model of a session."""
+
+
+class RelayedSession:
+    """A session of the editor server, watched once by the relay and sent to the spectators of the relay."""
+
+    model_id: process_model.ModelId
+    replica: crdt.ModelReplica | None
+    _spectators: set[websockets.server.WebSocketServerProtocol]
+    _encodings: dict[websockets.server.WebSocketServerProtocol, encodings.Encoding]
+    _operation_clients: set[websockets.server.WebSocketServerProtocol]
+    # Spectators that skipped the latest model or operations.
+    _lagging: set[websockets.server.WebSocketServerProtocol]
+    # Monotonic time since when the session has had no spectators, or None while it has.
+    idle_since: float | None
+    # Events of the model and encoded frames of them, since the last tick with changes.
+    _events: dict[str, dict]
+    _frames: dict[tuple[str, encodings.Encoding], str | bytes]
+
+    def __init__(self, model_id: process_model.ModelId, upstream_url: str, tick: float) -> None:
+        self.model_id = model_id
+        self.replica = None
+        self._upstream_url = upstream_url
+        self._tick = tick
+        self._spectators = set()
+        self._encodings = {}
+        self._operation_clients = set()
+        self._lagging = set()
+        self._waiting = 0
+        self.idle_since = time.monotonic()
+        self._events = {}
+        self._frames = {}
+        # Received since the last tick.
+        self._operations: list[crdt.OperationUnion] = []
+        self._resync = False
+        self._model: process_model.ProcessModel | None = None
+        self._synced: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        ticks = asyncio.create_task(self._tick_forever())
+        try:
+            await self._watch_upstream()
+        finally:
+            ticks.cancel()
+            if relayed_sessions.get(self.model_id) is self:
+                relayed_sessions.pop(self.model_id)
+            if self._spectators:
+                # Watching failed, and the spectators would wait for models that never come.
+                spectators = list(self._spectators)
+                await asyncio.gather(
+                    *(spectator.close(code=1011, reason="Session unavailable") for spectator in spectators)
+                )
+
+    def close(self) -> None:
+        """Stop watching the session."""
+        logger.info("closing relayed session=%s", self.model_id)
+        # Spectators that watch the session from now on watch it anew.
+        if relayed_sessions.get(self.model_id) is self:
+            relayed_sessions.pop(self.model_id)
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _watch_upstream(self) -> None:
+        """Watch the session on the editor server, and watch it again whenever the connection is lost."""
+        request = collaboration.Request(
+            request=collaboration.WatchSessionRequest(
+                request_type="watch_session",
+                model_id=self.model_id,
+                encoding=encodings.negotiate("msgpack"),
+                operations=True,
+            )
+        )
+        while True:
+            try:
+                async with websockets.connect(self._upstream_url, compression=None, max_size=None) as upstream:
+                    await upstream.send(request.json())
+                    async for message in upstream:
+                        self.receive(encodings.decode(message))
+            except (OSError, websockets.exceptions.WebSocketException) as error:
+                logger.warning("upstream closed session=%s error=%s", self.model_id, error)
+            except (ValueError, KeyError, AttributeError, TypeError):
+                # Invalid events, like operations before the replica state. Watching the session again resyncs the
+                # replica and the spectators.
+                logger.exception("invalid upstream event session=%s", self.model_id)
+            if self.replica is None:
+                logger.error("session unavailable session=%s", self.model_id)
+                self._synced.set_exception(SessionUnavailable(self.model_id))
+                return
+            await asyncio.sleep(RECONNECT_DELAY)
+            logger.info("reconnecting session=%s", self.model_id)
+
+    def receive(self, data: dict) -> None:
+        """Receive an event from the editor server."""
+        match data.get("event_type"):
+            case "update_model":
+                model_type = process_model.ProcessModelType(data["model"]["model_type"])
+                self._model = process_model.model_type_to_class(model_type).parse_obj(data["model"])
+            case "sync_replica":
+                # Sent right after the model.
+                replica = crdt.ModelReplica(self._model, data.get("replica_id") or "relay")
+                replica.sync(data["replica"])
+                # After reconnecting, the spectators may have missed operations.
+                self._resync = self.replica is not None
+                self.replica = replica
+                self._operations = []
+                if not self._synced.done():
+                    self._synced.set_result(None)
+            case "operations":
+                operations = collaboration.OperationsEvent.parse_obj(data).operations
+                self.replica.apply(operations)
+                # The relay applies the operations of the editor server in order and creates none of its own.
+                self.replica.collect_garbage()
+                self._operations.extend(operations)
+
+    def _event(self, event_type: Literal["update_model", "sync_replica"]) -> dict:
+        if event_type not in self._events:
+            # The model and the replica state are built together, so that they match.
+            self._events, self._frames = {}, {}
+            with collaboration.EVENT_BUILD_SECONDS.labels("update_model").time():
+                self._events["update_model"] = dict(collaboration.UpdateModelEvent.from_model(self.replica.model))
+            if event_type == "sync_replica" or self._operation_clients:
+                with collaboration.EVENT_BUILD_SECONDS.labels("sync_replica").time():
+                    self._events["sync_replica"] = dict(collaboration.SyncReplicaEvent(replica=self.replica.state()))
+        return self._events[event_type]
+
+    def frame(self, event_type: Literal["update_model", "sync_replica"], encoding: encodings.Encoding) -> str | bytes:
+        """The encoded model or replica state, shared by all spectators until the next tick with changes."""
+        frame = self._frames.get((event_type, encoding))
+        if frame is None:
+            data = self._event(event_type)
+            with collaboration.EVENT_SERIALIZATION_SECONDS.labels(event_type, encoding).time():
+                frame = self._frames[(event_type, encoding)] = encodings.encode(data, encoding)
+            collaboration.EVENT_BYTES.labels(event_type, encoding).observe(len(frame))
+        return frame
+
+    def _broadcast(
+        self,
+        clients: set[websockets.server.WebSocketServerProtocol],
+        event_type: str,
+        encode: Callable[[encodings.Encoding], str | bytes],
+    ) -> None:
+        groups: dict[encodings.Encoding, list[websockets.server.WebSocketServerProtocol]]
+        groups = collections.defaultdict(list)
+        for client in clients:
+            groups[self._encodings[client]].append(client)
+        for encoding, group in groups.items():
+            message = encode(encoding)
+            with collaboration.BROADCAST_SECONDS.labels(event_type).time():
+                websockets.broadcast(group, message)
+
+    def _encode_operations(self, operations: list[crdt.OperationUnion], encoding: encodings.Encoding) -> str | bytes:
+        data = dict(collaboration.OperationsEvent.construct(operations=operations))
+        with collaboration.EVENT_SERIALIZATION_SECONDS.labels("operations", encoding).time():
+            message = encodings.encode(data, encoding)
+        collaboration.EVENT_BYTES.labels("operations", encoding).observe(len(message))
+        return message
+
+    def flush(self) -> None:
+        """Send the changes since the last tick to the spectators."""
+        changed, resync, operations = bool(self._operations), self._resync, self._operations
+        if not (changed or resync or self._lagging):
+            return
+        self._operations, self._resync = [], False
+        with TICK_SECONDS.time():
+            if changed:
+                TICK_OPERATIONS.observe(len(operations))
+            if changed or resync:
+                self._events, self._frames = {}, {}
+                clients = self._spectators
+            else:
+                clients = self._lagging
+            lagging = {client for client in clients if client.transport.get_write_buffer_size() > MAX_BUFFERED_BYTES}
+            SKIPPED_MODELS.inc(len(lagging))
+            model_clients = clients - self._operation_clients - lagging
+            operation_clients = (clients & self._operation_clients) - lagging
+            # Operations may have been missed while the relay reconnected or skipped while behind, so they get the
+            # whole model again.
+            resynced = operation_clients if resync else operation_clients & self._lagging
+            self._lagging = lagging
+            self._broadcast(resynced, "update_model", functools.partial(self.frame, "update_model"))
+            self._broadcast(resynced, "sync_replica", functools.partial(self.frame, "sync_replica"))
+            if changed:
+                encode = functools.partial(self._encode_operations, operations)
+                self._broadcast(operation_clients - resynced, "operations", encode)
+            self._broadcast(model_clients, "update_model", functools.partial(self.frame, "update_model"))
+
+    async def _tick_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._tick)
+            if self.replica is not None:
+                self.flush()
+
+    async def watch(
+        self,
+        websocket: websockets.server.WebSocketServerProtocol,
+        encoding: encodings.Encoding = "json",
+        operations: bool = False,
+    ) -> None:
+        self._waiting += 1
+        self.idle_since = None
+        try:
+            await asyncio.shield(self._synced)
+        except SessionUnavailable:
+            await websocket.close(code=1011, reason="Session unavailable")
+            return
+        finally:
+            self._waiting -= 1
+            self._update_idle()
+        encoding = encodings.negotiate(encoding)
+        self._encodings[websocket] = encoding
+        if operations:
+            self._operation_clients.add(websocket)
+        # The replica state first, since building it builds the model again if it changed since the model was encoded.
+        replica_frame = self.frame("sync_replica", encoding) if operations else None
+        # Written without waiting, so that no operations are broadcast between the model and the replica state.
+        websockets.broadcast([websocket], collaboration.EncodingEvent(encoding=encoding).json())
+        websockets.broadcast([websocket], self.frame("update_model", encoding))
+        if replica_frame is not None:
+            websockets.broadcast([websocket], replica_frame)
+        self._spectators.add(websocket)
+        # Nothing was awaited since the wait above, so the reaper cannot have seen the session idle in between.
+        self._update_idle()
+        try:
+            # Spectators cannot send messages to the relay.
+            await websocket.wait_closed()
+        finally:
+            self._spectators.remove(websocket)
+            self._encodings.pop(websocket)
+            self._operation_clients.discard(websocket)
+            self._lagging.discard(websocket)
+            self._update_idle()
+
+    def _update_idle(self) -> None:
+        if self._spectators or self._waiting:
+            self.idle_since = None
+        elif self.idle_since is None:
+            self.idle_since = time.monotonic()
+
+
+relayed_sessions: dict[process_model.ModelId, RelayedSession] = {}
+_reaper: asyncio.Task | None = None
+
+
+def reap() -> None:
+    """Stop watching the sessions that have had no spectators for `CLOSE_TIMEOUT` seconds."""
+    now = time.monotonic()
+    for session in list(relayed_sessions.values()):
+        if session.idle_since is not None and now - session.idle_since >= CLOSE_TIMEOUT:
+            session.close()
+
+
+async def _reap_forever() -> None:
+    while True:
+        await asyncio.sleep(REAP_INTERVAL)
+        reap()
+
+
+def _start_reaper() -> None:
+    global _reaper
+    loop = asyncio.get_running_loop()
+    if _reaper is None or _reaper.done() or _reaper.get_loop() is not loop:
+        _reaper = loop.create_task(_reap_forever())
+
+
+metrics.Gauge("relay_sessions", "Sessions watched by the relay.", function=lambda: len(relayed_sessions))
+metrics.Gauge(
+    "relay_spectators",
+    "Spectators of the relayed sessions.",
+    function=lambda: sum(len(session._spectators) for session in relayed_sessions.values()),
+)
+
+
+async def handler(
+    websocket: websockets.server.WebSocketServerProtocol,
+    upstream_url: str = "ws://localhost:8001",
+    tick: float = 0.1,
+) -> None:
+    """
+    Handle a spectator of the relay, relaying the session it watches from the editor server at `upstream_url` every
+    `tick` seconds. Collaborators connect to the editor server instead.
+    """
+    message = await websocket.recv()
+    try:
+        request = collaboration.decode_request(message)
+    except pydantic.ValidationError as error:
+        logger.warning("invalid request address=%s bytes=%d error=%s", websocket.remote_address, len(message), error)
+        await websocket.close(code=1003, reason="Invalid request")
+        return
+
+    match request:
+        case collaboration.WatchSessionRequest(model_id=model_id, encoding=encoding, operations=operations):
+            _start_reaper()
+            session = relayed_sessions.get(model_id)
+            if session is None:
+                session = relayed_sessions[model_id] = RelayedSession(model_id, upstream_url, tick)
+                session.start()
+            await session.watch(websocket, encoding, operations)
+        case unknown_request:
+            logger.warning("not a watch request address=%s request=%r", websocket.remote_address, unknown_request)
+            await websocket.close(code=1008, reason="The relay only serves spectators")
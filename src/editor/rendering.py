@@ -0,0 +1,61 @@
+import asyncio
+import concurrent.futures
+import functools
+import pathlib
+from typing import Iterable
+
+import jinja2
+
+from src import inspector
+from src import process_model
+
+
+TEMPLATE_FOLDER = pathlib.Path(__file__).parents[2] / "templates"
+
+
+class InspectorRenderer:
+    """
+    Render inspector panels on a thread pool, off the websocket event loop.
+
+    The template is compiled once when the renderer is created, so a render is only the template evaluation.
+    """
+
+    TEMPLATE_NAME = "inspector_content.html"
+    RENDER_TIMEOUT = 2.0
+
+    def __init__(self, template_folder: pathlib.Path = TEMPLATE_FOLDER, max_workers: int = 2) -> None:
+        environment = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(template_folder),
+            autoescape=jinja2.select_autoescape(["html"]),
+        )
+        self._template = environment.get_template(self.TEMPLATE_NAME)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="inspector-renderer"
+        )
+
+    def render(
+        self,
+        properties: Iterable[inspector.InspectableField],
+        node_id: process_model.NodeId,
+        model_id: process_model.ModelId,
+    ) -> str:
+        return self._template.render(properties=properties, node_id=node_id, model_id=model_id)
+
+    async def render_async(
+        self,
+        properties: Iterable[inspector.InspectableField],
+        node_id: process_model.NodeId,
+        model_id: process_model.ModelId,
+    ) -> str:
+        """
+        Render on the executor. The properties must be a snapshot (see `InspectorMixin.get_inspectables`) since
+        the model keeps changing on the event loop while the template is evaluated.
+
+        Raises `asyncio.TimeoutError` if rendering takes longer than `RENDER_TIMEOUT` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        render = functools.partial(self.render, properties, node_id, model_id)
+        return await asyncio.wait_for(loop.run_in_executor(self._executor, render), self.RENDER_TIMEOUT)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import pathlib
+
+import pytest
+import websockets
+from src.editor import collaboration
+from src.editor import commands
+from src.editor import crdt
+from src.process_model import process_model
+from src.process_model import petri_net
+
+
+@pytest.fixture
+def session():
+    model = process_model.PetriNet(id=1, model_type=process_model.ProcessModelType.PETRI_NET)
+    model.add_node(
+        petri_net.PetriNetNode(
+            id=process_model.NodeId(1),
+            position=process_model.Point(x=0, y=0),
+            name="Node#1",
+            node_type=petri_net.NodeType.PLACE,
+        )
+    )
+    return collaboration.EditorSession(model)
+
+
+def test_render_inspector_is_cached_per_inspectable_values(session: collaboration.EditorSession):
+    node = session.model_controller.model.get_node(process_model.NodeId(1))
+
+    html = asyncio.run(session.render_inspector(node))
+    assert "Node#1" in html
+    assert asyncio.run(session.render_inspector(node)) is html
+
+    # Edits of other nodes keep the rendering.
+    session.model_controller.model.add_node(
+        petri_net.PetriNetNode(
+            id=process_model.NodeId(2),
+            position=process_model.Point(x=0, y=0),
+            name="Node#2",
+            node_type=petri_net.NodeType.TRANSITION,
+        )
+    )
+    session.model_controller.execute(
+        commands.UpdateInspectablesCommand(node_id=process_model.NodeId(2), node_kwargs={"name": "Other Name"})
+    )
+    assert asyncio.run(session.render_inspector(node)) is html
+
+    session.model_controller.execute(
+        commands.UpdateInspectablesCommand(node_id=process_model.NodeId(1), node_kwargs={"name": "New Name"})
+    )
+    assert "New Name" in asyncio.run(session.render_inspector(node))
+
+
+def test_inspector_renderer_matches_flask_rendering(session: collaboration.EditorSession):
+    from src import server
+
+    node = session.model_controller.model.get_node(process_model.NodeId(1))
+    with server.app.app_context():
+        expected = server.flask.render_template(
+            "inspector_content.html", properties=node.get_inspectables(), node_id=node.id, model_id=1
+        )
+    assert collaboration.inspector_renderer.render(node.get_inspectables(), node_id=node.id, model_id=1) == expected
+
+
+def test_evicted_sessions_are_restored(session: collaboration.EditorSession, tmp_path: pathlib.Path):
+    path = tmp_path / "model.json"
+    session.model_controller.model.save(path)
+    settings = collaboration.SessionSettings(idle_timeout=0, directory=tmp_path / "sessions")
+    sessions = collaboration.SessionManager(settings)
+    editor = sessions.open(str(path))
+    editor.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=5, y=5))
+    state = editor.model_controller.replica.state()
+
+    sessions.reap()
+    assert sessions.open_editors == {}
+    editor = sessions.open(str(path))
+    assert editor.model_controller.model.get_node(process_model.NodeId(1)).position == process_model.Point(x=5, y=5)
+    assert editor.model_controller.replica.state() == state
+
+    # Unchanged sessions are not persisted again, and a saved model replaces the evicted session.
+    sessions.reap()
+    mtime = path.stat().st_mtime_ns
+    os.utime(path, ns=(mtime + 1000, mtime + 1000))
+    editor = sessions.open(str(path))
+    assert editor.model_controller.model.get_node(process_model.NodeId(1)).position == process_model.Point(x=0, y=0)
+    assert list((tmp_path / "sessions").iterdir()) == []
+
+
+def test_least_recently_used_idle_sessions_are_evicted(session: collaboration.EditorSession, tmp_path: pathlib.Path):
+    sessions = collaboration.SessionManager(collaboration.SessionSettings(max_open=2, directory=tmp_path / "sessions"))
+    editors = []
+    for index in range(3):
+        model = session.model_controller.model.copy(update={"id": process_model.ModelId(f"model-{index}")})
+        model.save(tmp_path / f"{index}.json")
+        editors.append(sessions.open(str(tmp_path / f"{index}.json")))
+        if index == 0:
+            # A session with a client is not idle.
+            editors[0]._collaborators.add(object())
+            editors[0]._update_idle()
+
+    assert list(sessions.open_editors.values()) == [editors[0], editors[2]]
+    editors[2]._collaborators.add(object())
+    editors[2]._update_idle()
+    sessions.open(str(tmp_path / "1.json"))
+    assert len(sessions.open_editors) == 3
+
+
+async def apply_operations_as_client(model_path: str, replica_ids: list[str]) -> str:
+    """Rename node 1 with operations of each of the replica ids, and return the replica id assigned to the client."""
+    async with websockets.serve(collaboration.handler, "localhost", 0) as server:
+        async with websockets.connect(f"ws://localhost:{server.sockets[0].getsockname()[1]}") as client:
+            request = {"request_type": "join_session", "model_id": model_path, "operations": True}
+            await client.send(json.dumps({"request": request}))
+            events = [json.loads(await asyncio.wait_for(client.recv(), 5)) for _ in range(3)]
+            assert [event["event_type"] for event in events] == ["encoding", "update_model", "sync_replica"]
+            for counter, replica_id in enumerate(replica_ids, 100):
+                operation = crdt.SetNodeFieldsOperation(
+                    node_id=1, fields={"name": replica_id}, timestamp=crdt.Timestamp(counter, replica_id)
+                )
+                request = {"request_type": "apply_operations", "operations": [json.loads(operation.json())]}
+                await client.send(json.dumps({"request": request}))
+            # Answered after the operations are processed.
+            await client.send(json.dumps({"request": {"request_type": "inspector", "node_id": 1}}))
+            await asyncio.wait_for(client.recv(), 5)
+            return events[2]["replica_id"]
+
+
+def test_operations_are_only_accepted_from_the_assigned_replica(
+    session: collaboration.EditorSession, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    settings = collaboration.SessionSettings(directory=tmp_path / "sessions")
+    monkeypatch.setattr(collaboration.sessions, "settings", settings)
+    model_path = str(tmp_path / "model.json")
+    session.model_controller.model.id = process_model.ModelId(model_path)
+    session.model_controller.model.save(pathlib.Path(model_path))
+
+    replica_id = asyncio.run(apply_operations_as_client(model_path, ["client-1", "server"]))
+    assert replica_id == "client-1"
+    editor = collaboration.sessions.open_editors[process_model.ModelId(model_path)]
+    assert editor.model_controller.model.get_node(process_model.NodeId(1)).name == "client-1"
+
+
+def test_large_petri_nets_are_edited_in_columnar_storage(
+    session: collaboration.EditorSession, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    model = session.model_controller.model
+    model.add_node(
+        petri_net.PetriNetNode(
+            id=process_model.NodeId(2),
+            position=process_model.Point(x=0, y=0),
+            name="Node#2",
+            node_type=petri_net.NodeType.TRANSITION,
+        )
+    )
+    model.add_edge_from_values(process_model.NodeId(1), process_model.NodeId(2))
+    model_path = tmp_path / "model.json"
+    model.id = process_model.ModelId(str(model_path))
+    model.save(model_path)
+    settings = collaboration.SessionSettings(idle_timeout=0, directory=tmp_path / "sessions", columnar_min_nodes=2)
+    monkeypatch.setattr(collaboration, "sessions", collaboration.SessionManager(settings))
+
+    editor = collaboration.get_open_editor(str(model_path))
+    assert isinstance(editor.model_controller.model, process_model.ColumnarPetriNet)
+    editor.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=5, y=5))
+    editor.execute(commands.DeleteNodeCommand(node_id=process_model.NodeId(2)))
+    editor.undo()
+    frame = json.loads(editor.join_frame("update_model", "json"))
+    assert frame == json.loads(collaboration.UpdateModelEvent.from_model(editor.model_controller.model).json())
+    assert {node["id"] for node in frame["model"]["nodes"].values()} == {1, 2}
+    fields = {"position": {"x": 0, "y": 0}, "name": "Node#3", "node_type": "transition"}
+    editor.apply(
+        [
+            crdt.AddNodeOperation(node_id=3, fields=fields, tag=crdt.Timestamp(1, "a")),
+            crdt.AddEdgeOperation(edge={"start_node_id": 1, "end_node_id": 3}, tag=crdt.Timestamp(2, "a")),
+        ]
+    )
+    assert {edge.id for edge in editor.model_controller.model.get_edges()} == {(1, 2), (1, 3)}
+
+    # Restored in columnar storage as well.
+    collaboration.sessions.reap()
+    editor = collaboration.get_open_editor(str(model_path))
+    assert isinstance(editor.model_controller.model, process_model.ColumnarPetriNet)
+    assert editor.model_controller.model.get_node(process_model.NodeId(1)).position == process_model.Point(x=5, y=5)
+    assert editor.model_controller.model.get_node(process_model.NodeId(2)).name == "Node#2"
@@ -1,6 +1,8 @@
+import pydantic
 import pytest
 from src.editor import commands
 from src.editor import process_model_controller
+from src.process_model import dcr_graph
 from src.process_model import process_model
 from src.process_model import petri_net
 
@@ -182,3 +184,118 @@ def test_command_history(model: process_model.ProcessModel):
     controller.redo()
     controller.redo()
     assert model._serialize_to_dict() == edited_model
+
+
+def test_command_history_length(model: process_model.ProcessModel):
+    controller = process_model_controller.ProcessModelController(model, history_length=2)
+
+    for x in range(1, 4):
+        controller.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=x, y=0))
+    controller.undo()
+    controller.undo()
+    assert not controller.history.can_undo
+    assert model.get_node(process_model.NodeId(1)).position == process_model.Point(x=1, y=0)
+    controller.redo()
+    assert model.get_node(process_model.NodeId(1)).position == process_model.Point(x=2, y=0)
+
+
+def test_update_inspectables_command_validates_values(model: process_model.ProcessModel):
+    command = commands.UpdateInspectablesCommand(
+        node_id=process_model.NodeId(1), node_kwargs={"ball_count": "3", "node_id": "1", "id": 5}
+    )
+    command.set_model(model)
+
+    command.execute()
+    assert model.get_node(process_model.NodeId(1)).ball_count == 3
+    assert model.get_node(process_model.NodeId(1)).id == 1
+    assert model.get_node(process_model.NodeId(2)).ball_count == 0
+
+    invalid_command = commands.UpdateInspectablesCommand(
+        node_id=process_model.NodeId(1), node_kwargs={"name": "Other Name", "ball_count": "many"}
+    )
+    invalid_command.set_model(model)
+    with pytest.raises(pydantic.ValidationError):
+        invalid_command.execute()
+    assert model.get_node(process_model.NodeId(1)).name == "Node#1"
+
+    command.undo()
+    assert model.get_node(process_model.NodeId(1)).ball_count == 0
+
+
+def test_bulk_update_inspectables_command(model: process_model.ProcessModel):
+    command = commands.BulkUpdateInspectablesCommand(
+        node_ids=[process_model.NodeId(1), process_model.NodeId(2), process_model.NodeId(3)],
+        node_kwargs={"ball_count": "4"},
+    )
+    command.set_model(model)
+
+    assert command.execute() == [process_model.NodeId(1), process_model.NodeId(2)]
+    assert model.get_node(process_model.NodeId(1)).ball_count == 4
+    assert model.get_node(process_model.NodeId(2)).ball_count == 4
+
+    command.undo()
+    assert model.get_node(process_model.NodeId(1)).ball_count == 0
+    assert model.get_node(process_model.NodeId(2)).ball_count == 0
+
+
+def test_bulk_update_inspectables_command_with_duplicate_nodes(model: process_model.ProcessModel):
+    controller = process_model_controller.ProcessModelController(model)
+    node_id = process_model.NodeId(1)
+
+    controller.execute(
+        commands.BulkUpdateInspectablesCommand(node_ids=[node_id, node_id], node_kwargs={"ball_count": 7})
+    )
+    controller.undo()
+    assert model.get_node(node_id).ball_count == 0
+
+
+@pytest.fixture
+def dcr_model():
+    _model = dcr_graph.DcrGraph(id=2, model_type=process_model.ProcessModelType.DCR_GRAPH)
+    for node_id in (1, 2):
+        _model.add_node(
+            dcr_graph.DcrGraphNode(
+                id=process_model.NodeId(node_id), position=process_model.Point(x=0, y=0), name=f"Event#{node_id}"
+            )
+        )
+    _model.add_edge_from_values(
+        start_node_id=process_model.NodeId(1),
+        end_node_id=process_model.NodeId(2),
+        relation_type=dcr_graph.DcrRelationType.CONDITION,
+    )
+    return _model
+
+
+def test_dcr_edge_commands_act_on_their_relation(dcr_model: dcr_graph.DcrGraph):
+    start, end = process_model.NodeId(1), process_model.NodeId(2)
+    command = commands.CreateEdgeCommand(
+        start_node_id=start, end_node_id=end, edge_kwargs={"relation_type": dcr_graph.DcrRelationType.RESPONSE}
+    )
+    command.set_model(dcr_model)
+
+    edge = command.execute()
+    assert edge.id == (start, end, "response")
+    assert len(dcr_model.get_edges()) == 2
+    command.undo()
+    assert [edge.relation_type for edge in dcr_model.get_edges()] == [dcr_graph.DcrRelationType.CONDITION]
+
+    command.redo()
+    delete_command = commands.DeleteEdgeCommand.parse_obj({"command_type": "delete_edge", "edge_id": [1, 2, "response"]})
+    delete_command.set_model(dcr_model)
+    delete_command.execute()
+    assert [edge.relation_type for edge in dcr_model.get_edges()] == [dcr_graph.DcrRelationType.CONDITION]
+
+
+def test_delete_node_command_deletes_all_incident_edges(dcr_model: dcr_graph.DcrGraph):
+    # Regression test: deleting a node used to leave all but one of its edges in the model.
+    for start, end, relation_type in [(1, 2, "exclude"), (2, 1, "include"), (1, 1, "exclude")]:
+        dcr_model.add_edge_from_values(start_node_id=start, end_node_id=end, relation_type=relation_type)
+    command = commands.DeleteNodeCommand(node_id=process_model.NodeId(1))
+    command.set_model(dcr_model)
+    edges = set(dcr_model.get_edges())
+
+    command.execute()
+    assert dcr_model.get_edges() == []
+
+    command.undo()
+    assert set(dcr_model.get_edges()) == edges
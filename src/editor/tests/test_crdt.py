@@ -0,0 +1,185 @@
+import json
+
+import pydantic
+import pytest
+
+from src.editor import collaboration
+from src.editor import commands
+from src.editor import crdt
+from src.editor import process_model_controller
+from src.process_model import petri_net
+from src.process_model import process_model
+
+
+@pytest.fixture
+def model():
+    model = process_model.PetriNet(id=1, model_type=process_model.ProcessModelType.PETRI_NET)
+    for node_id, node_type in [(1, petri_net.NodeType.PLACE), (2, petri_net.NodeType.TRANSITION)]:
+        model.add_node(
+            petri_net.PetriNetNode(
+                id=process_model.NodeId(node_id),
+                position=process_model.Point(x=0, y=0),
+                name=f"Node#{node_id}",
+                node_type=node_type,
+            )
+        )
+    model.add_edge_from_values(process_model.NodeId(1), process_model.NodeId(2))
+    return model
+
+
+def test_or_set_keeps_concurrent_additions():
+    elements: crdt.ORSet[str] = crdt.ORSet()
+    first, second = crdt.Timestamp(1, "a"), crdt.Timestamp(1, "b")
+
+    assert elements.add("x", first)
+    assert not elements.add("x", second)
+    # Removes only the addition it has seen.
+    assert not elements.remove("x", [first])
+    assert "x" in elements
+    assert elements.remove("x", [second])
+    assert "x" not in elements
+    # Additions that arrive after their removal stay removed.
+    assert not elements.add("x", first)
+    assert "x" not in elements
+
+
+def test_lww_register():
+    register = crdt.LWWRegister("a", crdt.Timestamp(2, "a"))
+
+    assert not register.set("b", crdt.Timestamp(1, "b"))
+    assert register.set("c", crdt.Timestamp(2, "b"))
+    assert register.value == "c"
+
+
+def test_replicas_converge(model: process_model.ProcessModel):
+    a = process_model_controller.ProcessModelController(model.copy(deep=True), "a")
+    b = process_model_controller.ProcessModelController(model.copy(deep=True), "b")
+
+    a.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=1, y=1))
+    a_operations = a.operations
+    a.execute(commands.DeleteNodeCommand(node_id=process_model.NodeId(2)))
+    a_operations += a.operations
+    b.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=2, y=2))
+    b_operations = b.operations
+    b.execute(commands.UpdateInspectablesCommand(node_id=process_model.NodeId(2), node_kwargs={"name": "B"}))
+    b_operations += b.operations
+
+    # Operations are sent as JSON, and applied twice.
+    a.apply(collaboration.decode_request(apply_operations(b_operations)).operations * 2)
+    b.apply(collaboration.decode_request(apply_operations(a_operations)).operations)
+
+    assert a.model._serialize_to_dict() == b.model._serialize_to_dict()
+    # The later move wins, and the node is removed although it was renamed concurrently.
+    assert a.model.get_node(process_model.NodeId(1)).position == process_model.Point(x=2, y=2)
+    assert a.model.get_node(process_model.NodeId(2)) is None
+    assert a.model.get_edges() == []
+
+
+def apply_operations(operations: list[crdt.OperationUnion]) -> str:
+    return json.dumps(
+        {"request": {"request_type": "apply_operations", "operations": [json.loads(op.json()) for op in operations]}}
+    )
+
+
+def test_users_undo_their_own_commands(model: process_model.ProcessModel):
+    controller = process_model_controller.ProcessModelController(model)
+
+    controller.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=5, y=5), user="alice")
+    controller.execute(
+        commands.UpdateInspectablesCommand(node_id=process_model.NodeId(1), node_kwargs={"name": "Bob's"}), user="bob"
+    )
+    controller.execute(commands.DeleteNodeCommand(node_id=process_model.NodeId(2)), user="bob")
+
+    controller.undo("alice")
+    node = model.get_node(process_model.NodeId(1))
+    assert node.position == process_model.Point(x=0, y=0)
+    assert node.name == "Bob's"
+    assert not controller.user_history("alice").can_undo
+    assert [type(operation) for operation in controller.operations] == [crdt.SetNodeFieldsOperation]
+
+    controller.undo("bob")
+    assert model.get_node(process_model.NodeId(2)) is not None
+    assert [edge.id for edge in model.get_edges()] == [(1, 2)]
+    controller.redo("alice")
+    assert model.get_node(process_model.NodeId(1)).position == process_model.Point(x=5, y=5)
+
+
+def test_invalid_operations_are_not_applied(model: process_model.ProcessModel):
+    controller = process_model_controller.ProcessModelController(model)
+    timestamp = crdt.Timestamp(1, "client")
+    operations = [
+        crdt.SetNodeFieldsOperation(node_id=1, fields={"name": "Renamed"}, timestamp=timestamp),
+        crdt.SetNodeFieldsOperation(node_id=2, fields={"ball_count": "many"}, timestamp=timestamp),
+    ]
+
+    with pytest.raises(pydantic.ValidationError):
+        controller.apply(operations)
+    assert model.get_node(process_model.NodeId(1)).name == "Node#1"
+
+    # Fields that commands cannot change are ignored.
+    controller.apply([crdt.SetNodeFieldsOperation(node_id=1, fields={"id": 3, "color": "red"}, timestamp=timestamp)])
+    assert model.get_node(process_model.NodeId(1)).id == 1
+    assert not hasattr(model.get_node(process_model.NodeId(1)), "color")
+    assert controller.replica.clock.counter == 1
+
+
+def test_synced_replica_applies_later_operations(model: process_model.ProcessModel):
+    server = process_model_controller.ProcessModelController(model.copy(deep=True))
+    server.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=1, y=1))
+    server.execute(commands.DeleteNodeCommand(node_id=process_model.NodeId(2)))
+    server.undo()
+
+    # A replica of the model as sent to a client, with the state decoded from JSON.
+    replica = crdt.ModelReplica(server.model.copy(deep=True), "relay")
+    replica.sync(json.loads(json.dumps(server.replica.state())))
+    server.execute(commands.DeleteNodeCommand(node_id=process_model.NodeId(2)))
+    operations = server.operations
+    server.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=1, y=1))
+    replica.apply(operations + server.operations)
+
+    assert replica.model._serialize_to_dict() == server.model._serialize_to_dict()
+    assert replica.state() == server.replica.state()
+
+
+def test_collected_replica_forgets_removed_nodes(model: process_model.ProcessModel):
+    server = process_model_controller.ProcessModelController(model.copy(deep=True))
+    replica = crdt.ModelReplica(model.copy(deep=True), "relay")
+    replica.sync(server.replica.state())
+
+    server.execute(commands.DeleteNodeCommand(node_id=process_model.NodeId(2)))
+    replica.apply(server.operations)
+    replica.collect_garbage()
+
+    assert process_model.NodeId(2) not in replica._fields
+    assert list(replica._nodes._removed) == [] and list(replica._edges._removed) == []
+    server.execute(commands.CreateNodeCommand(x=1, y=1, node_kwargs=dict(node_type=petri_net.NodeType.TRANSITION)))
+    replica.apply(server.operations)
+    assert replica.model._serialize_to_dict() == server.model._serialize_to_dict()
+
+
+def test_replica_rejects_invalid_edges(model: process_model.ProcessModel):
+    replica = crdt.ModelReplica(model, "server")
+    fields = {"position": {"x": 0, "y": 0}, "name": "Node#3", "node_type": "transition"}
+    edge_to = {"start_node_id": 1, "end_node_id": 3}
+
+    # Edges of a Petri net connect a place and a transition.
+    with pytest.raises(pydantic.ValidationError):
+        replica.apply([crdt.AddEdgeOperation(edge={"start_node_id": 1, "end_node_id": 1}, tag=crdt.Timestamp(1, "a"))])
+    # Unless an earlier operation of the batch adds the node, an edge to it is invalid.
+    with pytest.raises(pydantic.ValidationError):
+        replica.apply([crdt.AddEdgeOperation(edge=edge_to, tag=crdt.Timestamp(2, "a"))])
+    replica.apply(
+        [
+            crdt.AddNodeOperation(node_id=3, fields=fields, tag=crdt.Timestamp(3, "a")),
+            crdt.AddEdgeOperation(edge=edge_to, tag=crdt.Timestamp(4, "a")),
+        ]
+    )
+    assert {edge.id for edge in model.get_edges()} == {(1, 2), (1, 3)}
+
+
+def test_replica_of():
+    timestamp = crdt.Timestamp(1, "a")
+
+    assert crdt.replica_of(crdt.SetNodeFieldsOperation(node_id=1, fields={}, timestamp=timestamp)) == "a"
+    assert crdt.replica_of(crdt.AddEdgeOperation(edge={}, tag=timestamp)) == "a"
+    assert crdt.replica_of(crdt.RemoveNodeOperation(node_id=1, tags=[timestamp])) is None
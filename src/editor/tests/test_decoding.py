@@ -0,0 +1,59 @@
+import json
+
+import pydantic
+import pytest
+
+from src.editor import collaboration
+from src.editor import commands
+
+
+def execute(command: dict) -> dict:
+    return {"request": {"request_type": "execute_command", "command": command}}
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        execute({"command_type": "move_node", "node_id": 1, "x": 2.5, "y": 3}),
+        # Values that pydantic converts.
+        execute({"command_type": "move_node", "node_id": "1", "x": "2.5", "y": True}),
+        execute({"command_type": "create_node", "x": 0, "y": 0, "node_kwargs": {"node_type": "place"}}),
+        execute({"command_type": "delete_edge", "edge_id": [1, 2]}),
+        execute({"command_type": "bulk_update_inspectables", "node_ids": [1, 2], "node_kwargs": {"name": "a"}}),
+        {"request": {"request_type": "undo", "extra": 1}},
+        {"request": {"request_type": "inspector", "node_id": 4}},
+        {"request": {"request_type": "join_session", "model_id": "models/a.pm"}},
+    ],
+)
+def test_decode_matches_pydantic(message: dict):
+    raw = json.dumps(message)
+    decoded = collaboration.decode_request(raw)
+    expected = collaboration.Request.parse_raw(raw).request
+    assert type(decoded) is type(expected)
+    assert decoded == expected
+    assert decoded.__fields_set__ == expected.__fields_set__
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "not json",
+        json.dumps([1, 2]),
+        json.dumps({"request": {"request_type": "unknown"}}),
+        json.dumps({"request": {"request_type": "inspector"}}),
+        json.dumps(execute({"command_type": "move_node", "node_id": 1, "x": "left", "y": 0})),
+        json.dumps(execute({"command_type": "teleport_node", "node_id": 1})),
+    ],
+)
+def test_decode_rejects_invalid_requests(raw: str):
+    with pytest.raises(pydantic.ValidationError):
+        collaboration.decode_request(raw)
+
+
+def test_decoded_command_executes():
+    request = collaboration.decode_request(
+        json.dumps(execute({"command_type": "move_node", "node_id": 1, "x": 2, "y": 3}))
+    )
+    assert isinstance(request.command, commands.MoveNodeCommand)
+    assert request.command.x == 2.0 and type(request.command.x) is float
+    assert request.command._model is None
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import pathlib
+
+import pytest
+import websockets
+
+from src.editor import collaboration
+from src.editor import encodings
+from src.process_model import petri_net
+from src.process_model import process_model
+
+
+@pytest.fixture
+def model():
+    model = process_model.PetriNet(id=1, model_type=process_model.ProcessModelType.PETRI_NET)
+    for node_id in range(3):
+        model.add_node(
+            petri_net.PetriNetNode(
+                id=process_model.NodeId(node_id),
+                position=process_model.Point(x=node_id, y=0.5),
+                name=f"Node#{node_id}",
+                node_type=petri_net.NodeType.TRANSITION if node_id == 1 else petri_net.NodeType.PLACE,
+            )
+        )
+    assert model.add_edge_from_values(process_model.NodeId(0), process_model.NodeId(1)) is not None
+    return model
+
+
+def test_json_encoding_matches_pydantic(model: process_model.ProcessModel):
+    events = [
+        collaboration.UpdateModelEvent.from_model(model),
+        collaboration.UpdateNodesEvent.from_nodes(list(model.nodes.values())),
+        collaboration.UpdateCollaboratorsEvent(collaborator_ids=[1, 2]),
+        collaboration.UpdateUndoRedoEvent(can_undo=True, can_redo=False),
+    ]
+    for event in events:
+        assert encodings.encode(dict(event), "json") == event.json()
+
+
+def test_msgpack_encoding(model: process_model.ProcessModel):
+    msgpack = pytest.importorskip("msgpack")
+    event = collaboration.UpdateModelEvent.from_model(model)
+
+    message = encodings.encode(dict(event), "msgpack")
+    assert isinstance(message, bytes)
+    decoded = msgpack.unpackb(message, strict_map_key=False)
+    # The same data as in JSON, except that node ids stay integers.
+    expected = json.loads(event.json())
+    expected["model"]["nodes"] = {int(node_id): node for node_id, node in expected["model"]["nodes"].items()}
+    assert decoded == expected
+
+
+def test_decode_msgpack_request():
+    msgpack = pytest.importorskip("msgpack")
+    command = {"command_type": "move_node", "node_id": 1, "x": 2, "y": 3}
+    request = {"request": {"request_type": "execute_command", "command": command}}
+
+    assert collaboration.decode_request(msgpack.packb(request)) == collaboration.decode_request(json.dumps(request))
+    with pytest.raises(collaboration.pydantic.ValidationError):
+        # Truncated
+        collaboration.decode_request(msgpack.packb(request)[:-1])
+    with pytest.raises(collaboration.pydantic.ValidationError):
+        collaboration.decode_request(msgpack.packb({"request": {"request_type": "unknown"}}))
+
+
+def test_negotiate_falls_back_to_json(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(encodings, "msgpack", None)
+
+    assert encodings.negotiate("msgpack") == "json"
+    assert encodings.negotiate("json") == "json"
+    request = collaboration.decode_request(
+        json.dumps({"request": {"request_type": "join_session", "model_id": "model.json", "encoding": "msgpack"}})
+    )
+    assert request.encoding == "msgpack"
+
+
+async def join_with_encoding(model_path: str, encoding: encodings.Encoding) -> list[str | bytes]:
+    """The first two messages to a client that joins a session asking for `encoding`."""
+    async with websockets.serve(collaboration.handler, "localhost", 0) as server:
+        async with websockets.connect(f"ws://localhost:{server.sockets[0].getsockname()[1]}") as client:
+            request = {"request": {"request_type": "join_session", "model_id": model_path, "encoding": encoding}}
+            await client.send(json.dumps(request))
+            return [await asyncio.wait_for(client.recv(), 5) for _ in range(2)]
+
+
+def test_negotiated_encoding_is_sent_first(
+    model: process_model.ProcessModel, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    msgpack = pytest.importorskip("msgpack")
+    model.id = process_model.ModelId(tmp_path.name)
+    model.save(tmp_path / "model.json")
+
+    encoding_event, model_event = asyncio.run(join_with_encoding(str(tmp_path / "model.json"), "msgpack"))
+    assert json.loads(encoding_event) == {"event_type": "encoding", "encoding": "msgpack"}
+    assert msgpack.unpackb(model_event, strict_map_key=False)["event_type"] == "update_model"
+
+    monkeypatch.setattr(encodings, "msgpack", None)
+    encoding_event, model_event = asyncio.run(join_with_encoding(str(tmp_path / "model.json"), "msgpack"))
+    assert json.loads(encoding_event) == {"event_type": "encoding", "encoding": "json"}
+    assert json.loads(model_event)["event_type"] == "update_model"
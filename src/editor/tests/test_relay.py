@@ -0,0 +1,255 @@
+import asyncio
+import functools
+import json
+import logging
+import pathlib
+import time
+import types
+
+import pytest
+import websockets
+import websockets.frames
+import websockets.server
+from websockets.legacy.protocol import State
+
+from src.editor import collaboration
+from src.editor import commands
+from src.editor import crdt
+from src.editor import process_model_controller
+from src.editor import relay
+from src.process_model import petri_net
+from src.process_model import process_model
+
+
+class FakeWebSocket:
+    """A spectator that keeps the messages broadcast to it, with `buffered` bytes still waiting to be sent."""
+
+    def __init__(self, buffered: int = 0) -> None:
+        self.state = State.OPEN
+        self.logger = logging.getLogger(__name__)
+        self.transport = types.SimpleNamespace(get_write_buffer_size=lambda: self.buffered)
+        self._fragmented_message_waiter = None
+        self.buffered = buffered
+        self.messages: list[dict] = []
+        self.closed = asyncio.Event()
+
+    async def wait_closed(self) -> None:
+        await self.closed.wait()
+
+    def write_frame_sync(self, fin: bool, opcode: websockets.frames.Opcode, data: bytes) -> None:
+        self.messages.append(json.loads(data))
+
+
+@pytest.fixture
+def model():
+    model = process_model.PetriNet(id=1, model_type=process_model.ProcessModelType.PETRI_NET)
+    for node_id in range(2):
+        model.add_node(
+            petri_net.PetriNetNode(
+                id=process_model.NodeId(node_id),
+                position=process_model.Point(x=0, y=0),
+                name=f"Node#{node_id}",
+                node_type=petri_net.NodeType.PLACE,
+            )
+        )
+    return model
+
+
+def test_relay_coalesces_edits_per_tick(model: process_model.ProcessModel):
+    server = process_model_controller.ProcessModelController(model)
+
+    async def relay_edits() -> None:
+        session = relay.RelayedSession(process_model.ModelId("model"), "ws://localhost:8001", tick=0.1)
+        session.receive(json.loads(collaboration.UpdateModelEvent.from_model(model).json()))
+        session.receive(json.loads(collaboration.SyncReplicaEvent(replica=server.replica.state()).json()))
+        spectator, operations_spectator, slow_spectator = FakeWebSocket(), FakeWebSocket(), FakeWebSocket(2 << 20)
+        session._spectators.update([spectator, operations_spectator, slow_spectator])
+        session._encodings.update(dict.fromkeys(session._spectators, "json"))
+        session._operation_clients.add(operations_spectator)
+
+        for x in range(1, 4):
+            server.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=x, y=0))
+            session.receive(json.loads(collaboration.OperationsEvent(operations=server.operations).json()))
+        session.flush()
+        session.flush()
+
+        assert [event["event_type"] for event in spectator.messages] == ["update_model"]
+        assert spectator.messages[0]["model"]["nodes"]["1"]["position"] == {"x": 3, "y": 0}
+        assert [event["event_type"] for event in operations_spectator.messages] == ["operations"]
+        operations = operations_spectator.messages[0]["operations"]
+        assert [operation["fields"]["position"]["x"] for operation in operations] == [1, 2, 3]
+        # The slow spectator gets the latest model once it has caught up.
+        assert slow_spectator.messages == []
+        slow_spectator.buffered = 0
+        session.flush()
+        assert slow_spectator.messages == spectator.messages
+        assert session.replica.model._serialize_to_dict() == model._serialize_to_dict()
+
+    asyncio.run(relay_edits())
+
+
+def test_relay_resyncs_operation_spectators_that_were_behind(model: process_model.ProcessModel):
+    server = process_model_controller.ProcessModelController(model)
+
+    async def relay_edits() -> None:
+        session = relay.RelayedSession(process_model.ModelId("model"), "ws://localhost:8001", tick=0.1)
+        session.receive(json.loads(collaboration.UpdateModelEvent.from_model(model).json()))
+        session.receive(json.loads(collaboration.SyncReplicaEvent(replica=server.replica.state()).json()))
+        slow_spectator = FakeWebSocket(2 << 20)
+        session._spectators.add(slow_spectator)
+        session._encodings[slow_spectator] = "json"
+        session._operation_clients.add(slow_spectator)
+
+        server.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=1, y=0))
+        session.receive(json.loads(collaboration.OperationsEvent(operations=server.operations).json()))
+        session.flush()
+        assert slow_spectator.messages == []
+
+        slow_spectator.buffered = 0
+        session.flush()
+        assert [event["event_type"] for event in slow_spectator.messages] == ["update_model", "sync_replica"]
+        assert slow_spectator.messages[0]["model"]["nodes"]["1"]["position"] == {"x": 1, "y": 0}
+        server.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=2, y=0))
+        session.receive(json.loads(collaboration.OperationsEvent(operations=server.operations).json()))
+        session.flush()
+        assert slow_spectator.messages[-1]["event_type"] == "operations"
+
+    asyncio.run(relay_edits())
+
+
+def test_joining_operation_spectators_get_a_matching_model_and_replica(model: process_model.ProcessModel):
+    server = process_model_controller.ProcessModelController(model)
+
+    async def join_between_ticks() -> dict:
+        session = relay.RelayedSession(process_model.ModelId("model"), "ws://localhost:8001", tick=0.1)
+        session.receive(json.loads(collaboration.UpdateModelEvent.from_model(model).json()))
+        session.receive(json.loads(collaboration.SyncReplicaEvent(replica=server.replica.state()).json()))
+        # The model is encoded for a spectator, then an operation arrives before the next tick.
+        session.frame("update_model", "json")
+        server.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=99, y=0))
+        session.receive(json.loads(collaboration.OperationsEvent(operations=server.operations).json()))
+        spectator = FakeWebSocket()
+        watch = asyncio.create_task(session.watch(spectator, "json", operations=True))
+        await asyncio.sleep(0)
+        assert session.idle_since is None
+        session.flush()
+        spectator.closed.set()
+        await watch
+        assert session.idle_since is not None
+
+        assert [event["event_type"] for event in spectator.messages] == [
+            "encoding",
+            "update_model",
+            "sync_replica",
+            "operations",
+        ]
+        model_class = type(model)
+        replica = crdt.ModelReplica(model_class.parse_obj(spectator.messages[1]["model"]), "client")
+        replica.sync(spectator.messages[2]["replica"])
+        replica.apply(collaboration.OperationsEvent.parse_obj(spectator.messages[3]).operations)
+        return replica.model._serialize_to_dict()
+
+    assert asyncio.run(join_between_ticks()) == model._serialize_to_dict()
+    assert model.get_node(process_model.NodeId(1)).position == process_model.Point(x=99, y=0)
+
+
+def test_reaper_closes_sessions_without_spectators():
+    async def reap() -> tuple[bool, bool]:
+        idle, watched = (relay.RelayedSession(process_model.ModelId(name), "", tick=0.1) for name in ("a", "b"))
+        for session in (idle, watched):
+            relay.relayed_sessions[session.model_id] = session
+            session._task = asyncio.create_task(asyncio.sleep(10))
+        idle.idle_since = time.monotonic() - relay.CLOSE_TIMEOUT
+        watched.idle_since = None
+
+        relay.reap()
+        await asyncio.sleep(0)
+        assert list(relay.relayed_sessions) == ["b"]
+        watched.close()
+        await asyncio.sleep(0)
+        return idle._task.cancelled(), watched._task.cancelled()
+
+    assert asyncio.run(reap()) == (True, True)
+    assert relay.relayed_sessions == {}
+
+
+def request(request_type: str, **fields) -> str:
+    return json.dumps({"request": {"request_type": request_type, **fields}})
+
+
+async def watch_through_relay(model_path: str) -> tuple[dict, int]:
+    """Edit a model on the editor server, and return the last model of a spectator of the relay."""
+    async with websockets.serve(collaboration.handler, "localhost", 0) as editor_server:
+        upstream_url = f"ws://localhost:{editor_server.sockets[0].getsockname()[1]}"
+        handler = functools.partial(relay.handler, upstream_url=upstream_url, tick=0.01)
+        async with websockets.serve(handler, "localhost", 0) as relay_server:
+            relay_url = f"ws://localhost:{relay_server.sockets[0].getsockname()[1]}"
+            async with websockets.connect(upstream_url) as editor, websockets.connect(relay_url) as spectator:
+                await editor.send(request("join_session", model_id=model_path))
+                await spectator.send(request("watch_session", model_id=model_path))
+                assert json.loads(await spectator.recv()) == {"event_type": "encoding", "encoding": "json"}
+                event = json.loads(await spectator.recv())
+                for x in range(1, 4):
+                    command = {"command_type": "move_node", "node_id": 1, "x": x, "y": 0}
+                    await editor.send(request("execute_command", command=command))
+                while event["model"]["nodes"]["1"]["position"]["x"] != 3:
+                    event = json.loads(await asyncio.wait_for(spectator.recv(), 5))
+
+            async with websockets.connect(relay_url) as collaborator:
+                await collaborator.send(request("join_session", model_id=model_path))
+                await collaborator.wait_closed()
+                return event, collaborator.close_code
+
+
+def test_relay_serves_spectators_only(
+    model: process_model.ProcessModel, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    # Close the relayed session right after its spectator leaves, so that the servers can stop.
+    monkeypatch.setattr(relay, "CLOSE_TIMEOUT", 0)
+    monkeypatch.setattr(relay, "REAP_INTERVAL", 0.01)
+    model.id = process_model.ModelId(tmp_path.name)
+    model.save(tmp_path / "model.json")
+
+    event, close_code = asyncio.run(watch_through_relay(str(tmp_path / "model.json")))
+
+    assert event["model"]["nodes"]["1"]["position"] == {"x": 3, "y": 0}
+    assert close_code == 1008
+
+
+async def watch_invalid_upstream(model: process_model.ProcessModel) -> list[dict]:
+    """Watch a session whose first upstream connection sends an invalid event, and return the models received."""
+    connections = 0
+
+    async def upstream_handler(websocket: websockets.server.WebSocketServerProtocol) -> None:
+        nonlocal connections
+        connections += 1
+        await websocket.recv()
+        model.get_node(process_model.NodeId(1)).name = f"Connection#{connections}"
+        await websocket.send(collaboration.UpdateModelEvent.from_model(model).json())
+        replica = process_model_controller.ProcessModelController(model).replica
+        await websocket.send(collaboration.SyncReplicaEvent(replica=replica.state()).json())
+        if connections == 1:
+            await websocket.send(json.dumps({"event_type": "operations", "operations": [{"operation_type": "?"}]}))
+        await websocket.wait_closed()
+
+    async with websockets.serve(upstream_handler, "localhost", 0) as upstream_server:
+        upstream_url = f"ws://localhost:{upstream_server.sockets[0].getsockname()[1]}"
+        handler = functools.partial(relay.handler, upstream_url=upstream_url, tick=0.01)
+        async with websockets.serve(handler, "localhost", 0) as relay_server:
+            relay_url = f"ws://localhost:{relay_server.sockets[0].getsockname()[1]}"
+            async with websockets.connect(relay_url) as spectator:
+                await spectator.send(request("watch_session", model_id="model"))
+                events = [json.loads(await asyncio.wait_for(spectator.recv(), 5)) for _ in range(3)]
+            relay.relayed_sessions.pop(process_model.ModelId("model")).close()
+            return events
+
+
+def test_relay_resyncs_after_invalid_upstream_events(
+    model: process_model.ProcessModel, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(relay, "RECONNECT_DELAY", 0)
+
+    events = asyncio.run(watch_invalid_upstream(model))
+
+    assert [event["event_type"] for event in events] == ["encoding", "update_model", "update_model"]
+    assert [event["model"]["nodes"]["1"]["name"] for event in events[1:]] == ["Connection#1", "Connection#2"]
@@ -1,9 +1,10 @@
 import abc
 import enum
 from functools import partial
-from typing import Any, Generic, TypeVar
+from typing import Any, Callable, Generic, TypeVar
 
 import pydantic
+import pydantic.fields
 
 
 FieldType = TypeVar("FieldType")
@@ -21,7 +22,6 @@ class InspectableField(pydantic.generics.GenericModel, Generic[FieldType], abc.A
 
     def set_value(self, value: FieldType) -> FieldType:
         self.value = value
-        setattr(self.__class__, self.name, value)
         return value
 
 
@@ -43,6 +43,10 @@ class NumberInspectableField(InspectableField[int | float]):
     inspector_type = "number"
 
 
+class BooleanInspectableField(InspectableField[bool]):
+    inspector_type = "checkbox"
+
+
 class EnumInspectableField(InspectableField[enum.Enum]):
     inspector_type = "select"
     options: list[tuple[str, Any]] = pydantic.Field(default_factory=list)
@@ -56,40 +60,113 @@ class EnumInspectableField(InspectableField[enum.Enum]):
         return super().set_value(self.enum_type(value))
 
 
+def _field_class(factory: Callable[..., InspectableField]) -> type[InspectableField]:
+    return factory.func if isinstance(factory, partial) else factory
+
+
+def _validate_field(model_class: type, field: pydantic.fields.ModelField, value: Any) -> Any:
+    value, error = field.validate(value, {}, loc=field.name, cls=model_class)
+    if error:
+        raise pydantic.ValidationError([error], model_class)
+    return value
+
+
+_field_factories: dict[type, dict[str, Callable[..., InspectableField]]] = {}
+_field_validators: dict[type, dict[str, Callable[[Any], Any]]] = {}
+
+
 class InspectorMixin:
+    __slots__ = ()
+
+    @classmethod
+    def inspectable_field_factories(cls) -> dict[str, Callable[..., InspectableField]]:
+        """Field factories of the inspectable (non-hidden) fields, computed once per class."""
+        factories = _field_factories.get(cls)
+        if factories is None:
+            field_types = cls.field_types()
+            factories = {}
+            for field in cls.__fields__.values():
+                factory = field_types.get(field.name) or cls.default_field_factory(field.type_)
+                if factory is not HiddenInspectableField:
+                    factories[field.name] = factory
+            _field_factories[cls] = factories
+        return factories
+
+    @classmethod
+    def inspectable_validators(cls) -> dict[str, Callable[[Any], Any]]:
+        """
+        Validators of the mutable inspectable fields, generated once per class.
+
+        A validator returns the value coerced to the field type, or raises `pydantic.ValidationError`.
+        """
+        validators = _field_validators.get(cls)
+        if validators is None:
+            validators = {
+                name: partial(_validate_field, cls, cls.__fields__[name])
+                for name, factory in cls.inspectable_field_factories().items()
+                if _field_class(factory).__fields__["mutable"].default
+            }
+            _field_validators[cls] = validators
+        return validators
+
     @property
     def inspectables(self) -> dict[str, InspectableField]:
-        field_types = self.field_types()
-        excluded_fields = [field_name for field_name, field in field_types.items() if field is HiddenInspectableField]
-        inspectables = dict()
-        for field in self.__fields__.values():
-            if field.name not in excluded_fields:
-                factory = field_types.get(field.name, self.default_field_factory(field.type_))
-                inspectables[field.name] = factory(name=field.name, value=getattr(self, field.name))
-        return inspectables
+        return {
+            name: factory(name=name, value=getattr(self, name))
+            for name, factory in self.inspectable_field_factories().items()
+        }
 
-    @property
-    def field_types(self) -> dict[str, InspectableField]:
+    @classmethod
+    def field_types(cls) -> dict[str, type[InspectableField]]:
         return {}
 
-    def default_field_factory(self, field_type: type) -> type[InspectableField]:
+    @classmethod
+    def default_field_factory(cls, field_type: type) -> type[InspectableField]:
         if issubclass(field_type, enum.Enum):
             return partial(EnumInspectableField, enum_type=field_type)
         if issubclass(field_type, str):
             return TextInspectableField
+        if issubclass(field_type, bool):
+            return BooleanInspectableField
         if issubclass(field_type, (int, float)):
             return NumberInspectableField
         else:
             return InfoInspectableField
 
     def get_inspectables(self) -> list[InspectableField]:
-        return self.inspectables.values()
+        return list(self.inspectables.values())
 
     def get_inspectable(self, name: str) -> InspectableField | None:
-        return self.inspectables.get(name)
+        factory = self.inspectable_field_factories().get(name)
+        if factory is None:
+            return None
+        return factory(name=name, value=getattr(self, name))
 
     def set_inspectable(self, name: str, value: Any) -> None:
-        inspectable = self.inspectables[name]
-        if inspectable.mutable:
-            value = self.inspectables[name].set_value(value)
+        validator = self.inspectable_validators().get(name)
+        if validator is None:
+            if name not in self.inspectable_field_factories():
+                raise KeyError(name)
+            return
+        self.__setattr__(name, validator(value))
+
+    @classmethod
+    def validate_inspectables(cls, values: dict[str, Any]) -> dict[str, Any]:
+        """Validate the mutable inspectable fields in `values`, dropping any other keys."""
+        validators = cls.inspectable_validators()
+        return {name: validators[name](value) for name, value in values.items() if name in validators}
+
+    def assign_inspectables(self, validated_values: dict[str, Any]) -> dict[str, Any]:
+        """Set values returned by `validate_inspectables`. Returns the previous values of the updated fields."""
+        old_values = {name: getattr(self, name) for name in validated_values}
+        for name, value in validated_values.items():
             self.__setattr__(name, value)
+        return old_values
+
+    def update_inspectables(self, values: dict[str, Any]) -> dict[str, Any]:
+        """
+        Validate and set the mutable inspectable fields in `values`, ignoring any other keys.
+
+        Nothing is changed if any of the values is invalid. Returns the previous values of the updated fields.
+        """
+        return self.assign_inspectables(self.validate_inspectables(values))
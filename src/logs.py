@@ -0,0 +1,115 @@
+"""
+Logging that stays off the hot paths.
+
+`configure` routes all records through a queue to a listener thread that formats and writes them, so writing logs
+never blocks the asyncio loop. Records are put on the queue unformatted, so log calls should pass their arguments
+separately (`logger.info("joined session=%s", model_id)`) and not change them afterwards; they are only formatted if
+the record is written. Messages are in `key=value` form so they can be filtered and parsed.
+
+Messages that occur for every request are logged through a `Sampler`, and levels can be changed at runtime with
+`set_level`, which the servers expose on `/admin/logging`.
+"""
+import atexit
+import http
+import json
+import logging
+import logging.handlers
+import queue
+from typing import TextIO
+
+from src import metrics
+
+FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue does not leave the process, so records are formatted by the listener thread instead.
+        return record
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def stop(self) -> None:
+        # Stopped at exit, and possibly before.
+        if self._thread is not None:
+            super().stop()
+
+
+_listener: _QueueListener | None = None
+
+
+def configure(level: str | int = logging.INFO, stream: TextIO | None = None) -> logging.handlers.QueueListener:
+    """
+    Log to `stream`, standard error by default, through a queue and a listener thread. Configuring again replaces
+    the listener of the previous configuration, after writing its queued records.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        atexit.unregister(_listener.stop)
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    listener = _QueueListener(records, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(_QueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+    # Write the records still queued when the process exits.
+    atexit.register(listener.stop)
+    _listener = listener
+    return listener
+
+
+class Sampler:
+    """
+    Logs one in `every` messages of each key, like a command type, at `level`, with the number of messages so far.
+    Every message is logged when the logger is enabled for debug messages.
+    """
+
+    def __init__(self, logger: logging.Logger, every: int = 100, level: int = logging.INFO) -> None:
+        self.logger = logger
+        self.every = every
+        self.level = level
+        self._counts: dict[str, int] = {}
+
+    def log(self, key: str, message: str, *args: object) -> None:
+        count = self._counts[key] = self._counts.get(key, 0) + 1
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(message, *args)
+        elif (count - 1) % self.every == 0 and self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, f"{message} sampled=1/{self.every} count=%d", *args, count)
+
+
+def levels() -> dict[str, str]:
+    """The levels of the root logger and of the loggers that have a level of their own."""
+    loggers = {"": logging.getLogger()} | {
+        name: logger
+        for name, logger in logging.Logger.manager.loggerDict.items()
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET
+    }
+    return {name: logging.getLevelName(logger.level) for name, logger in sorted(loggers.items())}
+
+
+def set_level(name: str, level: str) -> None:
+    """Set the level of a logger, the root logger for an empty name. Raises ValueError for unknown levels."""
+    if not isinstance(logging.getLevelName(level.upper()), int):
+        raise ValueError(f"Unknown log level {level}")
+    logging.getLogger(name or None).setLevel(level.upper())
+
+
+async def admin_handler(method: str, path: str, query: dict[str, str]) -> metrics.Response:
+    """
+    `GET /admin/logging` returns the log levels, and `POST /admin/logging?logger=src.editor&level=DEBUG` sets one.
+    Without `logger`, the root level is set.
+    """
+    if path:
+        return metrics.Response(http.HTTPStatus.NOT_FOUND, b"Not found\n")
+    if method == "POST":
+        try:
+            set_level(query.get("logger", ""), query.get("level", ""))
+        except ValueError as error:
+            return metrics.Response(http.HTTPStatus.BAD_REQUEST, f"{error}\n".encode())
+    return metrics.Response(http.HTTPStatus.OK, json.dumps(levels()).encode(), "application/json")
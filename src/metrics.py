@@ -0,0 +1,309 @@
+"""
+Counters, gauges and histograms, exposed in the Prometheus text format.
+
+Metrics register themselves in `REGISTRY` when they are created, usually at module level. The web server serves
+`REGISTRY.render()` on `/metrics` and the websocket server on a side port, see `serve`. Recording a value takes a
+dictionary lookup and a few list operations under a lock, so metrics can stay on in the hot paths. Gauges of state
+that is kept elsewhere, like the number of open sessions, take a function that is only called when rendering.
+"""
+import abc
+import asyncio
+import bisect
+import http
+import math
+import threading
+import time
+import urllib.parse
+from typing import Awaitable, Callable, Generic, Iterator, NamedTuple, TypeVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the buckets of durations in seconds and sizes in bytes.
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(float(4**exponent) for exponent in range(4, 13))
+
+# A sample of a metric: the suffix of its name, its labels and its value.
+Sample = tuple[str, tuple[tuple[str, str], ...], float]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named {metric.name} is registered already")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> "Metric | None":
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for suffix, labels, value in metric.samples():
+                label_text = ",".join(f'{name}="{_escape(label)}"' for name, label in labels)
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{metric.name}{suffix}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+ChildT = TypeVar("ChildT")
+
+
+class Metric(abc.ABC, Generic[ChildT]):
+    metric_type: str
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: Registry | None = None
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], ChildT] = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            # Render metrics without labels before their first value.
+            self.labels()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values: str) -> ChildT:
+        """The metric for the given label values, in the order of the label names."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} has labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self) -> ChildT:
+        ...
+
+    @abc.abstractmethod
+    def _child_samples(self, child: ChildT) -> Iterator[Sample]:
+        ...
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            labels = tuple(zip(self.labelnames, values))
+            for suffix, extra_labels, value in self._child_samples(child):
+                yield suffix, labels + extra_labels, value
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: threading.Lock) -> None:
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric[_Value]):
+    """A value that only goes up. By convention, the name ends in `_total`."""
+
+    metric_type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value(self._lock)
+
+    def _child_samples(self, child: _Value) -> Iterator[Sample]:
+        yield "", (), child.value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric[_Value]):
+    """A value that goes up and down. With a `function`, the value is what it returns when the metrics are rendered."""
+
+    metric_type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        registry: Registry | None = None,
+        function: Callable[[], float] | None = None,
+    ) -> None:
+        self.function = function
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _Value:
+        return _Value(self._lock)
+
+    def _child_samples(self, child: _Value) -> Iterator[Sample]:
+        yield "", (), child.value
+
+    def samples(self) -> Iterator[Sample]:
+        if self.function is not None:
+            yield "", (), self.function()
+        else:
+            yield from super().samples()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "_HistogramValues") -> None:
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class _HistogramValues:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...], lock: threading.Lock) -> None:
+        self.buckets = buckets
+        # Observations per bucket, not cumulative; the last bucket is +Inf.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        """Observe the duration of a `with` block in seconds."""
+        return _Timer(self)
+
+
+class Histogram(Metric[_HistogramValues]):
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        registry: Registry | None = None,
+        buckets: tuple[float, ...] = TIME_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramValues:
+        return _HistogramValues(self.buckets, self._lock)
+
+    def _child_samples(self, child: _HistogramValues) -> Iterator[Sample]:
+        with self._lock:
+            counts, total = list(child.counts), child.sum
+        cumulative = 0
+        for bound, count in zip([*self.buckets, math.inf], counts):
+            cumulative += count
+            yield "_bucket", (("le", _format_value(bound)),), cumulative
+        yield "_sum", (), total
+        yield "_count", (), cumulative
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+
+class Response(NamedTuple):
+    status: http.HTTPStatus
+    body: bytes
+    content_type: str = "text/plain; charset=utf-8"
+    headers: dict[str, str] = {}
+
+
+# Handles a request to a path under the handler's prefix, given the method, the rest of the path and the query.
+Handler = Callable[[str, str, dict[str, str]], Awaitable[Response]]
+
+
+async def serve(
+    host: str, port: int, registry: Registry | None = None, handlers: dict[str, Handler] | None = None
+) -> asyncio.Server:
+    """
+    Serve the metrics on `/metrics` over HTTP, for processes without a web server of their own.
+
+    `handlers` serve other paths by prefix, like admin endpoints that should not be exposed with the main service.
+    """
+    registry = registry or REGISTRY
+    handlers = handlers or {}
+
+    async def metrics_handler(method: str, path: str, query: dict[str, str]) -> Response:
+        if method != "GET" or path:
+            return Response(http.HTTPStatus.NOT_FOUND, b"Not found\n")
+        return Response(http.HTTPStatus.OK, registry.render().encode(), CONTENT_TYPE)
+
+    routes = {"/metrics": metrics_handler, **handlers}
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            # Skip the headers.
+            while await reader.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            method, target, *_ = request_line.decode("latin-1").split()
+            url = urllib.parse.urlsplit(target)
+            response = Response(http.HTTPStatus.NOT_FOUND, b"Not found\n")
+            for prefix, handler in routes.items():
+                if url.path == prefix or url.path.startswith(prefix + "/"):
+                    query = dict(urllib.parse.parse_qsl(url.query))
+                    response = await handler(method, url.path[len(prefix) :].strip("/"), query)
+                    break
+            headers = {"Content-Type": response.content_type, "Content-Length": str(len(response.body))}
+            headers |= response.headers
+            head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+            writer.write(
+                f"HTTP/1.1 {response.status.value} {response.status.phrase}\r\n{head}Connection: close\r\n\r\n".encode()
+                + response.body
+            )
+            await writer.drain()
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -1,4 +1,5 @@
 import enum
+import json
 import pydantic
 import pathlib
 
@@ -23,6 +24,7 @@ from .process_model import *
 from .petri_net import *
 from .dcr_graph import *
 from .flowchart import *
+from .columnar import *
 
 
 def model_type_to_class(model_type: ProcessModelType) -> type[ProcessModel]:
@@ -35,3 +37,24 @@ def model_type_to_class(model_type: ProcessModelType) -> type[ProcessModel]:
             return Flowchart
         case _:
             raise NotImplementedError("Model type is not yet implemented")
+
+
+def model_from_dict(data: dict, columnar_min_nodes: int | None = None) -> ProcessModel | ColumnarPetriNet:
+    """
+    A process model of any type from its serialized form. Petri nets with at least `columnar_min_nodes` nodes are
+    stored in a `ColumnarPetriNet`, which takes a fraction of the memory.
+    """
+    model_type = ProcessModelType(data["model_type"])
+    if (
+        model_type == ProcessModelType.PETRI_NET
+        and columnar_min_nodes is not None
+        and len(data.get("nodes", {})) >= columnar_min_nodes
+    ):
+        return ColumnarPetriNet.from_dict(data)
+    return model_type_to_class(model_type).parse_obj(data)
+
+
+def load_model(path: pathlib.Path, columnar_min_nodes: int | None = None) -> ProcessModel | ColumnarPetriNet:
+    """Load a process model of any type from a file, see `model_from_dict`."""
+    with open(path) as f:
+        return model_from_dict(json.load(f), columnar_min_nodes)
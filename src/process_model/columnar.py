@@ -0,0 +1,441 @@
+import array
+import json
+import pathlib
+import random
+import weakref
+from typing import Any, Iterable
+
+from src import inspector
+from src import process_model as pm
+from src.process_model import petri_net
+
+
+_NODE_TYPES = list(petri_net.NodeType)
+_NODE_TYPE_CODES = {node_type: code for code, node_type in enumerate(_NODE_TYPES)}
+
+
+def _edge_key(start_node_id: pm.NodeId, end_node_id: pm.NodeId) -> int:
+    return (start_node_id << 32) | end_node_id
+
+
+class PetriNetNodeView(inspector.InspectorMixin):
+    """
+    A node of a `ColumnarPetriNet`, read from and written to the columns of the net.
+
+    Views behave like `PetriNetNode` for the editor: they expose the same attributes and inspector interface.
+    A view of a deleted node keeps a copy of its values, so it can be added back to the net (e.g. on undo).
+    """
+
+    __slots__ = ("_net", "_id", "_detached", "__weakref__")
+
+    def __init__(self, net: "ColumnarPetriNet", node_id: pm.NodeId) -> None:
+        self._net = net
+        self._id = node_id
+        self._detached: dict[str, Any] | None = None
+
+    @classmethod
+    def inspectable_field_factories(cls) -> dict:
+        return petri_net.PetriNetNode.inspectable_field_factories()
+
+    @classmethod
+    def inspectable_validators(cls) -> dict:
+        return petri_net.PetriNetNode.inspectable_validators()
+
+    def _get(self, column: str) -> Any:
+        if self._detached is not None:
+            return self._detached[column]
+        return self._net._get_value(self._id, column)
+
+    def _set(self, column: str, value: Any) -> None:
+        if self._detached is not None:
+            self._detached[column] = value
+        else:
+            self._net._set_value(self._id, column, value)
+
+    def _detach(self) -> None:
+        values = self._net._node_dict(self._id)
+        position = values.pop("position")
+        self._detached = values | position
+
+    @property
+    def id(self) -> pm.NodeId:
+        return self._id
+
+    @property
+    def position(self) -> pm.Point:
+        return pm.Point(x=self._get("x"), y=self._get("y"))
+
+    @position.setter
+    def position(self, position: pm.Point) -> None:
+        self._set("x", position.x)
+        self._set("y", position.y)
+
+    @property
+    def name(self) -> str:
+        return self._get("name")
+
+    @name.setter
+    def name(self, name: str) -> None:
+        self._set("name", name)
+
+    @property
+    def node_type(self) -> petri_net.NodeType:
+        return self._get("node_type")
+
+    @node_type.setter
+    def node_type(self, node_type: petri_net.NodeType) -> None:
+        self._set("node_type", petri_net.NodeType(node_type))
+
+    @property
+    def ball_count(self) -> int:
+        return self._get("ball_count")
+
+    @ball_count.setter
+    def ball_count(self, ball_count: int) -> None:
+        self._set("ball_count", ball_count)
+
+    @property
+    def accepting_state(self) -> str:
+        return self._get("accepting_state")
+
+    @accepting_state.setter
+    def accepting_state(self, accepting_state: str) -> None:
+        self._set("accepting_state", accepting_state)
+
+    def dict(self) -> dict[str, Any]:
+        if self._detached is not None:
+            return {
+                "id": self._id,
+                "position": {"x": self._detached["x"], "y": self._detached["y"]},
+                **{key: self._detached[key] for key in ("name", "node_type", "ball_count", "accepting_state")},
+            }
+        return self._net._node_dict(self._id)
+
+    def to_node(self) -> petri_net.PetriNetNode:
+        return petri_net.PetriNetNode.parse_obj(self.dict())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (PetriNetNodeView, petri_net.PetriNetNode)):
+            return self.dict() == other.dict()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PetriNetNodeView(id={self._id})"
+
+
+class ColumnarPetriNet:
+    """
+    Column-oriented storage engine for large Petri nets.
+
+    Node fields are kept in typed arrays (one row per node) and edges as paired arrays of node ids, instead of one
+    pydantic object per node and edge. Names and accepting states are only stored when they differ from the
+    defaults. `get_node` and `get_nodes` return lightweight `PetriNetNodeView`s, and the rest of the interface
+    matches `ProcessModel`, so editor commands work on either storage.
+
+    Convert with `from_model`/`to_model`; `save` and `load` use the same file format as `PetriNet`.
+    """
+
+    MAX_NODES = 2**31 - 1
+    model_type = pm.ProcessModelType.PETRI_NET
+
+    def __init__(self, id: pm.ModelId) -> None:
+        self.id = id
+        self.clear()
+
+    def clear(self) -> None:
+        for view in getattr(self, "_views", {}).values():
+            view._detach()
+        self._rows: dict[pm.NodeId, int] = {}
+        self._ids = array.array("q")
+        self._xs = array.array("d")
+        self._ys = array.array("d")
+        self._ball_counts = array.array("q")
+        self._node_types = array.array("b")
+        self._names: dict[pm.NodeId, str] = {}
+        self._accepting_states: dict[pm.NodeId, str] = {}
+        self._edges: dict[int, int] = {}
+        self._edge_starts = array.array("q")
+        self._edge_ends = array.array("q")
+        self._edge_ball_counts = array.array("q")
+        self._views: weakref.WeakValueDictionary[pm.NodeId, PetriNetNodeView] = weakref.WeakValueDictionary()
+
+    # Conversion and persistence
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ColumnarPetriNet":
+        net = cls(pm.ModelId(data["id"]))
+        for node in data.get("nodes", {}).values():
+            net._append_node(
+                pm.NodeId(int(node["id"])),
+                float(node["position"]["x"]),
+                float(node["position"]["y"]),
+                node["name"],
+                petri_net.NodeType(node["node_type"]),
+                int(node.get("ball_count", 0)),
+                node.get("accepting_state", ""),
+            )
+        for edge in data.get("edges", []):
+            net._append_edge(
+                pm.NodeId(int(edge["start_node_id"])), pm.NodeId(int(edge["end_node_id"])), edge.get("ball_count", 0)
+            )
+        return net
+
+    @classmethod
+    def from_model(cls, model: petri_net.PetriNet) -> "ColumnarPetriNet":
+        return cls.from_dict(model._serialize_to_dict())
+
+    def to_model(self) -> petri_net.PetriNet:
+        return petri_net.PetriNet.parse_obj(self._serialize_to_dict())
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "ColumnarPetriNet":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: pathlib.Path) -> None:
+        with open(path, "w") as f:
+            f.write(self._serialize_to_str())
+
+    def _serialize_to_dict(self) -> dict:
+        return {
+            "model_type": self.model_type,
+            "id": self.id,
+            "nodes": {node_id: self._node_dict(node_id) for node_id in self._ids},
+            "edges": [self._edge_dict(row) for row in range(len(self._edge_starts))],
+        }
+
+    def _serialize_to_str(self) -> str:
+        data = self._serialize_to_dict()
+        data["model_type"] = self.model_type.value
+        return json.dumps(data)
+
+    # Column access
+
+    def _append_node(
+        self,
+        node_id: pm.NodeId,
+        x: float,
+        y: float,
+        name: str,
+        node_type: petri_net.NodeType,
+        ball_count: int,
+        accepting_state: str,
+    ) -> None:
+        if node_id in self._rows:
+            raise ValueError(f"Node with id {node_id} already exists.")
+        self._rows[node_id] = len(self._ids)
+        self._ids.append(node_id)
+        self._xs.append(x)
+        self._ys.append(y)
+        self._ball_counts.append(ball_count)
+        self._node_types.append(_NODE_TYPE_CODES[node_type])
+        if name != f"Node#{node_id}":
+            self._names[node_id] = name
+        if accepting_state:
+            self._accepting_states[node_id] = accepting_state
+
+    def _remove_node(self, node_id: pm.NodeId) -> None:
+        # Move the last row into the removed one to keep the columns dense.
+        row = self._rows.pop(node_id)
+        last = len(self._ids) - 1
+        if row != last:
+            moved_id = self._ids[last]
+            for column in (self._ids, self._xs, self._ys, self._ball_counts, self._node_types):
+                column[row] = column[last]
+            self._rows[moved_id] = row
+        for column in (self._ids, self._xs, self._ys, self._ball_counts, self._node_types):
+            column.pop()
+        self._names.pop(node_id, None)
+        self._accepting_states.pop(node_id, None)
+
+    def _get_value(self, node_id: pm.NodeId, column: str) -> Any:
+        row = self._rows[node_id]
+        match column:
+            case "x":
+                return self._xs[row]
+            case "y":
+                return self._ys[row]
+            case "name":
+                return self._names.get(node_id, f"Node#{node_id}")
+            case "node_type":
+                return _NODE_TYPES[self._node_types[row]]
+            case "ball_count":
+                return self._ball_counts[row]
+            case "accepting_state":
+                return self._accepting_states.get(node_id, "")
+        raise KeyError(column)
+
+    def _set_value(self, node_id: pm.NodeId, column: str, value: Any) -> None:
+        row = self._rows[node_id]
+        match column:
+            case "x":
+                self._xs[row] = value
+            case "y":
+                self._ys[row] = value
+            case "name":
+                self._names[node_id] = value
+            case "node_type":
+                self._node_types[row] = _NODE_TYPE_CODES[value]
+            case "ball_count":
+                self._ball_counts[row] = value
+            case "accepting_state":
+                self._accepting_states[node_id] = value
+            case _:
+                raise KeyError(column)
+
+    def _node_dict(self, node_id: pm.NodeId) -> dict[str, Any]:
+        row = self._rows[node_id]
+        return {
+            "id": node_id,
+            "position": {"x": self._xs[row], "y": self._ys[row]},
+            "name": self._names.get(node_id, f"Node#{node_id}"),
+            "node_type": _NODE_TYPES[self._node_types[row]],
+            "ball_count": self._ball_counts[row],
+            "accepting_state": self._accepting_states.get(node_id, ""),
+        }
+
+    def _append_edge(self, start_node_id: pm.NodeId, end_node_id: pm.NodeId, ball_count: int) -> None:
+        self._edges[_edge_key(start_node_id, end_node_id)] = len(self._edge_starts)
+        self._edge_starts.append(start_node_id)
+        self._edge_ends.append(end_node_id)
+        self._edge_ball_counts.append(ball_count)
+
+    def _remove_edge_row(self, row: int) -> None:
+        last = len(self._edge_starts) - 1
+        del self._edges[_edge_key(self._edge_starts[row], self._edge_ends[row])]
+        if row != last:
+            for column in (self._edge_starts, self._edge_ends, self._edge_ball_counts):
+                column[row] = column[last]
+            self._edges[_edge_key(self._edge_starts[row], self._edge_ends[row])] = row
+        for column in (self._edge_starts, self._edge_ends, self._edge_ball_counts):
+            column.pop()
+
+    def _edge_dict(self, row: int) -> dict[str, Any]:
+        return {
+            "start_node_id": self._edge_starts[row],
+            "end_node_id": self._edge_ends[row],
+            "ball_count": self._edge_ball_counts[row],
+        }
+
+    # ProcessModel interface
+
+    @classmethod
+    def node_class(cls) -> type[petri_net.PetriNetNode]:
+        return petri_net.PetriNetNode
+
+    @classmethod
+    def edge_class(cls) -> type[petri_net.PetriNetEdge]:
+        return petri_net.PetriNetEdge
+
+    def new_node_id(self) -> pm.NodeId:
+        id = random.randint(0, self.MAX_NODES)
+        while id in self._rows:
+            id = random.randint(0, self.MAX_NODES)
+        return pm.NodeId(id)
+
+    def add_node(self, node: petri_net.PetriNetNode | PetriNetNodeView) -> PetriNetNodeView:
+        values = node.dict()
+        self._append_node(
+            node.id,
+            values["position"]["x"],
+            values["position"]["y"],
+            values["name"],
+            values["node_type"],
+            values["ball_count"],
+            values["accepting_state"],
+        )
+        if isinstance(node, PetriNetNodeView) and node._net is self:
+            node._detached = None
+            self._views[node.id] = node
+            return node
+        return self.get_node(node.id)
+
+    def add_node_from_values(
+        self, x: float, y: float, node_type: petri_net.NodeType, ball_count: int = 0, accepting_state: str = "", **_
+    ) -> PetriNetNodeView:
+        node_id = self.new_node_id()
+        self._append_node(
+            node_id, x, y, f"Node#{node_id}", petri_net.NodeType(node_type), ball_count, accepting_state
+        )
+        return self.get_node(node_id)
+
+    def delete_node(self, node_id: pm.NodeId) -> None:
+        if (view := self._views.pop(node_id, None)) is not None:
+            view._detach()
+        self._remove_node(node_id)
+        incident_rows = [
+            row
+            for row, (start, end) in enumerate(zip(self._edge_starts, self._edge_ends))
+            if start == node_id or end == node_id
+        ]
+        # Remove from the back so the swapped-in rows have already been checked.
+        for row in reversed(incident_rows):
+            self._remove_edge_row(row)
+
+    def move_node(self, node_id: pm.NodeId, x: float, y: float) -> None:
+        row = self._rows[node_id]
+        self._xs[row] = x
+        self._ys[row] = y
+
+    def is_valid_edge(self, edge: petri_net.PetriNetEdge) -> bool:
+        start_row = self._rows.get(edge.start_node_id)
+        end_row = self._rows.get(edge.end_node_id)
+        return (
+            start_row is not None
+            and end_row is not None
+            and edge.start_node_id != edge.end_node_id
+            and _edge_key(edge.start_node_id, edge.end_node_id) not in self._edges
+            and self._node_types[start_row] != self._node_types[end_row]
+        )
+
+    def add_edge(self, edge: petri_net.PetriNetEdge) -> petri_net.PetriNetEdge | None:
+        if not self.is_valid_edge(edge):
+            return None
+        self._append_edge(edge.start_node_id, edge.end_node_id, edge.ball_count)
+        return edge
+
+    def add_edge_from_values(
+        self, start_node_id: pm.NodeId, end_node_id: pm.NodeId, **edge_kwargs
+    ) -> petri_net.PetriNetEdge | None:
+        edge = petri_net.PetriNetEdge(start_node_id=start_node_id, end_node_id=end_node_id, **edge_kwargs)
+        return self.add_edge(edge)
+
+    def delete_edge(self, edge_id: pm.EdgeId) -> None:
+        row = self._edges.get(_edge_key(*edge_id))
+        if row is not None:
+            self._remove_edge_row(row)
+
+    def discard_edge(self, edge: petri_net.PetriNetEdge) -> None:
+        if self.has_edge(edge):
+            self.delete_edge(edge.id)
+
+    def has_edge(self, edge: petri_net.PetriNetEdge) -> bool:
+        return self.get_edge(edge.id) == edge
+
+    def get_node(self, node_id: pm.NodeId) -> PetriNetNodeView | None:
+        if node_id not in self._rows:
+            return None
+        view = self._views.get(node_id)
+        if view is None:
+            view = PetriNetNodeView(self, node_id)
+            self._views[node_id] = view
+        return view
+
+    def get_edge(self, edge_id: pm.EdgeId) -> petri_net.PetriNetEdge | None:
+        row = self._edges.get(_edge_key(*edge_id))
+        if row is None:
+            return None
+        return petri_net.PetriNetEdge(**self._edge_dict(row))
+
+    def get_nodes(self) -> list[PetriNetNodeView]:
+        return [self.get_node(node_id) for node_id in self._ids]
+
+    def get_edges(self) -> list[petri_net.PetriNetEdge]:
+        return [petri_net.PetriNetEdge(**self._edge_dict(row)) for row in range(len(self._edge_starts))]
+
+    def iter_edge_ids(self) -> Iterable[pm.EdgeId]:
+        """Iterate the edge ids without creating edge objects."""
+        return (pm.EdgeId((start, end)) for start, end in zip(self._edge_starts, self._edge_ends))
+
+    def __len__(self) -> int:
+        return len(self._ids)
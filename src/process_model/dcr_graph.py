@@ -3,13 +3,30 @@ import enum
 from src import process_model as pm
 
 
+class DcrRelationType(str, enum.Enum):
+    CONDITION = "condition"
+    RESPONSE = "response"
+    INCLUDE = "include"
+    EXCLUDE = "exclude"
+    MILESTONE = "milestone"
+
+
 class DcrGraphNode(pm.Node):
     name: str
     description: str = ""
+    # Initial marking of the event.
+    executed: bool = False
+    pending: bool = False
+    included: bool = True
 
 
 class DcrGraphEdge(pm.Edge):
-    pass
+    relation_type: DcrRelationType = DcrRelationType.CONDITION
+
+    @property
+    def id(self) -> pm.EdgeId:
+        # Events may be connected by several relations, which are told apart by their type.
+        return pm.EdgeId((self.start_node_id, self.end_node_id, self.relation_type.value))
 
 
 class DcrGraph(pm.ProcessModel[DcrGraphNode, DcrGraphEdge]):
@@ -22,5 +39,9 @@ class DcrGraph(pm.ProcessModel[DcrGraphNode, DcrGraphEdge]):
         return DcrGraphEdge(*args, **kwargs)
 
     def is_valid_edge(self, edge: DcrGraphEdge) -> bool:
-        """Check if an edge can be added to the DCR graph."""
-        return True
+        """
+        Check if an edge can be added to the DCR graph.
+
+        Relations may connect an event to itself (e.g. an event that excludes itself once executed).
+        """
+        return edge.start_node_id in self.nodes and edge.end_node_id in self.nodes and edge not in self.edges
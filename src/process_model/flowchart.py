@@ -15,10 +15,15 @@ class FlowchartNode(pm.Node):
     name: str
     node_type: FlowchartNodeType
     description: str = ""
+    # Time spent in the node, used for cycle times in simulations.
+    duration: float = 0.0
+    # Model id (path) of the flowchart a SUBPROCESS node expands to.
+    subprocess_model_id: str = ""
 
 
 class FlowchartEdge(pm.Edge):
-    pass
+    # Relative probability of taking this edge out of a DECISION node.
+    probability: float = 1.0
 
 
 class Flowchart(pm.ProcessModel[FlowchartNode, FlowchartEdge]):
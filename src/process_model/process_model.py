@@ -1,4 +1,6 @@
 import abc
+import hashlib
+import json
 import pathlib
 import random
 from typing import Generic, NewType, TypeVar, overload
@@ -11,7 +13,8 @@ from src import process_model
 
 ModelId = NewType("ModelId", str)
 NodeId = NewType("NodeId", int)
-EdgeId = NewType("EdgeId", tuple[NodeId, NodeId])
+# The start and end node of an edge, and the type of the edge in models where nodes may be connected by several edges.
+EdgeId = NewType("EdgeId", tuple[NodeId, NodeId] | tuple[NodeId, NodeId, str])
 
 
 class Point(pydantic.BaseModel):
@@ -23,8 +26,9 @@ class Node(pydantic.BaseModel, inspector.InspectorMixin):
     id: NodeId
     position: Point
 
-    def field_types(self) -> dict[str, inspector.InspectableField]:
-        return super().field_types | {
+    @classmethod
+    def field_types(cls) -> dict[str, type[inspector.InspectableField]]:
+        return super().field_types() | {
             "id": inspector.InfoInspectableField,
             "position": inspector.InfoInspectableField,
         }
@@ -53,6 +57,14 @@ class ProcessModel(process_model.ProcessModelBase, pydantic.generics.GenericMode
     nodes: dict[NodeId, NodeT] = pydantic.Field(default_factory=dict)
     edges: set[EdgeT] = pydantic.Field(default_factory=set)
 
+    @classmethod
+    def node_class(cls) -> type[NodeT]:
+        return cls.__fields__["nodes"].type_
+
+    @classmethod
+    def edge_class(cls) -> type[EdgeT]:
+        return cls.__fields__["edges"].type_
+
     @abc.abstractmethod
     def node_factory(self, node_id: NodeId, position: Point, **kwargs) -> NodeT:
         """Node factory method."""
@@ -76,6 +88,12 @@ class ProcessModel(process_model.ProcessModelBase, pydantic.generics.GenericMode
     def _serialize_to_str(self) -> str:
         return self.copy(update={"edges": list(self.edges)}).json()
 
+    def content_hash(self) -> str:
+        """Hash of the model content that does not depend on the order of nodes and edges."""
+        data = self._serialize_to_dict()
+        data["edges"] = sorted(json.dumps(edge, sort_keys=True) for edge in data["edges"])
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
     def save(self, path: pathlib.Path) -> None:
         """Save the process model to a file."""
         with open(path, "w") as f:
@@ -104,10 +122,14 @@ class ProcessModel(process_model.ProcessModelBase, pydantic.generics.GenericMode
         return self.add_node(node)
 
     def delete_node(self, node_id: NodeId) -> None:
+        """
+        Delete a node and all of its edges, whatever their ids, like the several relations between two events of a DCR
+        graph, in one pass over the edges.
+        """
         self.nodes.pop(node_id)
-        for other_node in self.nodes.keys():
-            self.delete_edge(EdgeId((node_id, other_node)))
-            self.delete_edge(EdgeId((other_node, node_id)))
+        self.edges.difference_update(
+            [edge for edge in self.edges if node_id in (edge.start_node_id, edge.end_node_id)]
+        )
 
     def move_node(self, node_id: NodeId, x: float, y: float) -> None:
         self.nodes[node_id].position = Point(x=x, y=y)
@@ -128,6 +150,13 @@ class ProcessModel(process_model.ProcessModelBase, pydantic.generics.GenericMode
                 self.edges.discard(edge)
                 return
 
+    def discard_edge(self, edge: EdgeT) -> None:
+        """Remove an edge with all its values, if present. Graphs may have several edges with the same id."""
+        self.edges.discard(edge)
+
+    def has_edge(self, edge: EdgeT) -> bool:
+        return edge in self.edges
+
     def clear(self) -> None:
         self.nodes = dict()
         self.edges = set()
@@ -0,0 +1,73 @@
+import pytest
+from src.editor import commands
+from src.editor import process_model_controller
+from src.process_model import columnar
+from src.process_model import process_model
+from src.process_model import petri_net
+
+
+@pytest.fixture
+def model():
+    _model = process_model.PetriNet(id=1, model_type=process_model.ProcessModelType.PETRI_NET)
+    _model.add_node(
+        petri_net.PetriNetNode(
+            id=process_model.NodeId(1),
+            position=process_model.Point(x=0, y=0),
+            name="Node#1",
+            node_type=petri_net.NodeType.PLACE,
+            ball_count=2,
+        )
+    )
+    _model.add_node(
+        petri_net.PetriNetNode(
+            id=process_model.NodeId(2),
+            position=process_model.Point(x=10, y=10),
+            name="Transition",
+            node_type=petri_net.NodeType.TRANSITION,
+        )
+    )
+    _model.add_edge_from_values(
+        start_node_id=process_model.NodeId(1),
+        end_node_id=process_model.NodeId(2),
+    )
+    return _model
+
+
+def test_round_trip(model: process_model.PetriNet):
+    net = columnar.ColumnarPetriNet.from_model(model)
+
+    serialized_model = model._serialize_to_dict()
+    serialized_model.pop("MAX_NODES")
+    assert net._serialize_to_dict() == serialized_model
+    assert net.to_model()._serialize_to_dict() == model._serialize_to_dict()
+    assert net.get_node(process_model.NodeId(2)).name == "Transition"
+    assert net.get_node(process_model.NodeId(1)) == model.get_node(process_model.NodeId(1))
+    assert net.get_edge(process_model.EdgeId((1, 2))) == model.get_edge(process_model.EdgeId((1, 2)))
+
+
+def test_commands_on_columnar_storage(model: process_model.PetriNet):
+    net = columnar.ColumnarPetriNet.from_model(model)
+    controller = process_model_controller.ProcessModelController(net)
+
+    initial_model = net._serialize_to_dict()
+    controller.execute(commands.CreateNodeCommand(x=20, y=20, node_kwargs=dict(node_type=petri_net.NodeType.PLACE)))
+    controller.execute(
+        commands.CreateEdgeCommand(start_node_id=process_model.NodeId(2), end_node_id=process_model.NodeId(1))
+    )
+    controller.execute(
+        commands.UpdateInspectablesCommand(node_id=process_model.NodeId(1), node_kwargs={"ball_count": "5"})
+    )
+    controller.execute(commands.MoveNodeCommand(node_id=process_model.NodeId(1), x=200, y=300))
+    controller.execute(commands.DeleteNodeCommand(node_id=process_model.NodeId(1)))
+    assert net.get_node(process_model.NodeId(1)) is None
+    assert net.get_edges() == []
+    controller.execute(commands.ClearModelCommand())
+    edited_model = net._serialize_to_dict()
+
+    for _ in range(6):
+        controller.undo()
+    assert net._serialize_to_dict() == initial_model
+
+    for _ in range(6):
+        controller.redo()
+    assert net._serialize_to_dict() == edited_model
@@ -0,0 +1,20 @@
+from src.process_model import dcr_graph
+from src.process_model import process_model
+
+
+def test_delete_node_deletes_all_of_its_edges():
+    model = dcr_graph.DcrGraph(id="graph", model_type=process_model.ProcessModelType.DCR_GRAPH)
+    for node_id in (1, 2, 3):
+        model.add_node(
+            dcr_graph.DcrGraphNode(
+                id=process_model.NodeId(node_id), position=process_model.Point(x=0, y=0), name=f"Event#{node_id}"
+            )
+        )
+    relations = [(1, 2, "condition"), (1, 2, "response"), (2, 1, "include"), (1, 1, "exclude"), (2, 3, "milestone")]
+    for start, end, relation_type in relations:
+        model.add_edge_from_values(start_node_id=start, end_node_id=end, relation_type=relation_type)
+
+    model.delete_node(process_model.NodeId(1))
+
+    assert model.get_node(process_model.NodeId(1)) is None
+    assert [edge.id for edge in model.get_edges()] == [(2, 3, "milestone")]
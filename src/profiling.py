@@ -0,0 +1,138 @@
+"""
+Sampling profiler for profiling one editor session or simulation at a time in a running server.
+
+A profile is started with a function and a condition on its arguments, like `EditorSession.process_messages` of a
+given session. While the profile is active, a sampler thread takes the stacks of all threads at a fixed interval,
+and records the stacks below a call of the function that meets the condition. Nothing is hooked into the profiled
+code, and the sampler thread only runs while there are active profiles, so profiling costs nothing when it is off.
+
+Stacks are written in the folded format of flamegraph.pl, which speedscope and inferno read as well.
+"""
+import collections
+import itertools
+import os
+import sys
+import threading
+import time
+import types
+from typing import Any, Callable
+
+FrameMatch = Callable[[types.FrameType], bool]
+
+
+def in_call(function: Callable, condition: Callable[[dict[str, Any]], bool]) -> FrameMatch:
+    """Match the frames of calls of `function` whose local variables, including the arguments, meet `condition`."""
+    code = function.__code__
+    return lambda frame: frame.f_code is code and condition(frame.f_locals)
+
+
+class TooManyProfilesError(Exception):
+    pass
+
+
+class Profile:
+    def __init__(self, profile_id: int, description: str, match: FrameMatch, seconds: float) -> None:
+        self.id = profile_id
+        self.description = description
+        self.match = match
+        self.seconds = seconds
+        self.end_time = time.monotonic() + seconds
+        # Number of samples of every stack, from the matching call to the innermost frame, joined by semicolons.
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self.done = threading.Event()
+
+    @property
+    def samples(self) -> int:
+        return self.stacks.total()
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "description": self.description,
+            "seconds": self.seconds,
+            "samples": self.samples,
+            "done": self.done.is_set(),
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+class Profiler:
+    # Longest profile, number of profiles at the same time, and number of finished profiles kept for download.
+    MAX_SECONDS = 300.0
+    MAX_ACTIVE = 4
+    MAX_PROFILES = 20
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self._profiles: collections.OrderedDict[int, Profile] = collections.OrderedDict()
+        self._active: list[Profile] = []
+        self._ids = itertools.count(1)
+        self._labels: dict[types.CodeType, str] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, description: str, match: FrameMatch, seconds: float) -> Profile:
+        """
+        Profile the calls that `match` for `seconds`, at most `MAX_SECONDS`. Raises `TooManyProfilesError` if there
+        are `MAX_ACTIVE` profiles already.
+        """
+        with self._lock:
+            if len(self._active) >= self.MAX_ACTIVE:
+                raise TooManyProfilesError(f"{self.MAX_ACTIVE} profiles are active already")
+            profile = Profile(next(self._ids), description, match, min(seconds, self.MAX_SECONDS))
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.MAX_PROFILES:
+                oldest = next(iter(self._profiles.values()))
+                if not oldest.done.is_set():
+                    break
+                self._profiles.popitem(last=False)
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def get(self, profile_id: int) -> Profile | None:
+        return self._profiles.get(profile_id)
+
+    def _label(self, code: types.CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = os.path.relpath(code.co_filename) if not code.co_filename.startswith("<") else code.co_filename
+            label = self._labels[code] = f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ",")
+        return label
+
+    def _sample(self) -> None:
+        own_thread = threading.get_ident()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for profile in self._active:
+                    if now >= profile.end_time:
+                        profile.done.set()
+                self._active = [profile for profile in self._active if not profile.done.is_set()]
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                # The frames from the outermost call to the innermost.
+                frames: list[types.FrameType] = []
+                while frame is not None:
+                    frames.append(frame)
+                    frame = frame.f_back
+                frames.reverse()
+                for profile in active:
+                    for i, call in enumerate(frames):
+                        if profile.match(call):
+                            profile.stacks[";".join(self._label(f.f_code) for f in frames[i:])] += 1
+                            break
+            time.sleep(self.interval)
+
+
+PROFILER = Profiler()
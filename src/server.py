@@ -1,28 +1,57 @@
+import asyncio
+import http
+import json
 import os
 import pathlib
-import random
+import threading
 
 import flask
 import flask.wrappers
+import werkzeug.middleware.proxy_fix
 
+from src import logs
+from src import metrics
 from src import process_model
+from src import profiling
 from src import ui
 from src import simulation_engine
 
 
 app = flask.Flask(__name__, template_folder="../templates", static_folder="../static")
 app.config.from_prefixed_env()
-simulator = simulation_engine.Simulator()
-
-for _ in range(10):
-    simulation = simulator.queue_simulation(
-        model_id=process_model.ModelId("models/petri_net_1"),
-        simulation_parameters=simulation_engine.SimulationParameters(),
-    )
-    if random.random() < 0.3:
-        simulation = simulator.start_simulation(simulation)
-        if random.random() < 0.5:
-            simulator.finish_simulation(simulation, simulation_engine.SimulationResult())
+# Configured on import, since gunicorn imports the app without running main.py.
+logs.configure(os.environ.get("LOG_LEVEL", "INFO"))
+# The app is served behind nginx, which sets the address of the client in X-Forwarded-For, taken from Fly-Client-IP
+# behind the proxy of Fly.
+app.wsgi_app = werkzeug.middleware.proxy_fix.ProxyFix(app.wsgi_app, x_for=1)  # type: ignore
+simulator = simulation_engine.Simulator(
+    result_cache=simulation_engine.ResultCache(
+        pathlib.Path(app.config.get("SIMULATION_CACHE_DIR", "data/simulation_cache")),
+        max_bytes=int(app.config.get("SIMULATION_CACHE_MAX_BYTES", 256 * 2**20)),
+    ),
+    event_log_directory=pathlib.Path(app.config.get("EVENT_LOG_DIR", "data/event_logs")),
+    id_path=pathlib.Path(app.config.get("SIMULATION_ID_FILE", "data/simulation_id")),
+    checkpoints=simulation_engine.CheckpointStore(
+        pathlib.Path(app.config.get("CHECKPOINT_DIR", "data/checkpoints")),
+        interval=float(app.config.get("CHECKPOINT_INTERVAL", 60)),
+    ),
+)
+scheduler = simulation_engine.Scheduler(
+    simulator,
+    workers=int(app.config.get("SIMULATION_WORKERS", 2)),
+    max_queued=int(app.config.get("SIMULATION_MAX_QUEUED", 1000)),
+    max_queued_per_owner=int(app.config.get("SIMULATION_MAX_QUEUED_PER_OWNER", 100)),
+)
+metrics.Gauge("simulation_queue_depth", "Simulations waiting for a worker.", function=lambda: scheduler.queued)
+metrics.Gauge(
+    "simulations_running", "Simulations running on a worker.", function=lambda: len(simulator.running_simulations)
+)
+# Simulations shown in the editor; the rest are available through the API.
+SIMULATION_QUEUE_LENGTH = 20
+MAX_PAGE_SIZE = 500
+# A long poll holds one of the request threads of gunicorn (16, see supervisord.conf) while it waits, so polls are
+# kept short for the threads to stay available to the other requests; clients poll again right away.
+MAX_POLL_TIMEOUT = 5.0
 
 
 def get_file_tree(root_dir: pathlib.Path) -> dict[str, dict[str, bool]]:
@@ -67,8 +96,6 @@ def index() -> flask.Response:
 
 @app.route("/edit", methods=["GET"])
 def edit_model() -> flask.Response:
-    global simulation_queue
-
     model_id = flask.request.args["model_id"]
     model_type = process_model.ProcessModelType.from_path(pathlib.Path(model_id))
 
@@ -84,7 +111,7 @@ def edit_model() -> flask.Response:
             ],
             simulation_queue=map(
                 ui.SimulationQueueListItem.from_simulation,
-                simulator.finished_simulations + simulator.running_simulations + simulator.queued_simulations,
+                simulator.list_simulations(limit=SIMULATION_QUEUE_LENGTH),
             ),
         )
     )
@@ -93,8 +120,189 @@ def edit_model() -> flask.Response:
 @app.route("/queue_simulation", methods=["POST"])
 def queue_simulation() -> flask.Response:
     model_id = flask.request.form["model_id"]
-    simulator.queue_simulation(process_model.ModelId(model_id), simulation_engine.SimulationParameters())
-    return flask.make_response("", 200)
+    try:
+        scheduler.submit(
+            process_model.ModelId(model_id),
+            simulation_engine.SimulationParameters(),
+            owner=flask.request.remote_addr or "anonymous",
+            priority=simulation_engine.Priority.INTERACTIVE,
+        )
+    except simulation_engine.QueueFullError as error:
+        return flask.make_response(str(error), 429)
+    return flask.redirect(f"/edit?model_id={model_id}")  # type: ignore
+
+
+def simulation_to_dict(simulation: simulation_engine.Simulation, include_result: bool = True) -> dict:
+    """A simulation as JSON data. Results can be large, so lists leave them out."""
+    data = json.loads(simulation.json(exclude=None if include_result else {"result"}))
+    data["status"] = simulation.status().name
+    return data
+
+
+@app.route("/api/simulations", methods=["POST"])
+def submit_simulation() -> flask.Response:
+    request = flask.request.get_json()
+    if not isinstance(request, dict):
+        return flask.make_response({"error": "The request must be a JSON object"}, 400)
+    try:
+        model_id = process_model.ModelId(request["model_id"])
+        parameters = simulation_engine.SimulationParameters.parse_obj(request.get("parameters", {}))
+        # Only the simulations queued from the editor are interactive.
+        if simulation_engine.Priority(request.get("priority", "batch")) != simulation_engine.Priority.BATCH:
+            raise ValueError("Simulations submitted through the API have batch priority")
+        simulation_engine.check_parameters(process_model.ProcessModelType.from_path(pathlib.Path(model_id)), parameters)
+        simulator.check_log_path(parameters)
+    except OSError:
+        return flask.make_response({"error": f"No model {request['model_id']}"}, 404)
+    except (KeyError, TypeError, ValueError) as error:
+        return flask.make_response({"error": str(error)}, 400)
+    # The owner is the client, for fair sharing of the workers between clients.
+    owner = flask.request.remote_addr or "anonymous"
+    try:
+        simulation = scheduler.submit(model_id, parameters, owner, simulation_engine.Priority.BATCH)
+    except simulation_engine.QueueFullError as error:
+        return flask.make_response({"error": str(error)}, 429, {"Retry-After": "10"})
+    return flask.make_response(simulation_to_dict(simulation), 201)
+
+
+@app.route("/api/simulations/<int:simulation_id>", methods=["GET"])
+def get_simulation(simulation_id: int) -> flask.Response:
+    simulation = simulator.get_simulation(simulation_id)
+    if simulation is None:
+        return flask.make_response({"error": f"No simulation {simulation_id}"}, 404)
+    return flask.make_response(simulation_to_dict(simulation))
+
+
+@app.route("/api/simulations", methods=["GET"])
+def list_simulations() -> flask.Response:
+    """
+    Simulations, most recent first, optionally filtered by `model_id` and `status`.
+
+    A page has at most `limit` simulations; pass its `next_cursor` as `cursor` to get the next page.
+    """
+    args = flask.request.args
+    try:
+        status = simulation_engine.SimulationStatus[args["status"]] if "status" in args else None
+        limit = min(int(args.get("limit", 50)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        cursor = int(args["cursor"]) if "cursor" in args else None
+    except (KeyError, ValueError) as error:
+        return flask.make_response({"error": str(error)}, 400)
+    version = simulator.version
+    simulations = simulator.list_simulations(args.get("model_id"), status, before=cursor, limit=limit)
+    return flask.make_response(
+        {
+            "simulations": [simulation_to_dict(simulation, include_result=False) for simulation in simulations],
+            "next_cursor": simulations[-1].id if len(simulations) == limit else None,
+            "version": version,
+        }
+    )
+
+
+@app.route("/api/simulations/changes", methods=["GET"])
+def simulation_changes() -> flask.Response:
+    """
+    Long poll for the simulations that changed since `since`, a version from an earlier response.
+
+    Responds as soon as there are changes, or with no changes after `timeout` seconds, at most `MAX_POLL_TIMEOUT`.
+    """
+    try:
+        since = int(flask.request.args.get("since", 0))
+        timeout = min(float(flask.request.args.get("timeout", MAX_POLL_TIMEOUT)), MAX_POLL_TIMEOUT)
+    except ValueError as error:
+        return flask.make_response({"error": str(error)}, 400)
+    version, simulations = simulator.wait_for_changes(since, timeout)
+    return flask.make_response(
+        {
+            "simulations": [simulation_to_dict(simulation, include_result=False) for simulation in simulations],
+            "version": version,
+        }
+    )
+
+
+@app.route("/api/usage", methods=["GET"])
+def usage() -> flask.Response:
+    """Worker seconds used and simulations run per owner."""
+    return flask.make_response(
+        {
+            owner: {"worker_seconds": seconds, "runs": scheduler.runs[owner]}
+            for owner, seconds in scheduler.usage.items()
+        }
+    )
+
+
+async def profiles_handler(method: str, path: str, query: dict[str, str]) -> metrics.Response:
+    """
+    Admin endpoint to profile a simulation, served on the admin port.
+
+    `POST /admin/profiles?simulation_id=...&seconds=...` starts profiling a queued or running simulation for `seconds`,
+    counted from now, and `GET /admin/profiles/<id>` returns the status of the profile until it is done, then its
+    stacks in the folded format of flamegraph.pl.
+    """
+    match method, path:
+        case "POST", "":
+            try:
+                simulation_id = int(query["simulation_id"])
+                seconds = float(query.get("seconds", 30))
+            except (KeyError, ValueError) as error:
+                return metrics.Response(http.HTTPStatus.BAD_REQUEST, f"Invalid {error}\n".encode())
+            if simulator.get_simulation(simulation_id) is None:
+                return metrics.Response(http.HTTPStatus.NOT_FOUND, b"No such simulation\n")
+            try:
+                profile = profiling.PROFILER.start(
+                    f"simulation {simulation_id}",
+                    profiling.in_call(
+                        simulation_engine.Simulator.run_simulation,
+                        lambda frame_locals: frame_locals["simulation"].id == simulation_id,
+                    ),
+                    seconds,
+                )
+            except profiling.TooManyProfilesError as error:
+                return metrics.Response(http.HTTPStatus.TOO_MANY_REQUESTS, f"{error}\n".encode())
+            return metrics.Response(http.HTTPStatus.ACCEPTED, json.dumps(profile.status()).encode(), "application/json")
+        case "GET", profile_id if profile_id.isdigit():
+            profile = profiling.PROFILER.get(int(profile_id))
+            if profile is None:
+                return metrics.Response(http.HTTPStatus.NOT_FOUND, b"No such profile\n")
+            if not profile.done.is_set():
+                status = json.dumps(profile.status()).encode()
+                return metrics.Response(http.HTTPStatus.ACCEPTED, status, "application/json")
+            return metrics.Response(
+                http.HTTPStatus.OK,
+                profile.folded().encode(),
+                headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.folded"'},
+            )
+        case _:
+            return metrics.Response(http.HTTPStatus.NOT_FOUND, b"Not found\n")
+
+
+def serve_admin(host: str, port: int) -> None:
+    """
+    Serve the admin endpoints on a side port that nginx does not proxy, like the websocket servers do, from a thread
+    of their own. Raises OSError if the port cannot be bound.
+    """
+    loop = asyncio.new_event_loop()
+    admin_handlers = {"/admin/profiles": profiles_handler, "/admin/logging": logs.admin_handler}
+    try:
+        # Bound here, so that an error is raised to the caller instead of ending the thread.
+        loop.run_until_complete(metrics.serve(host, port, handlers=admin_handlers))
+    except BaseException:
+        loop.close()
+        raise
+    threading.Thread(target=loop.run_forever, name="admin", daemon=True).start()
+
+
+def start() -> None:
+    """
+    Start the simulation workers and the admin endpoints, once per server process. Called by gunicorn after a worker
+    is initialized and by main.py, but not on import, so that importing the app has no side effects.
+    """
+    # Resume the simulations that were running when the server last stopped.
+    scheduler.restore()
+    scheduler.start()
+    # The admin endpoints are not authenticated, so they are only served on other interfaces when asked to.
+    serve_admin(app.config.get("ADMIN_HOST", "127.0.0.1"), int(app.config.get("ADMIN_PORT", 9100)))
 
 
 @app.route("/healthz", methods=["GET"])
@@ -102,6 +310,11 @@ def healthz() -> flask.Response:
     return flask.make_response("OK\n", 200)
 
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics() -> flask.Response:
+    return flask.Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route("/favicon.ico", methods=["GET"])
 def favicon() -> flask.Response:
     return flask.make_response("", 204)
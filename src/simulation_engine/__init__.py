@@ -1 +1,12 @@
+from .event_log import *
 from .simulator import *
+from .dcr_engine import *
+from .flowchart_engine import *
+from .petri_net_engine import *
+from .state_space import *
+from .conformance import *
+from .result_cache import *
+from .statistics import *
+from .replication import *
+from .scheduler import *
+from .checkpoint import *
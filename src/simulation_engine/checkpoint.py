@@ -0,0 +1,107 @@
+import logging
+import os
+import pathlib
+import pickle
+import time
+import zlib
+from typing import Any, Iterator
+
+from src.simulation_engine import simulator
+
+
+class Checkpoint:
+    """
+    The checkpoint of a running simulation.
+
+    Engines that support resuming start from `state` if it is set, and call `save` with their state whenever
+    `due()`. The state is anything picklable, typically the marking, the state of the random generator and the
+    statistics aggregated so far.
+    """
+
+    def __init__(
+        self,
+        store: "CheckpointStore",
+        simulation: simulator.SimulationBase,
+        state: Any = None,
+        interval: float = 60.0,
+        model_hash: str | None = None,
+    ) -> None:
+        self.store = store
+        self.simulation = simulation
+        self.state = state
+        self.interval = interval
+        self.model_hash = model_hash
+        self._saved_at = time.monotonic()
+
+    def due(self) -> bool:
+        return time.monotonic() - self._saved_at >= self.interval
+
+    def save(self, state: Any) -> None:
+        self.state = state
+        self.store.save(self.simulation, state, self.model_hash)
+        self._saved_at = time.monotonic()
+
+
+class CheckpointStore:
+    """
+    Checkpoints of running simulations on local disk, one compressed pickle per simulation.
+
+    A checkpoint holds the simulation (model, parameters, owner and priority) along with the engine state and the
+    content hash of the model it was taken of, so the simulations that were running when the process stopped can be
+    queued again on startup with `restore`, and resume unless their model changed since.
+    Checkpoints are written to a temporary file and renamed, so a crash while saving leaves the previous one.
+    """
+
+    def __init__(self, directory: pathlib.Path, interval: float = 60.0) -> None:
+        self.directory = directory
+        self.interval = interval
+
+    def _path(self, simulation_id: simulator.SimulationId) -> pathlib.Path:
+        return self.directory / f"{simulation_id}.checkpoint"
+
+    def save(self, simulation: simulator.SimulationBase, state: Any, model_hash: str | None = None) -> None:
+        data = zlib.compress(pickle.dumps((simulation.dict(), model_hash, state), protocol=pickle.HIGHEST_PROTOCOL))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(simulation.id)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+
+    def _read(self, path: pathlib.Path) -> tuple[dict, str | None, Any] | None:
+        try:
+            with open(path, "rb") as f:
+                return pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, ValueError) as error:
+            logging.warning(f"Dropping unreadable checkpoint {path}: {error}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def open(self, simulation: simulator.SimulationBase, model_hash: str | None = None) -> Checkpoint:
+        """
+        The checkpoint of a simulation that is starting on the model with `model_hash`, with its last state if it was
+        checkpointed before on the same model.
+        """
+        saved = self._read(self._path(simulation.id))
+        if saved is not None and saved[1] != model_hash:
+            logging.info(f"Discarding the checkpoint of simulation {simulation.id}, its model changed")
+            saved = None
+        checkpoint = Checkpoint(self, simulation, saved[2] if saved else None, self.interval, model_hash)
+        if saved is None:
+            # Record the simulation right away, so it is queued again even if it stops before its first checkpoint.
+            checkpoint.save(None)
+        return checkpoint
+
+    def delete(self, simulation_id: simulator.SimulationId) -> None:
+        self._path(simulation_id).unlink(missing_ok=True)
+
+    def restore(self) -> Iterator[simulator.QueuedSimulation]:
+        """
+        Yield the simulations that checkpoints were taken of, as queued. They keep their ids, so they resume from
+        their checkpoint when they run again.
+        """
+        for path in sorted(self.directory.glob("*.checkpoint")):
+            if (saved := self._read(path)) is not None:
+                yield simulator.QueuedSimulation.parse_obj(saved[0])
@@ -0,0 +1,250 @@
+import abc
+import collections
+import itertools
+import operator
+import pathlib
+import threading
+from typing import Literal, NamedTuple
+
+import pydantic
+
+from src import process_model as pm
+from src.process_model import dcr_graph
+from src.process_model import petri_net
+from src.simulation_engine import event_log
+from src.simulation_engine import simulator
+from src.simulation_engine.dcr_engine import DcrExecutor
+from src.simulation_engine.petri_net_engine import CompiledPetriNet
+
+Variant = tuple[str, ...]
+
+
+def read_variants(path: pathlib.Path) -> collections.Counter[Variant]:
+    """
+    Stream an event log into its trace variants and their number of cases.
+
+    The events of a case must be consecutive, as in XES logs and the logs written by the simulator. Activity names
+    are interned so the variants share them.
+    """
+    events = event_log.read_xes(path) if path.suffix == ".xes" else event_log.read_events(path)
+    activities: dict[str, str] = {}
+    variants: collections.Counter[Variant] = collections.Counter()
+    for _, case in itertools.groupby(events, key=operator.attrgetter("case_id")):
+        variants[tuple(activities.setdefault(event.activity, event.activity) for event in case)] += 1
+    return variants
+
+
+class NodeDeviations(pydantic.BaseModel):
+    # Tokens that had to be created (places) to replay the log.
+    missing: int = 0
+    # Tokens left behind (places) or events left pending (DCR events) at the end of a case.
+    remaining: int = 0
+    # Times the activity occurred while the node was not enabled.
+    violations: int = 0
+
+
+class ConformanceResult(simulator.SimulationResult):
+    result_type: Literal["conformance"] = "conformance"
+    cases: int
+    variants: int
+    # Mean trace fitness over the cases, between 0 and 1.
+    fitness: float
+    fitting_cases: int
+    deviations: dict[str, NodeDeviations]
+    # Activities of the log without a node of the same name, with their number of occurrences.
+    unmapped_activities: dict[str, int]
+
+
+class TraceReplay(NamedTuple):
+    fitness: float
+    # Deviation counts by (node name, deviation kind), for a single case.
+    deviations: collections.Counter[tuple[str, str]]
+    unmapped: collections.Counter[str]
+
+    @property
+    def fitting(self) -> bool:
+        return not self.deviations and not self.unmapped
+
+
+class Replayer(abc.ABC):
+    @abc.abstractmethod
+    def replay(self, variant: Variant) -> TraceReplay:
+        ...
+
+
+class TokenReplayer(Replayer):
+    """
+    Token-based replay on a Petri net.
+
+    Activities are mapped to the transitions of the same name. A transition fires even when it is not enabled,
+    creating the missing tokens. At the end one token is consumed from every accepting place, and the tokens left
+    behind are counted as remaining; nets without accepting places have no final marking, so nothing remains.
+    The fitness of a case is `(1 - missing / consumed + 1 - remaining / produced) / 2`.
+    """
+
+    def __init__(self, net: CompiledPetriNet) -> None:
+        self.net = net
+        self.transitions: dict[str, int] = {}
+        for transition, name in enumerate(net.transition_names):
+            self.transitions.setdefault(name, transition)
+
+    def replay(self, variant: Variant) -> TraceReplay:
+        net = self.net
+        marking = list(net.initial_marking)
+        produced, consumed, missing, remaining = sum(marking), 0, 0, 0
+        deviations: collections.Counter[tuple[str, str]] = collections.Counter()
+        unmapped: collections.Counter[str] = collections.Counter()
+        for activity in variant:
+            transition = self.transitions.get(activity)
+            if transition is None:
+                unmapped[activity] += 1
+                continue
+            enabled = True
+            for place, weight in net.inputs[transition]:
+                if marking[place] < weight:
+                    enabled = False
+                    missing += weight - marking[place]
+                    deviations[(net.place_names[place], "missing")] += weight - marking[place]
+                    marking[place] = weight
+                marking[place] -= weight
+                consumed += weight
+            if not enabled:
+                deviations[(activity, "violations")] += 1
+            for place, weight in net.outputs[transition]:
+                marking[place] += weight
+                produced += weight
+
+        if net.accepting_places:
+            for place in net.accepting_places:
+                if marking[place] == 0:
+                    missing += 1
+                    deviations[(net.place_names[place], "missing")] += 1
+                else:
+                    marking[place] -= 1
+                consumed += 1
+            for place, tokens in enumerate(marking):
+                if tokens:
+                    remaining += tokens
+                    deviations[(net.place_names[place], "remaining")] += tokens
+
+        missing_fraction = missing / consumed if consumed else 0
+        remaining_fraction = remaining / produced if produced else 0
+        return TraceReplay(1 - (missing_fraction + remaining_fraction) / 2, deviations, unmapped)
+
+
+class DcrReplayer(Replayer):
+    """
+    Replay on a DCR graph. Events that are not enabled are reported as violations and skipped, and included events
+    still pending at the end remain. The fitness of a case is the fraction of its events that were enabled, where
+    every remaining event counts as one more event.
+    """
+
+    def __init__(self, executor: DcrExecutor) -> None:
+        self.executor = executor
+
+    def replay(self, variant: Variant) -> TraceReplay:
+        executor = self.executor
+        executor.reset()
+        deviations: collections.Counter[tuple[str, str]] = collections.Counter()
+        unmapped: collections.Counter[str] = collections.Counter()
+        executed = 0
+        for activity in variant:
+            event = executor.index_of(activity)
+            if event is None:
+                unmapped[activity] += 1
+            elif executor.is_enabled(event):
+                executor.execute(event)
+                executed += 1
+            else:
+                deviations[(activity, "violations")] += 1
+
+        pending = [i for i in range(len(executor.event_ids)) if executor.included[i] and executor.pending[i]]
+        for i in pending:
+            deviations[(executor.event_names[i], "remaining")] += 1
+        total = executed + deviations.total()
+        return TraceReplay(executed / total if total else 1.0, deviations, unmapped)
+
+
+class ConformanceEngine(simulator.SimulationEngine):
+    """
+    Replay the event log at `parameters.log_path` on a model and report fitness and deviations per node.
+
+    The log is reduced to its trace variants while it is streamed, and every variant is replayed once and weighted by
+    its number of cases. Replays are cached per model content and variant, so checking another log against the same
+    model only replays the variants that are new. The cache is shared by the simulation workers.
+    """
+
+    simulation_type = simulator.SimulationType.CONFORMANCE
+    CACHE_SIZE = 100_000
+
+    _cache: collections.OrderedDict[tuple[str, Variant], TraceReplay] = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def replayer(self, model: pm.ProcessModel) -> Replayer:
+        ...
+
+    def run(
+        self,
+        model: pm.ProcessModel,
+        parameters: simulator.SimulationParameters,
+        events: event_log.EventSink | None = None,
+    ) -> ConformanceResult:
+        # There are no new events to log, the events come from the log.
+        if parameters.log_path is None:
+            raise ValueError("Conformance checking needs an event log")
+        variants = read_variants(pathlib.Path(parameters.log_path))
+        replayer = self.replayer(model)
+        model_hash = model.content_hash()
+
+        cases, fitness, fitting_cases = 0, 0.0, 0
+        deviations: collections.Counter[tuple[str, str]] = collections.Counter()
+        unmapped: collections.Counter[str] = collections.Counter()
+        for variant, count in variants.items():
+            key = (model_hash, variant)
+            with self._cache_lock:
+                replay = self._cache.get(key)
+                if replay is not None:
+                    self._cache.move_to_end(key)
+            if replay is None:
+                # Replayed outside of the lock, so that workers replaying other variants do not wait for each other.
+                replay = replayer.replay(variant)
+                with self._cache_lock:
+                    self._cache[key] = replay
+                    if len(self._cache) > self.CACHE_SIZE:
+                        self._cache.popitem(last=False)
+            cases += count
+            fitness += replay.fitness * count
+            fitting_cases += count if replay.fitting else 0
+            for deviation, deviation_count in replay.deviations.items():
+                deviations[deviation] += deviation_count * count
+            for activity, activity_count in replay.unmapped.items():
+                unmapped[activity] += activity_count * count
+
+        node_deviations: dict[str, NodeDeviations] = collections.defaultdict(NodeDeviations)
+        for (node, kind), count in sorted(deviations.items()):
+            setattr(node_deviations[node], kind, count)
+        return ConformanceResult(
+            cases=cases,
+            variants=len(variants),
+            fitness=fitness / cases if cases else 1.0,
+            fitting_cases=fitting_cases,
+            deviations=dict(node_deviations),
+            unmapped_activities=dict(unmapped.most_common()),
+        )
+
+
+@simulator.register_engine
+class PetriNetConformanceEngine(ConformanceEngine):
+    model_type = pm.ProcessModelType.PETRI_NET
+
+    def replayer(self, model: petri_net.PetriNet) -> TokenReplayer:
+        return TokenReplayer(CompiledPetriNet(model))
+
+
+@simulator.register_engine
+class DcrConformanceEngine(ConformanceEngine):
+    model_type = pm.ProcessModelType.DCR_GRAPH
+
+    def replayer(self, model: dcr_graph.DcrGraph) -> DcrReplayer:
+        return DcrReplayer(DcrExecutor(model))
@@ -0,0 +1,214 @@
+import random
+from typing import Literal
+
+from src import process_model as pm
+from src.process_model import dcr_graph
+from src.simulation_engine import event_log
+from src.simulation_engine import simulator
+
+
+class DcrExecutor:
+    """
+    Executes events of a DCR graph, keeping enabledness and acceptance incrementally up to date.
+
+    Events are indexed densely and every relation type is stored as per-event adjacency lists. For each event we
+    count the conditions and milestones currently blocking it, so executing an event only updates the events that
+    are related to the events whose marking changed, instead of re-evaluating the whole graph.
+    """
+
+    def __init__(self, graph: dcr_graph.DcrGraph) -> None:
+        nodes = graph.get_nodes()
+        self.event_ids: list[pm.NodeId] = [node.id for node in nodes]
+        self.event_names: list[str] = [node.name for node in nodes]
+        self._index = {node.id: i for i, node in enumerate(nodes)}
+        self._index_by_name: dict[str, int] = {}
+        for i, node in enumerate(nodes):
+            self._index_by_name.setdefault(node.name, i)
+
+        self._initial_marking = [(node.executed, node.pending, node.included) for node in nodes]
+
+        relations: dict[dcr_graph.DcrRelationType, list[list[int]]] = {
+            relation_type: [[] for _ in nodes] for relation_type in dcr_graph.DcrRelationType
+        }
+        for edge in graph.get_edges():
+            start, end = self._index[edge.start_node_id], self._index[edge.end_node_id]
+            relations[edge.relation_type][start].append(end)
+        self._condition_targets = relations[dcr_graph.DcrRelationType.CONDITION]
+        self._responses = relations[dcr_graph.DcrRelationType.RESPONSE]
+        self._includes = relations[dcr_graph.DcrRelationType.INCLUDE]
+        self._excludes = relations[dcr_graph.DcrRelationType.EXCLUDE]
+        self._milestone_targets = relations[dcr_graph.DcrRelationType.MILESTONE]
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Return to the initial marking of the graph."""
+        self.executed = [executed for executed, _, _ in self._initial_marking]
+        self.pending = [pending for _, pending, _ in self._initial_marking]
+        self.included = [included for _, _, included in self._initial_marking]
+
+        self._blockers = [0] * len(self.event_ids)
+        self._included_pending = 0
+        for i in range(len(self.event_ids)):
+            if self._blocks_condition(i):
+                for j in self._condition_targets[i]:
+                    self._blockers[j] += 1
+            if self._blocks_milestone(i):
+                self._included_pending += 1
+                for j in self._milestone_targets[i]:
+                    self._blockers[j] += 1
+
+        # Enabled events as an indexable list (with positions) so a random enabled event can be drawn in O(1).
+        self._enabled: list[int] = []
+        self._enabled_position: dict[int, int] = {}
+        for i in range(len(self.event_ids)):
+            self._update_enabled(i)
+
+    def _blocks_condition(self, i: int) -> bool:
+        return self.included[i] and not self.executed[i]
+
+    def _blocks_milestone(self, i: int) -> bool:
+        return self.included[i] and self.pending[i]
+
+    def _update_enabled(self, i: int) -> None:
+        enabled = self.included[i] and self._blockers[i] == 0
+        if enabled and i not in self._enabled_position:
+            self._enabled_position[i] = len(self._enabled)
+            self._enabled.append(i)
+        elif not enabled and i in self._enabled_position:
+            position = self._enabled_position.pop(i)
+            last = self._enabled.pop()
+            if last != i:
+                self._enabled[position] = last
+                self._enabled_position[last] = position
+
+    def index_of(self, name: str) -> int | None:
+        """Index of the (first) event with the given name."""
+        return self._index_by_name.get(name)
+
+    def is_enabled(self, i: int) -> bool:
+        return i in self._enabled_position
+
+    @property
+    def enabled(self) -> list[int]:
+        return self._enabled
+
+    @property
+    def is_accepting(self) -> bool:
+        """A DCR graph is accepting when no included event is pending."""
+        return self._included_pending == 0
+
+    def execute(self, i: int) -> None:
+        if not self.is_enabled(i):
+            raise ValueError(f"Event {self.event_names[i]} is not enabled")
+
+        touched = {i, *self._responses[i], *self._includes[i], *self._excludes[i]}
+        before = {k: (self._blocks_condition(k), self._blocks_milestone(k)) for k in touched}
+
+        self.executed[i] = True
+        self.pending[i] = False
+        for j in self._responses[i]:
+            self.pending[j] = True
+        for j in self._excludes[i]:
+            self.included[j] = False
+        for j in self._includes[i]:
+            self.included[j] = True
+
+        affected = set(touched)
+        for k, (blocked_condition, blocked_milestone) in before.items():
+            condition_delta = self._blocks_condition(k) - blocked_condition
+            if condition_delta:
+                for j in self._condition_targets[k]:
+                    self._blockers[j] += condition_delta
+                affected.update(self._condition_targets[k])
+            milestone_delta = self._blocks_milestone(k) - blocked_milestone
+            if milestone_delta:
+                self._included_pending += milestone_delta
+                for j in self._milestone_targets[k]:
+                    self._blockers[j] += milestone_delta
+                affected.update(self._milestone_targets[k])
+        for j in affected:
+            self._update_enabled(j)
+
+
+class DcrSimulationResult(simulator.SimulationResult):
+    result_type: Literal["dcr_run"] = "dcr_run"
+    steps: int
+    accepting: bool
+    # Executed events of a random run; replays only report the positions of the events that were not enabled.
+    trace: list[str] = []
+    violations: list[int] = []
+
+
+@simulator.register_engine
+class DcrGraphEngine(simulator.SimulationEngine):
+    """
+    Run a DCR graph from its initial marking.
+
+    Replays `parameters.trace` if given, otherwise executes randomly chosen enabled events until no event is
+    enabled or `parameters.max_steps` events have been executed.
+    """
+
+    model_type = pm.ProcessModelType.DCR_GRAPH
+
+    def __init__(self) -> None:
+        self._executor: tuple[dcr_graph.DcrGraph, DcrExecutor] | None = None
+
+    def executor(self, model: dcr_graph.DcrGraph) -> DcrExecutor:
+        """An executor in the initial marking, reusing the relation indexes across runs of the same model."""
+        if self._executor is None or self._executor[0] is not model:
+            self._executor = (model, DcrExecutor(model))
+        else:
+            self._executor[1].reset()
+        return self._executor[1]
+
+    def run(
+        self,
+        model: dcr_graph.DcrGraph,
+        parameters: simulator.SimulationParameters,
+        events: event_log.EventSink | None = None,
+    ) -> DcrSimulationResult:
+        executor = self.executor(model)
+        if parameters.trace is not None:
+            return self.replay(executor, parameters.trace, events)
+
+        trace = self.random_run(executor, random.Random(parameters.seed), parameters.max_steps)
+        if events is not None:
+            for step, event in enumerate(trace):
+                events.append(0, executor.event_names[event], step)
+        return DcrSimulationResult(
+            steps=len(trace), accepting=executor.is_accepting, trace=[executor.event_names[i] for i in trace]
+        )
+
+    def run_replication(
+        self, model: dcr_graph.DcrGraph, parameters: simulator.SimulationParameters, rng: random.Random
+    ) -> dict[str, float]:
+        executor = self.executor(model)
+        steps = len(self.random_run(executor, rng, parameters.max_steps))
+        return {"steps": steps, "accepting": executor.is_accepting}
+
+    @staticmethod
+    def random_run(executor: DcrExecutor, rng: random.Random, max_steps: int) -> list[int]:
+        trace = []
+        for _ in range(max_steps):
+            if not executor.enabled:
+                break
+            event = executor.enabled[rng.randrange(len(executor.enabled))]
+            executor.execute(event)
+            trace.append(event)
+        return trace
+
+    def replay(
+        self, executor: DcrExecutor, trace: list[str], events: event_log.EventSink | None = None
+    ) -> DcrSimulationResult:
+        """Replay a trace, skipping and reporting events that are not enabled; only executed events are logged."""
+        violations = []
+        for position, activity in enumerate(trace):
+            event = executor.index_of(activity)
+            if event is None or not executor.is_enabled(event):
+                violations.append(position)
+            else:
+                executor.execute(event)
+                if events is not None:
+                    events.append(0, activity, position)
+        return DcrSimulationResult(steps=len(trace), accepting=executor.is_accepting, violations=violations)
@@ -0,0 +1,315 @@
+import datetime
+import mmap
+import os
+import pathlib
+import struct
+from array import array
+from typing import Iterable, Iterator, NamedTuple, Protocol
+from xml.etree import ElementTree
+from xml.sax import saxutils
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class Event(NamedTuple):
+    case_id: int
+    activity: str
+    # Simulation time of the event.
+    timestamp: float
+
+
+class EventSink(Protocol):
+    """Where engines write the events of a run, one event per fired transition or executed activity."""
+
+    def append(self, case_id: int, activity: str, timestamp: float) -> None:
+        ...
+
+
+class EventLogWriter:
+    """
+    Streams events to a chunked columnar file.
+
+    Events are buffered in typed arrays and written every `chunk_size` events as one chunk. Activities are
+    dictionary encoded: a chunk stores the activity names first seen in it, followed by the case id, timestamp and
+    activity code columns. All columns are 8-byte aligned so a reader can map them directly from the file.
+
+    Layout (little-endian)::
+
+        file:  MAGIC chunk*
+        chunk: <event count: u32> <new activity count: u32> (<length: u32> <utf-8 name>)* padding
+               <case ids: i64 * count> <timestamps: f64 * count> <activity codes: u32 * count> padding
+    """
+
+    MAGIC = b"SEAEVT01"
+    suffix = ".events"
+
+    def __init__(self, path: pathlib.Path, chunk_size: int = 65536) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self._activity_codes: dict[str, int] = {}
+        self._new_activities: list[str] = []
+        self._case_ids = array("q")
+        self._timestamps = array("d")
+        self._activities = array("I")
+        self._file = open(path, "wb")
+        self._file.write(self.MAGIC)
+
+    def append(self, case_id: int, activity: str, timestamp: float) -> None:
+        code = self._activity_codes.get(activity)
+        if code is None:
+            code = self._activity_codes[activity] = len(self._activity_codes)
+            self._new_activities.append(activity)
+        self._case_ids.append(case_id)
+        self._timestamps.append(timestamp)
+        self._activities.append(code)
+        if len(self._case_ids) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._case_ids:
+            return
+        header = bytearray(struct.pack("<II", len(self._case_ids), len(self._new_activities)))
+        for activity in self._new_activities:
+            name = activity.encode()
+            header += struct.pack("<I", len(name)) + name
+        header += bytes(-len(header) % 8)
+        self._file.write(header)
+        self._file.write(self._case_ids.tobytes())
+        self._file.write(self._timestamps.tobytes())
+        self._file.write(self._activities.tobytes())
+        self._file.write(bytes(-len(self._activities) * 4 % 8))
+        self._new_activities.clear()
+        # Reallocate rather than clear so the buffers do not keep their peak size.
+        self._case_ids, self._timestamps, self._activities = array("q"), array("d"), array("I")
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "EventLogWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ParquetEventLogWriter:
+    """Streams events to a Parquet file with one row group per chunk, for use with external analysis tools."""
+
+    suffix = ".parquet"
+
+    def __init__(self, path: pathlib.Path, chunk_size: int = 65536) -> None:
+        if pyarrow is None:
+            raise RuntimeError("Writing Parquet event logs requires pyarrow")
+        self.path = path
+        self.chunk_size = chunk_size
+        self._schema = pyarrow.schema(
+            [
+                ("case_id", pyarrow.int64()),
+                ("activity", pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+                ("timestamp", pyarrow.float64()),
+            ]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        self._events: list[Event] = []
+
+    def append(self, case_id: int, activity: str, timestamp: float) -> None:
+        self._events.append(Event(case_id, activity, timestamp))
+        if len(self._events) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._events:
+            return
+        case_ids, activities, timestamps = zip(*self._events)
+        table = pyarrow.table(
+            [
+                pyarrow.array(case_ids, pyarrow.int64()),
+                pyarrow.array(activities, pyarrow.string()).dictionary_encode(),
+                pyarrow.array(timestamps, pyarrow.float64()),
+            ],
+            schema=self._schema,
+        )
+        self._writer.write_table(table)
+        self._events = []
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "ParquetEventLogWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_writer(path: pathlib.Path, chunk_size: int = 65536) -> EventLogWriter | ParquetEventLogWriter:
+    """Open a writer for `path` (without suffix), writing Parquet if pyarrow is installed."""
+    writer_class = EventLogWriter if pyarrow is None else ParquetEventLogWriter
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return writer_class(path.with_suffix(writer_class.suffix), chunk_size)
+
+
+class EventChunk(NamedTuple):
+    case_ids: memoryview
+    timestamps: memoryview
+    # Codes into the activity names of the reader.
+    activities: memoryview
+
+
+class EventLogReader:
+    """
+    Lazily reads a file written by `EventLogWriter` through a memory map.
+
+    Opening the log only reads the chunk headers; the columns are exposed as memoryviews into the mapped file, so
+    iterating over millions of events does not load them into memory. Memoryviews from `chunks()` must be released
+    before the reader is closed.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.activities: list[str] = []
+        # Offset and event count of each chunk's columns.
+        self._chunks: list[tuple[int, int]] = []
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if self._map[: len(EventLogWriter.MAGIC)] != EventLogWriter.MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an event log")
+
+        offset = len(EventLogWriter.MAGIC)
+        while offset < size:
+            count, new_activities = struct.unpack_from("<II", self._map, offset)
+            offset += 8
+            for _ in range(new_activities):
+                (length,) = struct.unpack_from("<I", self._map, offset)
+                self.activities.append(bytes(self._map[offset + 4 : offset + 4 + length]).decode())
+                offset += 4 + length
+            offset += -offset % 8
+            self._chunks.append((offset, count))
+            offset += count * 20
+            offset += -offset % 8
+
+    def __len__(self) -> int:
+        return sum(count for _, count in self._chunks)
+
+    def chunks(self) -> Iterator[EventChunk]:
+        with memoryview(self._map) as view:
+            for offset, count in self._chunks:
+                timestamps = offset + count * 8
+                activities = timestamps + count * 8
+                yield EventChunk(
+                    case_ids=view[offset:timestamps].cast("q"),
+                    timestamps=view[timestamps:activities].cast("d"),
+                    activities=view[activities : activities + count * 4].cast("I"),
+                )
+
+    def __iter__(self) -> Iterator[Event]:
+        activities = self.activities
+        for chunk in self.chunks():
+            with chunk.case_ids, chunk.timestamps, chunk.activities:
+                for case_id, timestamp, activity in zip(chunk.case_ids, chunk.timestamps, chunk.activities):
+                    yield Event(case_id, activities[activity], timestamp)
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "EventLogReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_events(path: pathlib.Path) -> Iterator[Event]:
+    """Iterate over the events of a log written by `open_writer`, in either format."""
+    if path.suffix == ParquetEventLogWriter.suffix:
+        if pyarrow is None:
+            raise RuntimeError("Reading Parquet event logs requires pyarrow")
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches():
+            columns = batch.to_pydict()
+            for case_id, activity, timestamp in zip(columns["case_id"], columns["activity"], columns["timestamp"]):
+                yield Event(case_id, activity, timestamp)
+    else:
+        with EventLogReader(path) as reader:
+            yield from reader
+
+
+def write_xes(
+    events: Iterable[Event],
+    path: pathlib.Path,
+    start_time: datetime.datetime = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc),
+) -> None:
+    """
+    Export events as an XES log, streaming.
+
+    Consecutive events of the same case form a trace, which is how the engines write them. Simulation time is
+    converted to timestamps as seconds after `start_time`.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<log xes.version="1.0" xmlns="http://www.xes-standard.org/">\n')
+        f.write('  <extension name="Concept" prefix="concept" uri="http://www.xes-standard.org/concept.xesext"/>\n')
+        f.write('  <extension name="Time" prefix="time" uri="http://www.xes-standard.org/time.xesext"/>\n')
+        case_id = None
+        for event in events:
+            if event.case_id != case_id:
+                if case_id is not None:
+                    f.write("  </trace>\n")
+                case_id = event.case_id
+                f.write(f'  <trace>\n    <string key="concept:name" value="{case_id}"/>\n')
+            timestamp = (start_time + datetime.timedelta(seconds=event.timestamp)).isoformat()
+            f.write(
+                "    <event>"
+                f'<string key="concept:name" value={saxutils.quoteattr(event.activity)}/>'
+                f'<date key="time:timestamp" value="{timestamp}"/>'
+                "</event>\n"
+            )
+        if case_id is not None:
+            f.write("  </trace>\n")
+        f.write("</log>\n")
+
+
+XES_NAMESPACE = "{http://www.xes-standard.org/}"
+
+
+def read_xes(path: pathlib.Path) -> Iterator[Event]:
+    """
+    Iterate over the events of an XES log, streaming.
+
+    Traces are numbered in order as case ids. Events without a timestamp get the timestamp of the previous event, and
+    timestamps are seconds since the epoch.
+    """
+    case_id, timestamp = -1, 0.0
+    elements = ElementTree.iterparse(path, events=("start", "end"))
+    _, root = next(elements)
+    for action, element in elements:
+        tag = element.tag.removeprefix(XES_NAMESPACE)
+        if action == "start":
+            if tag == "trace":
+                case_id += 1
+            continue
+        if tag == "event":
+            activity = ""
+            for attribute in element:
+                match attribute.get("key"):
+                    case "concept:name":
+                        activity = attribute.get("value", "")
+                    case "time:timestamp":
+                        timestamp = datetime.datetime.fromisoformat(attribute.get("value")).timestamp()
+            yield Event(case_id, activity, timestamp)
+            element.clear()
+        elif tag == "trace":
+            # Drop parsed traces so memory does not grow with the log.
+            root.clear()
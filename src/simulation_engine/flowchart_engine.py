@@ -0,0 +1,257 @@
+import bisect
+import collections
+import itertools
+import math
+import os
+import pathlib
+import random
+import threading
+from typing import Iterator, Literal
+
+import pydantic
+
+from src import process_model as pm
+from src.process_model import flowchart
+from src.simulation_engine import event_log
+from src.simulation_engine import simulator
+
+
+class CompiledFlowchart:
+    """
+    A flowchart flattened into adjacency arrays for fast sampling.
+
+    Nodes are indexed densely. SUBPROCESS nodes are expanded inline: the node leads to the start of the referenced
+    flowchart, and the end nodes of that flowchart lead on to the successors of the SUBPROCESS node.
+    """
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.durations: list[float] = []
+        self.is_end: list[bool] = []
+        self.successors: list[list[int]] = []
+        self.cumulative_weights: list[list[float]] = []
+        self.start: int | None = None
+
+    def _add_node(self, name: str, duration: float, is_end: bool) -> int:
+        self.names.append(name)
+        self.durations.append(duration)
+        self.is_end.append(is_end)
+        self.successors.append([])
+        self.cumulative_weights.append([])
+        return len(self.names) - 1
+
+    def _add_successors(self, node: int, successors: list[tuple[int, float]]) -> None:
+        self.successors[node] = [successor for successor, _ in successors]
+        self.cumulative_weights[node] = list(itertools.accumulate(weight for _, weight in successors))
+
+    @classmethod
+    def compile(cls, model: flowchart.Flowchart) -> "CompiledFlowchart":
+        compiled = cls()
+        compiled.start = compiled._inline(model, prefix="", stack=(model.id,), exits=None)
+        return compiled
+
+    def _inline(
+        self, model: flowchart.Flowchart, prefix: str, stack: tuple[str, ...], exits: list[tuple[int, float]] | None
+    ) -> int | None:
+        """
+        Append the nodes of `model` and return the index of its start node.
+
+        Top-level end nodes are terminal; when inlining a subprocess (`exits` is given) they continue to `exits`.
+        """
+        index = {
+            node.id: self._add_node(
+                prefix + node.name,
+                node.duration,
+                is_end=node.node_type == flowchart.FlowchartNodeType.END and exits is None,
+            )
+            for node in model.get_nodes()
+        }
+        outgoing: dict[pm.NodeId, list[tuple[int, float]]] = collections.defaultdict(list)
+        for edge in model.get_edges():
+            if edge.probability > 0:
+                outgoing[edge.start_node_id].append((index[edge.end_node_id], edge.probability))
+
+        start = None
+        for node in model.get_nodes():
+            match node.node_type:
+                case flowchart.FlowchartNodeType.START if start is None:
+                    start = index[node.id]
+                    self._add_successors(start, outgoing[node.id])
+                case flowchart.FlowchartNodeType.END if exits is not None:
+                    self._add_successors(index[node.id], exits)
+                case flowchart.FlowchartNodeType.SUBPROCESS if node.subprocess_model_id:
+                    if node.subprocess_model_id in stack:
+                        raise ValueError(f"Subprocess {node.subprocess_model_id} includes itself")
+                    subprocess_start = self._inline(
+                        load_subprocess(node.subprocess_model_id),
+                        prefix=f"{prefix}{node.name}/",
+                        stack=stack + (node.subprocess_model_id,),
+                        exits=outgoing[node.id],
+                    )
+                    if subprocess_start is not None:
+                        self._add_successors(index[node.id], [(subprocess_start, 1.0)])
+                case _:
+                    self._add_successors(index[node.id], outgoing[node.id])
+        return start
+
+
+SUBPROCESS_CACHE_SIZE = 64
+
+# The latest version of the most recently used subprocess models, by path, shared by the simulation workers.
+_subprocess_cache: collections.OrderedDict[str, tuple[int, flowchart.Flowchart]] = collections.OrderedDict()
+_subprocess_cache_lock = threading.Lock()
+
+
+def load_subprocess(model_id: str) -> flowchart.Flowchart:
+    """Load a flowchart referenced by a SUBPROCESS node, cached until the file changes."""
+    path = pathlib.Path(model_id)
+    mtime = os.stat(path).st_mtime_ns
+    with _subprocess_cache_lock:
+        cached = _subprocess_cache.get(model_id)
+        if cached is not None and cached[0] == mtime:
+            _subprocess_cache.move_to_end(model_id)
+            return cached[1]
+    # Loaded outside of the lock, so that workers loading other models do not wait for each other.
+    model = flowchart.Flowchart.load(path)
+    with _subprocess_cache_lock:
+        # Replaces an older version of the same file.
+        _subprocess_cache[model_id] = (mtime, model)
+        _subprocess_cache.move_to_end(model_id)
+        if len(_subprocess_cache) > SUBPROCESS_CACHE_SIZE:
+            _subprocess_cache.popitem(last=False)
+    return model
+
+
+class PathFrequency(pydantic.BaseModel):
+    path: list[str]
+    count: int
+
+
+class CycleTimeSummary(pydantic.BaseModel):
+    mean: float
+    std: float
+    min: float
+    max: float
+
+
+class FlowchartSimulationResult(simulator.SimulationResult):
+    result_type: Literal["flowchart_run"] = "flowchart_run"
+    walks: int
+    # Walks that reached an end node within `max_steps` steps.
+    completed: int
+    paths: list[PathFrequency]
+    cycle_time: CycleTimeSummary | None = None
+
+
+@simulator.register_engine
+class FlowchartEngine(simulator.SimulationEngine):
+    """
+    Monte-Carlo traversal of a flowchart.
+
+    Samples `parameters.samples` token walks from the start node, choosing among the outgoing edges with their
+    probabilities, and reports the most frequent paths and the cycle times (sum of node durations) of completed walks.
+    """
+
+    model_type = pm.ProcessModelType.FLOWCHART
+    MAX_REPORTED_PATHS = 100
+    # Bound on the number of distinct paths counted, so cyclic flowcharts cannot exhaust memory.
+    MAX_DISTINCT_PATHS = 100_000
+    # Walks between checks whether a checkpoint is due.
+    CHECKPOINT_WALKS = 1000
+
+    def __init__(self) -> None:
+        self._compiled: tuple[flowchart.Flowchart, CompiledFlowchart] | None = None
+
+    def compile(self, model: flowchart.Flowchart) -> CompiledFlowchart:
+        """Compile the model, reusing the compiled flowchart across replications of the same model."""
+        if self._compiled is None or self._compiled[0] is not model:
+            compiled = CompiledFlowchart.compile(model)
+            if compiled.start is None:
+                raise ValueError("Flowchart has no start node")
+            self._compiled = (model, compiled)
+        return self._compiled[1]
+
+    def run(
+        self,
+        model: flowchart.Flowchart,
+        parameters: simulator.SimulationParameters,
+        events: event_log.EventSink | None = None,
+    ) -> FlowchartSimulationResult:
+        compiled = self.compile(model)
+        rng = random.Random(parameters.seed)
+        path_counts: collections.Counter[tuple[int, ...]] = collections.Counter()
+        walks, completed, total, total_squared, minimum, maximum = 0, 0, 0.0, 0.0, math.inf, -math.inf
+        if self.checkpoint is not None and self.checkpoint.state is not None:
+            rng_state, path_counts, (walks, completed, total, total_squared, minimum, maximum) = self.checkpoint.state
+            rng.setstate(rng_state)
+        samples = self.sample(compiled, parameters.samples - walks, parameters.max_steps, rng)
+        for case_id, (path, cycle_time) in enumerate(samples, start=walks):
+            if events is not None:
+                # Each walk is a case; an event is timestamped with the time its node starts.
+                timestamp = 0.0
+                for node in path:
+                    events.append(case_id, compiled.names[node], timestamp)
+                    timestamp += compiled.durations[node]
+            if path in path_counts or len(path_counts) < self.MAX_DISTINCT_PATHS:
+                path_counts[path] += 1
+            if cycle_time is not None:
+                completed += 1
+                total += cycle_time
+                total_squared += cycle_time * cycle_time
+                minimum = min(minimum, cycle_time)
+                maximum = max(maximum, cycle_time)
+            if self.checkpoint is not None and case_id % self.CHECKPOINT_WALKS == 0 and self.checkpoint.due():
+                summary = (case_id + 1, completed, total, total_squared, minimum, maximum)
+                self.checkpoint.save((rng.getstate(), path_counts, summary))
+
+        cycle_time_summary = None
+        if completed:
+            mean = total / completed
+            cycle_time_summary = CycleTimeSummary(
+                mean=mean, std=math.sqrt(max(total_squared / completed - mean * mean, 0.0)), min=minimum, max=maximum
+            )
+        return FlowchartSimulationResult(
+            walks=parameters.samples,
+            completed=completed,
+            paths=[
+                PathFrequency(path=[compiled.names[node] for node in path], count=count)
+                for path, count in path_counts.most_common(self.MAX_REPORTED_PATHS)
+            ],
+            cycle_time=cycle_time_summary,
+        )
+
+    def run_replication(
+        self, model: flowchart.Flowchart, parameters: simulator.SimulationParameters, rng: random.Random
+    ) -> dict[str, float]:
+        """A replication is a single walk."""
+        [(path, cycle_time)] = self.sample(self.compile(model), 1, parameters.max_steps, rng)
+        metrics = {"steps": len(path), "completed": cycle_time is not None}
+        if cycle_time is not None:
+            metrics["cycle_time"] = cycle_time
+        return metrics
+
+    @staticmethod
+    def sample(
+        compiled: CompiledFlowchart, walks: int, max_steps: int, rng: random.Random
+    ) -> Iterator[tuple[tuple[int, ...], float | None]]:
+        """Yield `(path, cycle_time)` for each walk; the cycle time is None if the walk did not reach an end node."""
+        # Bind everything used in the inner loop to locals.
+        start, durations, is_end = compiled.start, compiled.durations, compiled.is_end
+        successors, cumulative_weights = compiled.successors, compiled.cumulative_weights
+        random_float, bisect_right = rng.random, bisect.bisect_right
+        for _ in range(walks):
+            node, path, cycle_time = start, [start], durations[start]
+            for _ in range(max_steps):
+                if is_end[node]:
+                    break
+                next_nodes = successors[node]
+                if not next_nodes:
+                    break
+                if len(next_nodes) == 1:
+                    node = next_nodes[0]
+                else:
+                    weights = cumulative_weights[node]
+                    node = next_nodes[bisect_right(weights, random_float() * weights[-1], 0, len(weights) - 1)]
+                path.append(node)
+                cycle_time += durations[node]
+            yield tuple(path), (cycle_time if is_end[node] else None)
@@ -0,0 +1,201 @@
+import random
+from typing import Literal
+
+from src import process_model as pm
+from src.process_model import petri_net
+from src.simulation_engine import event_log
+from src.simulation_engine import simulator
+
+
+class CompiledPetriNet:
+    """
+    A Petri net as index-based arrays, for simulation and analysis.
+
+    Places and transitions are indexed densely. A marking is a sequence of token counts indexed by place, and
+    each transition has lists of `(place, weight)` for its input and output arcs. An arc weight is the
+    `ball_count` of the edge, or 1 if it is not set.
+    """
+
+    def __init__(self, model: petri_net.PetriNet) -> None:
+        places = [node for node in model.get_nodes() if node.node_type == petri_net.NodeType.PLACE]
+        transitions = [node for node in model.get_nodes() if node.node_type == petri_net.NodeType.TRANSITION]
+        self.place_ids: list[pm.NodeId] = [place.id for place in places]
+        self.place_names: list[str] = [place.name for place in places]
+        self.transition_ids: list[pm.NodeId] = [transition.id for transition in transitions]
+        self.transition_names: list[str] = [transition.name for transition in transitions]
+        self.initial_marking: tuple[int, ...] = tuple(place.ball_count for place in places)
+        self.accepting_places: list[int] = [i for i, place in enumerate(places) if place.accepting_state]
+
+        place_index = {place_id: i for i, place_id in enumerate(self.place_ids)}
+        transition_index = {transition_id: i for i, transition_id in enumerate(self.transition_ids)}
+        self.inputs: list[list[tuple[int, int]]] = [[] for _ in transitions]
+        self.outputs: list[list[tuple[int, int]]] = [[] for _ in transitions]
+        for edge in model.get_edges():
+            weight = edge.ball_count or 1
+            if edge.start_node_id in place_index and edge.end_node_id in transition_index:
+                self.inputs[transition_index[edge.end_node_id]].append((place_index[edge.start_node_id], weight))
+            elif edge.start_node_id in transition_index and edge.end_node_id in place_index:
+                self.outputs[transition_index[edge.start_node_id]].append((place_index[edge.end_node_id], weight))
+
+        # The transitions whose enabledness can change when a transition fires.
+        consumers: list[list[int]] = [[] for _ in places]
+        for transition, inputs in enumerate(self.inputs):
+            for place, _ in inputs:
+                consumers[place].append(transition)
+        self.affected: list[list[int]] = []
+        for transition in range(len(transitions)):
+            changed_places = [place for place, _ in self.inputs[transition] + self.outputs[transition]]
+            self.affected.append(sorted({transition, *(t for place in changed_places for t in consumers[place])}))
+
+    def is_enabled(self, marking: list[int] | tuple[int, ...], transition: int) -> bool:
+        return all(marking[place] >= weight for place, weight in self.inputs[transition])
+
+    def enabled_transitions(self, marking: list[int] | tuple[int, ...]) -> list[int]:
+        return [transition for transition in range(len(self.inputs)) if self.is_enabled(marking, transition)]
+
+    def fire(self, marking: list[int], transition: int) -> None:
+        """Fire an enabled transition, updating the marking in place."""
+        for place, weight in self.inputs[transition]:
+            marking[place] -= weight
+        for place, weight in self.outputs[transition]:
+            marking[place] += weight
+
+
+class TokenGame:
+    """
+    Plays the token game on a compiled Petri net, firing randomly chosen enabled transitions.
+
+    The set of enabled transitions is updated incrementally: firing a transition only re-checks the transitions
+    that consume from the places it changed.
+    """
+
+    def __init__(self, net: CompiledPetriNet, rng: random.Random, marking: list[int] | None = None) -> None:
+        self.net = net
+        self.rng = rng
+        self.marking = list(net.initial_marking if marking is None else marking)
+        self.fired = [0] * len(net.inputs)
+        self.steps = 0
+        # Enabled transitions as an indexable list (with positions) so a random enabled transition can be drawn in O(1).
+        self._enabled: list[int] = []
+        self._enabled_position: dict[int, int] = {}
+        for transition in range(len(net.inputs)):
+            self._update_enabled(transition)
+
+    def _update_enabled(self, transition: int) -> None:
+        enabled = self.net.is_enabled(self.marking, transition)
+        if enabled and transition not in self._enabled_position:
+            self._enabled_position[transition] = len(self._enabled)
+            self._enabled.append(transition)
+        elif not enabled and transition in self._enabled_position:
+            position = self._enabled_position.pop(transition)
+            last = self._enabled.pop()
+            if last != transition:
+                self._enabled[position] = last
+                self._enabled_position[last] = position
+
+    @property
+    def deadlocked(self) -> bool:
+        return not self._enabled
+
+    def step(self) -> int | None:
+        """Fire a random enabled transition and return it, or None if no transition is enabled."""
+        if not self._enabled:
+            return None
+        transition = self.rng.choice(self._enabled)
+        self.net.fire(self.marking, transition)
+        self.fired[transition] += 1
+        self.steps += 1
+        for affected in self.net.affected[transition]:
+            self._update_enabled(affected)
+        return transition
+
+    def state(self) -> tuple:
+        """The state of the game, to resume it with `restore`."""
+        # The order of the enabled transitions decides which one a random number picks.
+        return self.rng.getstate(), list(self.marking), list(self.fired), self.steps, list(self._enabled)
+
+    @classmethod
+    def restore(cls, net: CompiledPetriNet, state: tuple) -> "TokenGame":
+        # States saved without the enabled transitions resume with them in index order.
+        rng_state, marking, fired, steps, *enabled = state
+        rng = random.Random()
+        rng.setstate(rng_state)
+        game = cls(net, rng, marking)
+        game.fired, game.steps = fired, steps
+        if enabled:
+            game._enabled = list(enabled[0])
+            game._enabled_position = {transition: i for i, transition in enumerate(game._enabled)}
+        return game
+
+    def run(self, max_steps: int, events: event_log.EventSink | None = None, case_id: int = 0) -> None:
+        """Fire up to `max_steps` transitions, appending them to `events` with the step number as timestamp."""
+        for _ in range(max_steps):
+            transition = self.step()
+            if transition is None:
+                break
+            if events is not None:
+                events.append(case_id, self.net.transition_names[transition], self.steps)
+
+
+class PetriNetSimulationResult(simulator.SimulationResult):
+    result_type: Literal["petri_net_run"] = "petri_net_run"
+    steps: int
+    deadlocked: bool
+    final_marking: dict[str, int]
+    fired: dict[str, int]
+
+
+@simulator.register_engine
+class PetriNetEngine(simulator.SimulationEngine):
+    """Fire randomly chosen enabled transitions until the net deadlocks or `parameters.max_steps` is reached."""
+
+    model_type = pm.ProcessModelType.PETRI_NET
+    # Steps between checks whether a checkpoint is due.
+    CHECKPOINT_STEPS = 10_000
+
+    def __init__(self) -> None:
+        self._compiled: tuple[petri_net.PetriNet, CompiledPetriNet] | None = None
+
+    def compile(self, model: petri_net.PetriNet) -> CompiledPetriNet:
+        """Compile the model, reusing the compiled net across replications of the same model."""
+        if self._compiled is None or self._compiled[0] is not model:
+            self._compiled = (model, CompiledPetriNet(model))
+        return self._compiled[1]
+
+    def run(
+        self,
+        model: petri_net.PetriNet,
+        parameters: simulator.SimulationParameters,
+        events: event_log.EventSink | None = None,
+    ) -> PetriNetSimulationResult:
+        net = self.compile(model)
+        if self.checkpoint is None:
+            game = TokenGame(net, random.Random(parameters.seed))
+            game.run(parameters.max_steps, events)
+        else:
+            if self.checkpoint.state is None:
+                game = TokenGame(net, random.Random(parameters.seed))
+            else:
+                game = TokenGame.restore(net, self.checkpoint.state)
+            while game.steps < parameters.max_steps and not game.deadlocked:
+                game.run(min(self.CHECKPOINT_STEPS, parameters.max_steps - game.steps), events)
+                if self.checkpoint.due():
+                    self.checkpoint.save(game.state())
+        return PetriNetSimulationResult(
+            steps=game.steps,
+            deadlocked=game.deadlocked,
+            final_marking=dict(zip(net.place_names, game.marking)),
+            fired=dict(zip(net.transition_names, game.fired)),
+        )
+
+    def run_replication(
+        self, model: petri_net.PetriNet, parameters: simulator.SimulationParameters, rng: random.Random
+    ) -> dict[str, float]:
+        net = self.compile(model)
+        game = TokenGame(net, rng)
+        game.run(parameters.max_steps)
+        return {
+            "throughput": game.steps,
+            "deadlocked": game.deadlocked,
+            **{f"tokens.{name}": tokens for name, tokens in zip(net.place_names, game.marking)},
+        }
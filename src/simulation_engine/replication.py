@@ -0,0 +1,120 @@
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import random
+import typing
+from typing import Literal
+
+from src import process_model
+from src.simulation_engine import simulator
+from src.simulation_engine.statistics import MetricSummary, StreamingStatistics
+
+if typing.TYPE_CHECKING:
+    from src.simulation_engine.checkpoint import Checkpoint
+
+
+def replication_seed(master_seed: int, replication: int) -> int:
+    """Seed of the random stream of a replication, derived from the master seed by hashing."""
+    digest = hashlib.sha256(f"{master_seed}:{replication}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def run_replications(
+    engine_class: type[simulator.SimulationEngine],
+    model: process_model.ProcessModel,
+    parameters: simulator.SimulationParameters,
+    master_seed: int,
+    replications: range,
+) -> dict[str, StreamingStatistics]:
+    """Run a range of replications, aggregating their metrics as they are produced."""
+    engine = engine_class()
+    aggregates: dict[str, StreamingStatistics] = {}
+    for replication in replications:
+        rng = random.Random(replication_seed(master_seed, replication))
+        for name, value in engine.run_replication(model, parameters, rng).items():
+            if name not in aggregates:
+                aggregates[name] = StreamingStatistics()
+            aggregates[name].add(value)
+    return aggregates
+
+
+def merge_aggregates(into: dict[str, StreamingStatistics], aggregates: dict[str, StreamingStatistics]) -> None:
+    for name, statistics in aggregates.items():
+        if name in into:
+            into[name].merge(statistics)
+        else:
+            into[name] = statistics
+
+
+class ReplicatedSimulationResult(simulator.SimulationResult):
+    result_type: Literal["replications"] = "replications"
+    replications: int
+    master_seed: int
+    metrics: dict[str, MetricSummary]
+
+
+class ReplicationRunner:
+    """
+    Run independent replications of a simulation on a pool of worker processes.
+
+    Replications are split into contiguous chunks. Each replication draws from its own random stream, seeded from
+    the master seed and the replication number, so results do not depend on how replications are distributed.
+    Workers return mergeable per-metric statistics rather than traces, so memory use does not grow with the
+    number of replications.
+    """
+
+    CHUNKS_PER_WORKER = 4
+
+    def __init__(self, workers: int | None = None) -> None:
+        self.workers = workers or os.cpu_count() or 1
+
+    def chunks(self, replications: range) -> list[range]:
+        chunk_count = min(len(replications), self.workers * self.CHUNKS_PER_WORKER)
+        bounds = [replications.start + len(replications) * i // chunk_count for i in range(chunk_count + 1)]
+        return [range(start, end) for start, end in zip(bounds, bounds[1:])]
+
+    def run(
+        self,
+        engine: simulator.SimulationEngine,
+        model: process_model.ProcessModel,
+        parameters: simulator.SimulationParameters,
+        checkpoint: "Checkpoint | None" = None,
+    ) -> ReplicatedSimulationResult:
+        """
+        Run the replications. With a checkpoint, the replications done and their statistics are saved after every
+        chunk when due, and a run with a saved state resumes after the replications it has done.
+        """
+        if checkpoint is not None and checkpoint.state is not None:
+            master_seed, done, aggregates = checkpoint.state
+        else:
+            master_seed = parameters.seed if parameters.seed is not None else random.SystemRandom().getrandbits(63)
+            done, aggregates = 0, {}
+        chunks = self.chunks(range(done, parameters.replications)) if done < parameters.replications else []
+
+        def merge(chunk: range, chunk_aggregates: dict[str, StreamingStatistics]) -> None:
+            merge_aggregates(aggregates, chunk_aggregates)
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save((master_seed, chunk.stop, aggregates))
+
+        if self.workers == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                merge(chunk, run_replications(type(engine), model, parameters, master_seed, chunk))
+        else:
+            # The server process runs request, worker, logging and admin threads, and a child forked from it could
+            # inherit a lock that one of them held. Worker processes are forked from a single threaded server instead.
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(self.workers, len(chunks)), mp_context=multiprocessing.get_context("forkserver")
+            ) as executor:
+                futures = [
+                    executor.submit(run_replications, type(engine), model, parameters, master_seed, chunk)
+                    for chunk in chunks
+                ]
+                # Merge in replication order so the floating point results are reproducible.
+                for chunk, future in zip(chunks, futures):
+                    merge(chunk, future.result())
+        return ReplicatedSimulationResult(
+            replications=parameters.replications,
+            master_seed=master_seed,
+            metrics={name: statistics.summary() for name, statistics in sorted(aggregates.items())},
+        )
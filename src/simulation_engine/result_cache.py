@@ -0,0 +1,108 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+
+from src import process_model
+from src.simulation_engine import simulator
+
+
+class ResultCache:
+    """
+    Content-addressed cache of simulation results on disk.
+
+    Results are keyed on the content hash of the model and the simulation parameters, so the same simulation of
+    an unchanged model is only run once. Entries are evicted least recently used first when the cache holds more
+    than `max_entries` results or `max_bytes` bytes.
+
+    The cache is shared by the request threads, which look up results, and the simulation workers, which store them.
+    A lock guards the entries, while the files are read and written outside of it.
+    """
+
+    def __init__(self, directory: pathlib.Path, max_bytes: int = 256 * 2**20, max_entries: int = 10_000) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Entry sizes in least to most recently used order, restored from the file modification times.
+        self._entries: collections.OrderedDict[str, int] = collections.OrderedDict()
+        files = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime_ns)
+        for path in files:
+            self._entries[path.stem] = path.stat().st_size
+        self._size = sum(self._entries.values())
+        with self._lock:
+            evicted = self._evict()
+        self._unlink(evicted)
+
+    @staticmethod
+    def key(model: process_model.ProcessModel, parameters: simulator.SimulationParameters) -> str:
+        # The number of workers does not change the result.
+        canonical_parameters = json.dumps(json.loads(parameters.json(exclude={"workers"})), sort_keys=True)
+        log_version = ""
+        if parameters.log_path is not None:
+            # Hashing a large log on every lookup would defeat the cache, its size and modification time will do.
+            log_stat = os.stat(parameters.log_path)
+            log_version = f"{log_stat.st_size}:{log_stat.st_mtime_ns}"
+        return hashlib.sha256(f"{model.content_hash()}:{canonical_parameters}:{log_version}".encode()).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> simulator.SimulationResult | None:
+        with self._lock:
+            if key not in self._entries:
+                return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = simulator.parse_result(json.load(f))
+            os.utime(path)
+        except (OSError, ValueError) as error:
+            # Also when another thread evicted the entry in the meantime.
+            logging.warning(f"Dropping unreadable simulation cache entry {key}: {error}")
+            with self._lock:
+                self._pop(key)
+            self._unlink([key])
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: simulator.SimulationResult) -> None:
+        data = result.json().encode()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # Per thread, in case two workers store the same result.
+        temporary_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            evicted = self._evict()
+        self._unlink(evicted)
+
+    def _pop(self, key: str) -> None:
+        # With the lock held.
+        self._size -= self._entries.pop(key, 0)
+
+    def _evict(self) -> list[str]:
+        """Drop the least recently used entries while over the limits, with the lock held, and return their keys."""
+        evicted = []
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            key = next(iter(self._entries))
+            self._pop(key)
+            evicted.append(key)
+        return evicted
+
+    def _unlink(self, keys: list[str]) -> None:
+        for key in keys:
+            self._path(key).unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
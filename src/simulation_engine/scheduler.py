@@ -0,0 +1,183 @@
+import collections
+import logging
+import threading
+
+from src import process_model
+from src.simulation_engine import simulator
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Scheduler:
+    """
+    Runs queued simulations on a pool of worker threads.
+
+    Interactive simulations are always dispatched before batch simulations, and with more than one worker the
+    batch simulations are kept off the last worker, so an interactive simulation never waits for a long batch run.
+
+    Within a priority, owners share the workers by weighted fair queuing: every owner has a virtual time that
+    advances with the worker time its simulations use divided by its weight, and the next simulation is taken
+    from the owner with the lowest virtual time. A simulation is charged its owner's mean run time when it is
+    dispatched and corrected when it finishes, so a burst of submissions does not take every worker at once.
+    An owner that becomes active starts at the virtual time of the other active owners instead of spending credit
+    saved while idle.
+
+    Submissions are rejected with `QueueFullError` when the queue or the owner's share of it is full.
+    """
+
+    # Assumed run time of an owner's first simulation.
+    DEFAULT_COST = 1.0
+
+    def __init__(
+        self,
+        simulator_: simulator.Simulator,
+        workers: int = 1,
+        max_queued: int = 1000,
+        max_queued_per_owner: int = 100,
+        weights: dict[str, float] | None = None,
+    ) -> None:
+        self.simulator = simulator_
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_per_owner = max_queued_per_owner
+        self.weights = weights or {}
+        # Queued simulations per priority and owner, in submission order.
+        self._queues: dict[simulator.Priority, dict[str, collections.deque[simulator.QueuedSimulation]]] = {
+            priority: {} for priority in simulator.Priority
+        }
+        self._queued_per_owner: collections.Counter[str] = collections.Counter()
+        self._virtual_time: dict[str, float] = {}
+        # Worker seconds used and simulations run per owner.
+        self.usage: collections.Counter[str] = collections.Counter()
+        self.runs: collections.Counter[str] = collections.Counter()
+        self._running_batch = 0
+        self._condition = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+
+    @property
+    def queued(self) -> int:
+        return self._queued_per_owner.total()
+
+    def _cost(self, owner: str) -> float:
+        return self.usage[owner] / self.runs[owner] if self.runs[owner] else self.DEFAULT_COST
+
+    def submit(
+        self,
+        model_id: process_model.ModelId,
+        parameters: simulator.SimulationParameters,
+        owner: str = "anonymous",
+        priority: simulator.Priority = simulator.Priority.BATCH,
+        admit: bool = True,
+        simulation_id: simulator.SimulationId | None = None,
+    ) -> simulator.QueuedSimulation | simulator.FinishedSimulation:
+        """
+        Queue a simulation. Without `admit`, it is queued even if the queue is full. Restored simulations keep their
+        `simulation_id`.
+        """
+        with self._condition:
+            if admit and self.queued >= self.max_queued:
+                raise QueueFullError("The simulation queue is full")
+            if admit and self._queued_per_owner[owner] >= self.max_queued_per_owner:
+                raise QueueFullError(f"{owner} has {self.max_queued_per_owner} simulations queued already")
+            simulation = self.simulator.queue_simulation(model_id, parameters, owner, priority, simulation_id)
+            if isinstance(simulation, simulator.FinishedSimulation):
+                return simulation
+
+            if self._queued_per_owner[owner] == 0:
+                active = [self._virtual_time[other] for other in self._queued_per_owner if other != owner]
+                self._virtual_time[owner] = max(self._virtual_time.get(owner, 0.0), min(active, default=0.0))
+            self._queues[priority].setdefault(owner, collections.deque()).append(simulation)
+            self._queued_per_owner[owner] += 1
+            self._condition.notify()
+            return simulation
+
+    def restore(self) -> list[simulator.QueuedSimulation | simulator.FinishedSimulation]:
+        """Queue the simulations that have a checkpoint, to resume them from it. They keep their ids."""
+        store = self.simulator.checkpoints
+        if store is None:
+            return []
+        simulations = []
+        for checkpointed in store.restore():
+            simulation = self.submit(
+                checkpointed.model_id,
+                checkpointed.parameters,
+                checkpointed.owner,
+                checkpointed.priority,
+                admit=False,
+                simulation_id=checkpointed.id,
+            )
+            if isinstance(simulation, simulator.FinishedSimulation):
+                store.delete(simulation.id)
+            simulations.append(simulation)
+        return simulations
+
+    def _pick(self) -> simulator.QueuedSimulation | None:
+        for priority, queues in self._queues.items():
+            if not queues:
+                continue
+            if priority == simulator.Priority.BATCH and 1 < self.workers <= self._running_batch + 1:
+                continue
+            owner = min(queues, key=lambda owner: self._virtual_time[owner])
+            simulation = queues[owner].popleft()
+            if not queues[owner]:
+                del queues[owner]
+            self._queued_per_owner[owner] -= 1
+            if not self._queued_per_owner[owner]:
+                del self._queued_per_owner[owner]
+            self._virtual_time[owner] += self._cost(owner) / self.weights.get(owner, 1.0)
+            if priority == simulator.Priority.BATCH:
+                self._running_batch += 1
+            return simulation
+        return None
+
+    def run_next(self, timeout: float | None = None) -> simulator.FinishedSimulation | None:
+        """Run the next simulation, waiting up to `timeout` seconds for one. Returns None if there was none."""
+        with self._condition:
+            simulation = self._pick()
+            while simulation is None and not self._stopping:
+                if not self._condition.wait(timeout):
+                    return None
+                simulation = self._pick()
+            if simulation is None:
+                return None
+            estimated_cost = self._cost(simulation.owner)
+
+        try:
+            finished = self.simulator.run_simulation(simulation)
+        finally:
+            with self._condition:
+                if simulation.priority == simulator.Priority.BATCH:
+                    self._running_batch -= 1
+                    # Another batch simulation may now be dispatched.
+                    self._condition.notify()
+        used = (finished.end_time - finished.start_time).total_seconds()
+        with self._condition:
+            owner = finished.owner
+            self._virtual_time[owner] += (used - estimated_cost) / self.weights.get(owner, 1.0)
+            self.usage[owner] += used
+            self.runs[owner] += 1
+        return finished
+
+    def _work(self) -> None:
+        while not self._stopping:
+            try:
+                self.run_next()
+            except Exception:
+                logging.exception("Simulation worker failed")
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"simulation-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
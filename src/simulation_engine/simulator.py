@@ -1,14 +1,32 @@
 import random
 import abc
+import bisect
+import collections
 import enum
 import datetime
+import logging
+import os
+import pathlib
+import threading
+import typing
+import uuid
+from typing import ClassVar
+
 import pydantic
 
+from src import metrics
 from src import process_model
+from src.simulation_engine import event_log
+
+if typing.TYPE_CHECKING:
+    from src.simulation_engine.checkpoint import Checkpoint, CheckpointStore
+    from src.simulation_engine.result_cache import ResultCache
 
 
 SimulationId = int
 
+SIMULATIONS = metrics.Counter("simulations_total", "Simulations that reached each status.", labelnames=("status",))
+
 
 class SimulationStatus(enum.Enum):
     QUEUED = enum.auto()
@@ -17,18 +35,118 @@ class SimulationStatus(enum.Enum):
     FAILED = enum.auto()
 
 
+class Priority(str, enum.Enum):
+    # Short simulations someone is waiting for, scheduled before any batch simulation.
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+class SimulationType(str, enum.Enum):
+    RUN = "run"
+    STATE_SPACE = "state_space"
+    CONFORMANCE = "conformance"
+
+
 class SimulationParameters(pydantic.BaseModel):
-    pass
+    simulation_type: SimulationType = SimulationType.RUN
+    # Seed of the run, or master seed of the replications.
+    seed: int | None = None
+    # Independent replications, reported as aggregated statistics when more than one.
+    replications: int = pydantic.Field(default=1, ge=1)
+    # Worker processes for replications, defaults to one per core.
+    workers: int | None = pydantic.Field(default=None, ge=1)
+    max_steps: int = 1000
+    # Number of independent walks for sampling engines.
+    samples: int = 1000
+    # Bound on the number of stored states for state space exploration.
+    max_states: int = 100_000
+    coverability: bool = False
+    # Activities to replay instead of choosing randomly among the enabled ones.
+    trace: list[str] | None = None
+    # Event log (XES or written by the simulator) to check conformance against.
+    log_path: str | None = None
+    # Write the events of the run to an event log, if the simulator has an event log directory.
+    record_events: bool = False
+
+    @pydantic.root_validator(skip_on_failure=True)
+    def check_record_events(cls, values: dict) -> dict:
+        if values["record_events"] and values["replications"] > 1:
+            raise ValueError("Events are only recorded for single runs, not for replications")
+        return values
 
 
 class SimulationResult(pydantic.BaseModel):
-    pass
+    # Path of the event log of the run, if recorded.
+    event_log: str | None = None
+
+
+def parse_result(data: dict) -> SimulationResult:
+    """Parse a serialized result into the result class of its `result_type`."""
+    result_classes = {}
+    subclasses = SimulationResult.__subclasses__()
+    while subclasses:
+        result_class = subclasses.pop()
+        subclasses.extend(result_class.__subclasses__())
+        if "result_type" in result_class.__fields__:
+            result_classes[result_class.__fields__["result_type"].default] = result_class
+    return result_classes.get(data.get("result_type"), SimulationResult).parse_obj(data)
+
+
+class SimulationEngine(abc.ABC):
+    model_type: ClassVar[process_model.ProcessModelType]
+    simulation_type: ClassVar[SimulationType] = SimulationType.RUN
+    # Set by the simulator for engines that can save their state and resume from it.
+    checkpoint: "Checkpoint | None" = None
+
+    @abc.abstractmethod
+    def run(
+        self,
+        model: process_model.ProcessModel,
+        parameters: SimulationParameters,
+        events: event_log.EventSink | None = None,
+    ) -> SimulationResult:
+        """Run the simulation, appending its events to `events` if given."""
+
+    def run_replication(
+        self, model: process_model.ProcessModel, parameters: SimulationParameters, rng: random.Random
+    ) -> dict[str, float]:
+        """Run one replication drawing from `rng` and return its metrics, for engines that support replications."""
+        raise NotImplementedError(f"{type(self).__name__} does not support replications")
+
+
+_engines: dict[tuple[process_model.ProcessModelType, SimulationType], type[SimulationEngine]] = {}
+
+
+def register_engine(engine_class: type[SimulationEngine]) -> type[SimulationEngine]:
+    _engines[(engine_class.model_type, engine_class.simulation_type)] = engine_class
+    return engine_class
+
+
+def get_engine(model_type: process_model.ProcessModelType, simulation_type: SimulationType) -> SimulationEngine:
+    engine_class = _engines.get((model_type, simulation_type))
+    if engine_class is None:
+        raise NotImplementedError(f"No {simulation_type.value} simulation engine for {model_type.value} models")
+    return engine_class()
+
+
+def check_parameters(model_type: process_model.ProcessModelType, parameters: SimulationParameters) -> None:
+    """Raise a `ValueError` if there is no engine to run a simulation of a model of `model_type` with `parameters`."""
+    engine_class = _engines.get((model_type, parameters.simulation_type))
+    if engine_class is None:
+        raise ValueError(f"No {parameters.simulation_type.value} simulation engine for {model_type.value} models")
+    if parameters.replications > 1 and engine_class.run_replication is SimulationEngine.run_replication:
+        raise ValueError(
+            f"{parameters.simulation_type.value} simulations of {model_type.value} models have no replications"
+        )
 
 
 class SimulationBase(pydantic.BaseModel, abc.ABC):
     id: SimulationId
     model_id: process_model.ModelId
     parameters: SimulationParameters
+    # User or team the simulation is scheduled and accounted for.
+    owner: str = "anonymous"
+    priority: Priority = Priority.BATCH
 
     class Config:
         orm_mode = True
@@ -47,6 +165,8 @@ class QueuedSimulation(SimulationBase):
             id=self.id,
             model_id=self.model_id,
             parameters=self.parameters,
+            owner=self.owner,
+            priority=self.priority,
             start_time=datetime.datetime.now(),
         )
 
@@ -57,11 +177,13 @@ class QueuedSimulation(SimulationBase):
 class RunningSimulation(SimulationBase):
     start_time: datetime.datetime
 
-    def finish(self, result: SimulationResult) -> "FinishedSimulation":
+    def finish(self, result: SimulationResult | None) -> "FinishedSimulation":
         return FinishedSimulation(
             id=self.id,
             model_id=self.model_id,
             parameters=self.parameters,
+            owner=self.owner,
+            priority=self.priority,
             start_time=self.start_time,
             end_time=datetime.datetime.now(),
             result=result,
@@ -86,32 +208,236 @@ Simulation = QueuedSimulation | RunningSimulation | FinishedSimulation
 
 
 class Simulator:
-    QUEUE_MAX_LENGTH = 1000
-    queued_simulations: list[QueuedSimulation] = []
-    running_simulations: list[RunningSimulation] = []
-    finished_simulations: list[FinishedSimulation] = []
+    # Simulation ids are reserved in blocks, so that the file of the next id is not written for every simulation.
+    ID_BLOCK_SIZE = 1000
 
-    def new_id(self) -> int:
-        id = random.randint(0, self.QUEUE_MAX_LENGTH)
-        while id in self.queued_simulations or id in self.running_simulations or id in self.finished_simulations:
-            id = random.randint(0, self.QUEUE_MAX_LENGTH)
-        return id
+    def __init__(
+        self,
+        result_cache: "ResultCache | None" = None,
+        event_log_directory: pathlib.Path | None = None,
+        checkpoints: "CheckpointStore | None" = None,
+        id_path: pathlib.Path | None = None,
+    ) -> None:
+        """
+        With an `id_path`, the ids reserved for simulations are persisted there, so that the ids of simulations are
+        not reused after a restart.
+        """
+        self.result_cache = result_cache
+        self.event_log_directory = event_log_directory
+        self.checkpoints = checkpoints
+        self.queued_simulations: list[QueuedSimulation] = []
+        self.running_simulations: list[RunningSimulation] = []
+        self.finished_simulations: list[FinishedSimulation] = []
+        # All simulations by id, and their ids in increasing order for pagination.
+        self._simulations: dict[SimulationId, Simulation] = {}
+        self._ids: list[SimulationId] = []
+        self._id_path = id_path
+        self._id_lock = threading.Lock()
+        self._reserved_ids = self._read_reserved_ids()
+        self._next_id = self._reserved_ids
+        # Incremented on every change; the version of the last change of each simulation, oldest first.
+        self.version = 0
+        self._versions: collections.OrderedDict[SimulationId, int] = collections.OrderedDict()
+        self._changed = threading.Condition()
 
-    def queue_simulation(
+    def _read_reserved_ids(self) -> SimulationId:
+        if self._id_path is None:
+            return 0
+        try:
+            return int(self._id_path.read_text())
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as error:
+            logging.warning(f"Unreadable simulation ids {self._id_path}: {error}")
+            return 0
+
+    def new_id(self, simulation_id: SimulationId | None = None) -> SimulationId:
+        """A new simulation id, or `simulation_id` of a restored simulation, after which new ids continue."""
+        with self._id_lock:
+            if simulation_id is None:
+                simulation_id = self._next_id
+            self._next_id = max(self._next_id, simulation_id + 1)
+            if self._id_path is not None and self._next_id > self._reserved_ids:
+                self._reserved_ids = simulation_id + self.ID_BLOCK_SIZE
+                self._id_path.parent.mkdir(parents=True, exist_ok=True)
+                temporary_path = self._id_path.with_suffix(".tmp")
+                temporary_path.write_text(str(self._reserved_ids))
+                os.replace(temporary_path, self._id_path)
+        return simulation_id
+
+    def check_log_path(self, parameters: SimulationParameters) -> None:
+        """Raise a `ValueError` if the event log of `parameters` is not in the event log directory."""
+        if parameters.log_path is None:
+            return
+        if self.event_log_directory is None or not (
+            pathlib.Path(parameters.log_path).resolve().is_relative_to(self.event_log_directory.resolve())
+        ):
+            raise ValueError(f"Event logs are read from {self.event_log_directory} only")
+
+    def _record(self, simulation: Simulation) -> None:
+        with self._changed:
+            if simulation.id not in self._simulations:
+                self._ids.append(simulation.id)
+            self._simulations[simulation.id] = simulation
+            self.version += 1
+            self._versions[simulation.id] = self.version
+            self._versions.move_to_end(simulation.id)
+            self._changed.notify_all()
+        SIMULATIONS.labels(simulation.status().name).inc()
+
+    def get_simulation(self, simulation_id: SimulationId) -> Simulation | None:
+        return self._simulations.get(simulation_id)
+
+    def list_simulations(
+        self,
+        model_id: process_model.ModelId | None = None,
+        status: SimulationStatus | None = None,
+        before: SimulationId | None = None,
+        limit: int = 50,
+    ) -> list[Simulation]:
+        """
+        The most recent simulations first, optionally filtered by model and status.
+
+        Pass the id of the last simulation of a page as `before` to get the next page.
+        """
+        end = len(self._ids) if before is None else bisect.bisect_left(self._ids, before)
+        simulations = []
+        for i in range(end - 1, -1, -1):
+            if len(simulations) == limit:
+                break
+            simulation = self._simulations[self._ids[i]]
+            if model_id is not None and simulation.model_id != model_id:
+                continue
+            if status is not None and simulation.status() != status:
+                continue
+            simulations.append(simulation)
+        return simulations
+
+    def changes_since(self, version: int) -> tuple[int, list[Simulation]]:
+        """The current version and the simulations that changed after `version`, least recently changed first."""
+        with self._changed:
+            changed = []
+            for simulation_id, changed_version in reversed(self._versions.items()):
+                if changed_version <= version:
+                    break
+                changed.append(self._simulations[simulation_id])
+            return self.version, changed[::-1]
+
+    def wait_for_changes(self, version: int, timeout: float) -> tuple[int, list[Simulation]]:
+        """Like `changes_since`, but waits up to `timeout` seconds for a change if there is none yet."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > version, timeout)
+            return self.changes_since(version)
+
+    def _is_cacheable(self, simulation_parameters: SimulationParameters) -> bool:
+        # Unseeded runs are expected to differ from each other. Event logs are not cached, the cache would outlive them.
+        return (
+            self.result_cache is not None
+            and simulation_parameters.seed is not None
+            and not simulation_parameters.record_events
+        )
+
+    def cached_result(
         self, model_id: process_model.ModelId, simulation_parameters: SimulationParameters
-    ) -> QueuedSimulation:
-        simulation = QueuedSimulation(id=self.new_id(), model_id=model_id, parameters=simulation_parameters)
+    ) -> SimulationResult | None:
+        if not self._is_cacheable(simulation_parameters):
+            return None
+        try:
+            model = process_model.load_model(pathlib.Path(model_id))
+            key = self.result_cache.key(model, simulation_parameters)
+        except (OSError, pydantic.ValidationError):
+            return None
+        return self.result_cache.get(key)
+
+    def queue_simulation(
+        self,
+        model_id: process_model.ModelId,
+        simulation_parameters: SimulationParameters,
+        owner: str = "anonymous",
+        priority: Priority = Priority.BATCH,
+        simulation_id: SimulationId | None = None,
+    ) -> QueuedSimulation | FinishedSimulation:
+        """
+        Queue a simulation, or return it as finished if the result for the model and parameters is cached.
+
+        A simulation restored after a restart keeps its `simulation_id`.
+        """
+        simulation_id = self.new_id(simulation_id)
+        if (result := self.cached_result(model_id, simulation_parameters)) is not None:
+            now = datetime.datetime.now()
+            simulation = FinishedSimulation(
+                id=simulation_id,
+                model_id=model_id,
+                parameters=simulation_parameters,
+                owner=owner,
+                priority=priority,
+                start_time=now,
+                end_time=now,
+                result=result,
+            )
+            self.finished_simulations.append(simulation)
+            self._record(simulation)
+            return simulation
+        simulation = QueuedSimulation(
+            id=simulation_id, model_id=model_id, parameters=simulation_parameters, owner=owner, priority=priority
+        )
         self.queued_simulations.append(simulation)
+        self._record(simulation)
         return simulation
 
     def start_simulation(self, simulation: QueuedSimulation) -> RunningSimulation:
         self.queued_simulations.remove(simulation)
         running_simulation = simulation.start()
         self.running_simulations.append(running_simulation)
+        self._record(running_simulation)
         return running_simulation
 
-    def finish_simulation(self, simulation: RunningSimulation, result: SimulationResult) -> FinishedSimulation:
+    def finish_simulation(self, simulation: RunningSimulation, result: SimulationResult | None) -> FinishedSimulation:
         self.running_simulations.remove(simulation)
         finished_simulation = simulation.finish(result)
         self.finished_simulations.append(finished_simulation)
+        self._record(finished_simulation)
         return finished_simulation
+
+    def run_simulation(
+        self, simulation: QueuedSimulation, model: process_model.ProcessModel | None = None
+    ) -> FinishedSimulation:
+        """
+        Run a queued simulation to completion with the engine for its model type and simulation type.
+
+        The model is loaded from the model id if not given. A simulation whose engine raises finishes as failed.
+        With a checkpoint store, the engine resumes from the last checkpoint of the simulation, if any.
+        """
+        running_simulation = self.start_simulation(simulation)
+        checkpoint = None
+        try:
+            if model is None:
+                model = process_model.load_model(pathlib.Path(simulation.model_id))
+            # An event log is written from the start, so runs that record events are not resumed.
+            if self.checkpoints is not None and not simulation.parameters.record_events:
+                checkpoint = self.checkpoints.open(running_simulation, model.content_hash())
+            engine = get_engine(model.model_type, simulation.parameters.simulation_type)
+            engine.checkpoint = checkpoint
+            if simulation.parameters.replications > 1:
+                # Imported here since the replication module builds on this one.
+                from src.simulation_engine import replication
+
+                runner = replication.ReplicationRunner(simulation.parameters.workers)
+                result = runner.run(engine, model, simulation.parameters, checkpoint)
+            elif simulation.parameters.record_events and self.event_log_directory is not None:
+                # Simulation ids are only unique across restarts with an `id_path`, so the name of the log is made
+                # unique as well, and a log of an earlier run is never overwritten.
+                path = self.event_log_directory / f"{simulation.id}-{uuid.uuid4().hex}"
+                with event_log.open_writer(path) as events:
+                    result = engine.run(model, simulation.parameters, events)
+                result.event_log = str(events.path)
+            else:
+                result = engine.run(model, simulation.parameters)
+            if self._is_cacheable(simulation.parameters):
+                self.result_cache.put(self.result_cache.key(model, simulation.parameters), result)
+        except Exception:
+            logging.exception(f"Simulation {simulation.id} failed")
+            result = None
+        if self.checkpoints is not None:
+            self.checkpoints.delete(simulation.id)
+        return self.finish_simulation(running_simulation, result)
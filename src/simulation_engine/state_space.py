@@ -0,0 +1,164 @@
+import array
+import collections
+import threading
+from typing import Literal
+
+from src import process_model as pm
+from src.process_model import petri_net
+from src.simulation_engine import event_log
+from src.simulation_engine import simulator
+from src.simulation_engine.petri_net_engine import CompiledPetriNet
+
+
+# Token count standing for "unbounded" in coverability markings.
+OMEGA = 2**32 - 1
+
+
+def _pack(marking: list[int]) -> bytes:
+    return array.array("I", marking).tobytes()
+
+
+def _unpack(packed: bytes) -> array.array:
+    marking = array.array("I")
+    marking.frombytes(packed)
+    return marking
+
+
+class StateSpaceResult(simulator.SimulationResult):
+    result_type: Literal["state_space"] = "state_space"
+    states: int
+    # Number of arcs (transition firings) of the explored reachability graph.
+    arcs: int
+    # False if exploration stopped at `max_states`; bounds and deadlocks then only cover the explored states.
+    complete: bool
+    # None if it could not be decided within `max_states`.
+    bounded: bool | None
+    # Maximum number of tokens per place, or None for places that are unbounded.
+    place_bounds: dict[str, int | None]
+    deadlocks: int
+    deadlock_examples: list[dict[str, int | None]]
+    reachable_accepting_places: list[str]
+
+
+def explore(net: CompiledPetriNet, max_states: int, coverability: bool = False) -> StateSpaceResult:
+    """
+    Breadth-first exploration of the markings reachable from the initial marking.
+
+    Markings are kept as packed bytes in a hash set, and no more than `max_states` markings are stored. With
+    `coverability`, a marking that strictly covers one of its ancestors gets omega (unbounded) for the growing
+    places (Karp-Miller acceleration), so exploration terminates for unbounded nets too.
+    """
+    initial = _pack(list(net.initial_marking))
+    seen = {initial}
+    parents: dict[bytes, bytes] = {}
+    frontier = collections.deque([initial])
+    bounds = list(net.initial_marking)
+    accepting_reached: set[int] = set()
+    deadlocks, deadlock_examples, arcs, complete = 0, [], 0, True
+
+    def marking_dict(marking: array.array) -> dict[str, int | None]:
+        return {name: (None if tokens == OMEGA else tokens) for name, tokens in zip(net.place_names, marking)}
+
+    def accelerate(successor: list[int], ancestor: bytes | None) -> None:
+        while ancestor is not None:
+            ancestor_marking = _unpack(ancestor)
+            if all(a <= s for a, s in zip(ancestor_marking, successor)) and list(ancestor_marking) != successor:
+                for place, tokens in enumerate(ancestor_marking):
+                    if successor[place] > tokens:
+                        successor[place] = OMEGA
+            ancestor = parents.get(ancestor)
+
+    while frontier:
+        packed = frontier.popleft()
+        marking = _unpack(packed)
+        for place, tokens in enumerate(marking):
+            if tokens > bounds[place]:
+                bounds[place] = tokens
+        accepting_reached.update(place for place in net.accepting_places if marking[place] > 0)
+
+        enabled = net.enabled_transitions(marking)
+        if not enabled:
+            deadlocks += 1
+            if len(deadlock_examples) < PetriNetStateSpaceEngine.MAX_DEADLOCK_EXAMPLES:
+                deadlock_examples.append(marking_dict(marking))
+        for transition in enabled:
+            successor = list(marking)
+            for place, weight in net.inputs[transition]:
+                if successor[place] != OMEGA:
+                    successor[place] -= weight
+            for place, weight in net.outputs[transition]:
+                if successor[place] != OMEGA:
+                    successor[place] = min(successor[place] + weight, OMEGA)
+            if coverability:
+                accelerate(successor, packed)
+            arcs += 1
+
+            packed_successor = _pack(successor)
+            if packed_successor in seen:
+                continue
+            if len(seen) >= max_states:
+                complete = False
+                continue
+            seen.add(packed_successor)
+            if coverability:
+                parents[packed_successor] = packed
+            frontier.append(packed_successor)
+
+    unbounded = OMEGA in bounds
+    if unbounded:
+        bounded = False
+    elif complete:
+        bounded = True
+    else:
+        bounded = None
+    return StateSpaceResult(
+        states=len(seen),
+        arcs=arcs,
+        complete=complete,
+        bounded=bounded,
+        place_bounds=marking_dict(bounds),
+        deadlocks=deadlocks,
+        deadlock_examples=deadlock_examples,
+        reachable_accepting_places=[net.place_names[place] for place in sorted(accepting_reached)],
+    )
+
+
+@simulator.register_engine
+class PetriNetStateSpaceEngine(simulator.SimulationEngine):
+    """
+    Check boundedness, deadlocks and reachability of accepting places of a Petri net.
+
+    Results are cached per model content and exploration parameters, since the state space only changes when the
+    model does. The cache is shared by the simulation workers.
+    """
+
+    model_type = pm.ProcessModelType.PETRI_NET
+    simulation_type = simulator.SimulationType.STATE_SPACE
+    MAX_DEADLOCK_EXAMPLES = 10
+    CACHE_SIZE = 32
+
+    _cache: collections.OrderedDict[tuple[str, int, bool], StateSpaceResult] = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def run(
+        self,
+        model: petri_net.PetriNet,
+        parameters: simulator.SimulationParameters,
+        events: event_log.EventSink | None = None,
+    ) -> StateSpaceResult:
+        # Exploring the state space is not a run, so there are no events to log.
+        key = (model.content_hash(), parameters.max_states, parameters.coverability)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None:
+            return cached.copy()
+
+        # Explored outside of the lock, so that workers exploring other state spaces do not wait for each other.
+        result = explore(CompiledPetriNet(model), parameters.max_states, parameters.coverability)
+        with self._cache_lock:
+            self._cache[key] = result
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result.copy()
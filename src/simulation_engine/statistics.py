@@ -0,0 +1,131 @@
+import math
+
+import pydantic
+
+
+class HistogramBin(pydantic.BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
+class MetricSummary(pydantic.BaseModel):
+    count: int
+    mean: float
+    variance: float
+    min: float
+    max: float
+    quantiles: dict[str, float]
+    histogram: list[HistogramBin]
+
+
+class StreamingStatistics:
+    """
+    Mergeable summary of a stream of values in constant memory.
+
+    Keeps count, mean and variance (Welford's algorithm, merged with Chan's formula), min and max, and a
+    logarithmically bucketed sketch (as in DDSketch) that gives quantiles within `relative_accuracy` of the true
+    value and doubles as a histogram. The number of buckets grows with the logarithm of the value range only.
+    """
+
+    __slots__ = ("relative_accuracy", "count", "mean", "m2", "min", "max", "zero_count", "positive", "negative")
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zero_count = 0
+        self.positive: dict[int, int] = {}
+        self.negative: dict[int, int] = {}
+
+    @property
+    def _gamma(self) -> float:
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    def _bucket(self, value: float) -> int:
+        return math.ceil(math.log(value, self._gamma))
+
+    def _bucket_value(self, bucket: int) -> float:
+        # The value in the middle of the bucket in relative terms, within relative_accuracy of any value in it.
+        return 2 * self._gamma**bucket / (self._gamma + 1)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value > 0:
+            bucket = self._bucket(value)
+            self.positive[bucket] = self.positive.get(bucket, 0) + 1
+        elif value < 0:
+            bucket = self._bucket(-value)
+            self.negative[bucket] = self.negative.get(bucket, 0) + 1
+        else:
+            self.zero_count += 1
+
+    def merge(self, other: "StreamingStatistics") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracies")
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        for own, others in ((self.positive, other.positive), (self.negative, other.negative)):
+            for bucket, bucket_count in others.items():
+                own[bucket] = own.get(bucket, 0) + bucket_count
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def _buckets(self) -> list[tuple[float, float, float, int]]:
+        """Buckets as `(lower, upper, representative value, count)` in increasing order of value."""
+        gamma = self._gamma
+        buckets = [
+            (-(gamma**bucket), -(gamma ** (bucket - 1)), -self._bucket_value(bucket), self.negative[bucket])
+            for bucket in sorted(self.negative, reverse=True)
+        ]
+        if self.zero_count:
+            buckets.append((0.0, 0.0, 0.0, self.zero_count))
+        buckets.extend(
+            (gamma ** (bucket - 1), gamma**bucket, self._bucket_value(bucket), self.positive[bucket])
+            for bucket in sorted(self.positive)
+        )
+        return buckets
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            raise ValueError("No values")
+        rank = q * (self.count - 1)
+        seen = 0
+        for _, _, value, count in self._buckets():
+            seen += count
+            if seen > rank:
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> MetricSummary:
+        return MetricSummary(
+            count=self.count,
+            mean=self.mean,
+            variance=self.variance,
+            min=self.min,
+            max=self.max,
+            quantiles={f"p{round(q * 100)}": self.quantile(q) for q in self.QUANTILES} if self.count else {},
+            histogram=[
+                HistogramBin(lower=lower, upper=upper, count=count) for lower, upper, _, count in self._buckets()
+            ],
+        )
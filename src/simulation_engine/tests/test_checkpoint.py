@@ -0,0 +1,113 @@
+import pathlib
+import random
+
+import pytest
+from src.process_model import petri_net
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import checkpoint
+from src.simulation_engine import petri_net_engine
+
+
+@pytest.fixture
+def model(tmp_path: pathlib.Path):
+    # Tokens move randomly between two places and are sometimes doubled, so the marking depends on the random stream.
+    _model = petri_net.PetriNet(id=str(tmp_path / "net.pm"), model_type=process_model.ProcessModelType.PETRI_NET)
+    nodes = [
+        (1, petri_net.NodeType.PLACE, 3),
+        (2, petri_net.NodeType.TRANSITION, 0),
+        (3, petri_net.NodeType.PLACE, 0),
+        (4, petri_net.NodeType.TRANSITION, 0),
+        (5, petri_net.NodeType.TRANSITION, 0),
+    ]
+    for node_id, node_type, ball_count in nodes:
+        _model.add_node(
+            petri_net.PetriNetNode(
+                id=process_model.NodeId(node_id),
+                position=process_model.Point(x=0, y=0),
+                name=f"{node_type.value}{node_id}",
+                node_type=node_type,
+                ball_count=ball_count,
+            )
+        )
+    for start, end in [(1, 2), (2, 3), (3, 4), (4, 1), (3, 5), (5, 3), (5, 1)]:
+        _model.add_edge_from_values(process_model.NodeId(start), process_model.NodeId(end))
+    _model.save(pathlib.Path(_model.id))
+    return _model
+
+
+def resumed_run(
+    engine: simulation_engine.SimulationEngine,
+    model: petri_net.PetriNet,
+    parameters: simulation_engine.SimulationParameters,
+    interrupted_parameters: simulation_engine.SimulationParameters,
+    store: checkpoint.CheckpointStore,
+) -> simulation_engine.SimulationResult:
+    """Run with `interrupted_parameters`, which stop early, then resume from the last checkpoint."""
+    simulation = simulation_engine.QueuedSimulation(id=1, model_id=model.id, parameters=parameters)
+    engine.checkpoint = store.open(simulation)
+    engine.run(model, interrupted_parameters)
+    engine.checkpoint = store.open(simulation)
+    assert engine.checkpoint.state is not None
+    return engine.run(model, parameters)
+
+
+def test_petri_net_run_resumes(model: petri_net.PetriNet, tmp_path: pathlib.Path):
+    parameters = simulation_engine.SimulationParameters(seed=3, max_steps=500)
+    engine = simulation_engine.PetriNetEngine()
+    engine.CHECKPOINT_STEPS = 50
+    expected = engine.run(model, parameters)
+
+    store = checkpoint.CheckpointStore(tmp_path / "checkpoints", interval=0)
+    interrupted = parameters.copy(update={"max_steps": 220})
+    assert resumed_run(engine, model, parameters, interrupted, store) == expected
+
+
+def test_replications_resume(model: petri_net.PetriNet, tmp_path: pathlib.Path):
+    parameters = simulation_engine.SimulationParameters(seed=3, replications=40, max_steps=50)
+    engine = simulation_engine.PetriNetEngine()
+    runner = simulation_engine.ReplicationRunner(workers=1)
+    expected = runner.run(engine, model, parameters)
+
+    store = checkpoint.CheckpointStore(tmp_path / "checkpoints", interval=0)
+    simulation = simulation_engine.QueuedSimulation(id=1, model_id=model.id, parameters=parameters)
+    runner.run(engine, model, parameters.copy(update={"replications": 17}), store.open(simulation))
+    resumed = runner.run(engine, model, parameters, store.open(simulation))
+    assert resumed.replications == 40
+    assert resumed.metrics["throughput"].count == 40
+    assert resumed.metrics["throughput"].mean == pytest.approx(expected.metrics["throughput"].mean)
+
+
+def test_running_simulations_are_requeued(model: petri_net.PetriNet, tmp_path: pathlib.Path):
+    store = checkpoint.CheckpointStore(tmp_path / "checkpoints")
+    simulator = simulation_engine.Simulator(checkpoints=store)
+    parameters = simulation_engine.SimulationParameters(seed=3)
+    queued = simulator.queue_simulation(model.id, parameters, owner="team")
+    game = petri_net_engine.TokenGame(petri_net_engine.CompiledPetriNet(model), random.Random(3))
+    game.run(10)
+    store.open(simulator.start_simulation(queued), model.content_hash()).save(game.state())
+
+    # After a restart, the simulation is queued again with its id and checkpoint.
+    simulator = simulation_engine.Simulator(checkpoints=store)
+    scheduler = simulation_engine.Scheduler(simulator)
+    [restored] = scheduler.restore()
+    assert (restored.id, restored.model_id, restored.owner) == (queued.id, model.id, "team")
+    assert store.open(restored, model.content_hash()).state == game.state()
+    assert simulator.new_id() > restored.id
+
+    # The run continues from the checkpoint, and once finished the checkpoint is gone.
+    finished = scheduler.run_next(timeout=0)
+    assert finished.result.steps == parameters.max_steps
+    assert scheduler.restore() == []
+
+
+def test_checkpoints_of_changed_models_are_discarded(model: petri_net.PetriNet, tmp_path: pathlib.Path):
+    store = checkpoint.CheckpointStore(tmp_path / "checkpoints")
+    simulation = simulation_engine.QueuedSimulation(
+        id=1, model_id=model.id, parameters=simulation_engine.SimulationParameters(seed=3)
+    )
+    store.open(simulation, model.content_hash()).save("state")
+    assert store.open(simulation, model.content_hash()).state == "state"
+
+    model.get_node(process_model.NodeId(1)).ball_count = 4
+    assert store.open(simulation, model.content_hash()).state is None
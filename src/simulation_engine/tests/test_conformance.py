@@ -0,0 +1,140 @@
+import collections
+import pathlib
+import threading
+
+import pytest
+from src.process_model import dcr_graph
+from src.process_model import petri_net
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import conformance
+from src.simulation_engine import event_log
+
+
+def add_node(model: petri_net.PetriNet, node_id: int, node_type: petri_net.NodeType, name: str, **kwargs) -> None:
+    model.add_node(
+        petri_net.PetriNetNode(
+            id=process_model.NodeId(node_id),
+            position=process_model.Point(x=0, y=0),
+            name=name,
+            node_type=node_type,
+            **kwargs,
+        )
+    )
+
+
+@pytest.fixture
+def net(tmp_path: pathlib.Path):
+    # start -> a -> middle -> b -> end (accepting)
+    model = petri_net.PetriNet(id=str(tmp_path / "net.pm"), model_type=process_model.ProcessModelType.PETRI_NET)
+    add_node(model, 1, petri_net.NodeType.PLACE, "start", ball_count=1)
+    add_node(model, 2, petri_net.NodeType.TRANSITION, "a")
+    add_node(model, 3, petri_net.NodeType.PLACE, "middle")
+    add_node(model, 4, petri_net.NodeType.TRANSITION, "b")
+    add_node(model, 5, petri_net.NodeType.PLACE, "end", accepting_state="done")
+    for start, end in [(1, 2), (2, 3), (3, 4), (4, 5)]:
+        model.add_edge_from_values(process_model.NodeId(start), process_model.NodeId(end))
+    model.save(pathlib.Path(model.id))
+    return model
+
+
+def write_log(path: pathlib.Path, traces: list[list[str]]) -> pathlib.Path:
+    with event_log.EventLogWriter(path) as writer:
+        for case_id, trace in enumerate(traces):
+            for step, activity in enumerate(trace):
+                writer.append(case_id, activity, step)
+    return path
+
+
+def test_token_replay(net: petri_net.PetriNet, tmp_path: pathlib.Path):
+    log = write_log(tmp_path / "log.events", [["a", "b"]] * 3 + [["b"], ["a", "c"]])
+    parameters = simulation_engine.SimulationParameters(
+        simulation_type=simulation_engine.SimulationType.CONFORMANCE, log_path=str(log)
+    )
+
+    result = conformance.PetriNetConformanceEngine().run(net, parameters)
+    assert result.cases == 5
+    assert result.variants == 3
+    assert result.fitting_cases == 3
+    # ["b"]: a missing token in middle and one remaining in start, 1 - (1/2 + 1/2) / 2.
+    # ["a", "c"]: a missing token in end and one remaining in middle, 1 - (1/2 + 1/2) / 2.
+    assert result.fitness == pytest.approx((3 + 0.5 + 0.5) / 5)
+    assert result.deviations == {
+        "b": conformance.NodeDeviations(violations=1),
+        "end": conformance.NodeDeviations(missing=1),
+        "middle": conformance.NodeDeviations(missing=1, remaining=1),
+        "start": conformance.NodeDeviations(remaining=1),
+    }
+    assert result.unmapped_activities == {"c": 1}
+
+
+def test_dcr_replay_from_xes(tmp_path: pathlib.Path):
+    graph = dcr_graph.DcrGraph(id="claims", model_type=process_model.ProcessModelType.DCR_GRAPH)
+    for node_id, name in [(1, "register"), (2, "pay")]:
+        graph.add_node(
+            dcr_graph.DcrGraphNode(id=process_model.NodeId(node_id), position=process_model.Point(x=0, y=0), name=name)
+        )
+    for relation_type in [dcr_graph.DcrRelationType.CONDITION, dcr_graph.DcrRelationType.RESPONSE]:
+        graph.add_edge_from_values(process_model.NodeId(1), process_model.NodeId(2), relation_type=relation_type)
+    events = [
+        event_log.Event(case_id, activity, step)
+        for case_id, trace in enumerate([["register", "pay"], ["pay"], ["register"]])
+        for step, activity in enumerate(trace)
+    ]
+    event_log.write_xes(events, tmp_path / "log.xes")
+    assert list(event_log.read_xes(tmp_path / "log.xes")) == events
+
+    parameters = simulation_engine.SimulationParameters(log_path=str(tmp_path / "log.xes"))
+    result = conformance.DcrConformanceEngine().run(graph, parameters)
+    assert result.fitting_cases == 1
+    assert result.fitness == pytest.approx((1 + 0 + 0.5) / 3)
+    assert result.deviations == {"pay": conformance.NodeDeviations(violations=1, remaining=1)}
+
+
+def test_simulator_runs_conformance(net: petri_net.PetriNet, tmp_path: pathlib.Path):
+    log = write_log(tmp_path / "log.events", [["a", "b"]])
+    simulator = simulation_engine.Simulator()
+    parameters = simulation_engine.SimulationParameters(
+        simulation_type=simulation_engine.SimulationType.CONFORMANCE, log_path=str(log)
+    )
+
+    result = simulator.run_simulation(simulator.queue_simulation(net.id, parameters)).result
+    assert isinstance(result, conformance.ConformanceResult)
+    assert result.fitness == 1
+
+
+def test_logs_outside_the_event_log_directory_are_rejected(tmp_path: pathlib.Path):
+    simulator = simulation_engine.Simulator(event_log_directory=tmp_path / "event_logs")
+
+    for log_path in ["/etc/passwd", str(tmp_path / "event_logs" / ".." / "log.events")]:
+        with pytest.raises(ValueError):
+            simulator.check_log_path(simulation_engine.SimulationParameters(log_path=log_path))
+    simulator.check_log_path(simulation_engine.SimulationParameters(log_path=str(tmp_path / "event_logs" / "1.events")))
+
+
+def test_replay_cache_is_shared_by_workers(
+    net: petri_net.PetriNet, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(conformance.ConformanceEngine, "CACHE_SIZE", 2)
+    monkeypatch.setattr(conformance.ConformanceEngine, "_cache", collections.OrderedDict())
+    log = write_log(tmp_path / "log.events", [["a", "b"], ["b"], ["a", "c"], ["a"]])
+    parameters = simulation_engine.SimulationParameters(
+        simulation_type=simulation_engine.SimulationType.CONFORMANCE, log_path=str(log)
+    )
+    errors = []
+
+    def check_conformance() -> None:
+        try:
+            for _ in range(50):
+                assert conformance.PetriNetConformanceEngine().run(net, parameters).fitting_cases == 1
+        except Exception as error:
+            errors.append(error)
+
+    workers = [threading.Thread(target=check_conformance) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert len(conformance.ConformanceEngine._cache) == 2
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+from src.process_model import dcr_graph
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import dcr_engine
+
+
+def add_event(graph: dcr_graph.DcrGraph, node_id: int, name: str, **marking) -> None:
+    graph.add_node(
+        dcr_graph.DcrGraphNode(
+            id=process_model.NodeId(node_id), position=process_model.Point(x=0, y=0), name=name, **marking
+        )
+    )
+
+
+def add_relation(graph: dcr_graph.DcrGraph, start: int, end: int, relation_type: dcr_graph.DcrRelationType) -> None:
+    graph.add_edge_from_values(process_model.NodeId(start), process_model.NodeId(end), relation_type=relation_type)
+
+
+@pytest.fixture
+def graph():
+    # Register a claim, then pay it (condition). Registering requires a payment (response), and
+    # paying excludes rejecting, which must not happen while a payment is pending (milestone).
+    _graph = dcr_graph.DcrGraph(id="claims", model_type=process_model.ProcessModelType.DCR_GRAPH)
+    add_event(_graph, 1, "register")
+    add_event(_graph, 2, "pay")
+    add_event(_graph, 3, "reject")
+    add_relation(_graph, 1, 2, dcr_graph.DcrRelationType.CONDITION)
+    add_relation(_graph, 1, 2, dcr_graph.DcrRelationType.RESPONSE)
+    add_relation(_graph, 2, 3, dcr_graph.DcrRelationType.EXCLUDE)
+    add_relation(_graph, 2, 3, dcr_graph.DcrRelationType.MILESTONE)
+    return _graph
+
+
+def test_relations(graph: dcr_graph.DcrGraph):
+    executor = dcr_engine.DcrExecutor(graph)
+    register, pay, reject = (executor.index_of(name) for name in ("register", "pay", "reject"))
+
+    assert sorted(executor.enabled) == [register, reject]
+    assert executor.is_accepting
+
+    executor.execute(register)
+    assert sorted(executor.enabled) == [register, pay]
+    assert not executor.is_accepting
+
+    executor.execute(pay)
+    assert sorted(executor.enabled) == [register, pay]
+    assert executor.is_accepting
+    with pytest.raises(ValueError):
+        executor.execute(reject)
+
+
+def test_incremental_enabledness_matches_definition():
+    rng = random.Random(42)
+    graph = dcr_graph.DcrGraph(id="random", model_type=process_model.ProcessModelType.DCR_GRAPH)
+    for node_id in range(30):
+        add_event(graph, node_id, f"e{node_id}", pending=rng.random() < 0.2, included=rng.random() < 0.8)
+    for _ in range(90):
+        add_relation(graph, rng.randrange(30), rng.randrange(30), rng.choice(list(dcr_graph.DcrRelationType)))
+    edges = graph.get_edges()
+    executor = dcr_engine.DcrExecutor(graph)
+    index = {node_id: i for i, node_id in enumerate(executor.event_ids)}
+
+    def expected_enabled() -> set[int]:
+        enabled = {i for i, included in enumerate(executor.included) if included}
+        for edge in edges:
+            start, end = index[edge.start_node_id], index[edge.end_node_id]
+            match edge.relation_type:
+                case dcr_graph.DcrRelationType.CONDITION if executor.included[start] and not executor.executed[start]:
+                    enabled.discard(end)
+                case dcr_graph.DcrRelationType.MILESTONE if executor.included[start] and executor.pending[start]:
+                    enabled.discard(end)
+        return enabled
+
+    for _ in range(200):
+        assert set(executor.enabled) == expected_enabled()
+        assert executor.is_accepting == (not any(p and i for p, i in zip(executor.pending, executor.included)))
+        if not executor.enabled:
+            break
+        executor.execute(rng.choice(executor.enabled))
+
+
+def test_simulator_runs_dcr_graph(graph: dcr_graph.DcrGraph):
+    simulator = simulation_engine.Simulator()
+    simulation = simulator.queue_simulation(
+        graph.id, simulation_engine.SimulationParameters(trace=["register", "reject", "pay"])
+    )
+
+    finished = simulator.run_simulation(simulation, graph)
+    assert finished.status() == simulation_engine.SimulationStatus.FINISHED
+    assert finished.result.violations == [1]
+    assert finished.result.accepting
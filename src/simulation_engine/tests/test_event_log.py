@@ -0,0 +1,82 @@
+import pathlib
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+from src.process_model import flowchart
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import event_log
+
+
+def test_round_trip_across_chunks(tmp_path: pathlib.Path):
+    events = [
+        event_log.Event(case_id, f"activity {step % 7}", step * 0.5) for case_id in range(50) for step in range(9)
+    ]
+    with event_log.EventLogWriter(tmp_path / "log.events", chunk_size=64) as writer:
+        for event in events:
+            writer.append(*event)
+
+    with event_log.EventLogReader(tmp_path / "log.events") as reader:
+        assert len(reader) == len(events)
+        assert reader.activities == [f"activity {i}" for i in range(7)]
+        assert list(reader) == events
+        chunk = next(reader.chunks())
+        assert len(chunk.case_ids) == 64
+        assert chunk.case_ids[63] == 7
+        for view in chunk:
+            view.release()
+
+
+def test_empty_log(tmp_path: pathlib.Path):
+    event_log.EventLogWriter(tmp_path / "log.events").close()
+    assert list(event_log.read_events(tmp_path / "log.events")) == []
+
+    (tmp_path / "other").write_bytes(b"")
+    with pytest.raises(ValueError):
+        event_log.EventLogReader(tmp_path / "other")
+
+
+def test_xes_export(tmp_path: pathlib.Path):
+    events = [event_log.Event(1, "a & b", 0), event_log.Event(1, "c", 1.5), event_log.Event(2, "a & b", 0)]
+    event_log.write_xes(events, tmp_path / "log.xes")
+
+    traces = ElementTree.parse(tmp_path / "log.xes").getroot().findall("{http://www.xes-standard.org/}trace")
+    assert len(traces) == 2
+    first_events = traces[0].findall("{http://www.xes-standard.org/}event")
+    assert [event[0].get("value") for event in first_events] == ["a & b", "c"]
+    assert first_events[1][1].get("value") == "1970-01-01T00:00:01.500000+00:00"
+
+
+def test_simulator_records_events(tmp_path: pathlib.Path):
+    model = flowchart.Flowchart(id="chart", model_type=process_model.ProcessModelType.FLOWCHART)
+    nodes = [(1, flowchart.FlowchartNodeType.START, "start"), (2, flowchart.FlowchartNodeType.END, "end")]
+    for node_id, node_type, name in nodes:
+        model.add_node(
+            flowchart.FlowchartNode(
+                id=process_model.NodeId(node_id),
+                position=process_model.Point(x=0, y=0),
+                name=name,
+                node_type=node_type,
+                duration=1,
+            )
+        )
+    model.add_edge_from_values(process_model.NodeId(1), process_model.NodeId(2))
+    simulator = simulation_engine.Simulator(event_log_directory=tmp_path)
+    simulation = simulator.queue_simulation(
+        model.id, simulation_engine.SimulationParameters(samples=3, record_events=True)
+    )
+
+    result = simulator.run_simulation(simulation, model).result
+    assert list(event_log.read_events(pathlib.Path(result.event_log))) == [
+        event_log.Event(case_id, activity, timestamp)
+        for case_id in range(3)
+        for activity, timestamp in (("start", 0), ("end", 1))
+    ]
+
+    # A simulator that restarted numbering its simulations does not overwrite the log.
+    simulator = simulation_engine.Simulator(event_log_directory=tmp_path)
+    simulation = simulator.queue_simulation(
+        model.id, simulation_engine.SimulationParameters(samples=1, record_events=True)
+    )
+    assert simulator.run_simulation(simulation, model).result.event_log != result.event_log
+    assert len(list(event_log.read_events(pathlib.Path(result.event_log)))) == 6
@@ -0,0 +1,135 @@
+import collections
+import os
+import pathlib
+import threading
+
+import pytest
+from src.process_model import flowchart
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import flowchart_engine
+
+
+def add_node(model: flowchart.Flowchart, node_id: int, node_type: flowchart.FlowchartNodeType, **kwargs) -> None:
+    model.add_node(
+        flowchart.FlowchartNode(
+            id=process_model.NodeId(node_id),
+            position=process_model.Point(x=0, y=0),
+            name=kwargs.pop("name", f"{node_type.value}{node_id}"),
+            node_type=node_type,
+            **kwargs,
+        )
+    )
+
+
+def add_edge(model: flowchart.Flowchart, start: int, end: int, **kwargs) -> None:
+    model.add_edge_from_values(process_model.NodeId(start), process_model.NodeId(end), **kwargs)
+
+
+@pytest.fixture
+def review(tmp_path: pathlib.Path):
+    model = flowchart.Flowchart(id=str(tmp_path / "review.pm"), model_type=process_model.ProcessModelType.FLOWCHART)
+    add_node(model, 1, flowchart.FlowchartNodeType.START)
+    add_node(model, 2, flowchart.FlowchartNodeType.TASK, name="review", duration=2.0)
+    add_node(model, 3, flowchart.FlowchartNodeType.END)
+    add_edge(model, 1, 2)
+    add_edge(model, 2, 3)
+    model.save(pathlib.Path(model.id))
+    return model
+
+
+@pytest.fixture
+def model(review: flowchart.Flowchart):
+    model = flowchart.Flowchart(id="order", model_type=process_model.ProcessModelType.FLOWCHART)
+    add_node(model, 1, flowchart.FlowchartNodeType.START)
+    add_node(model, 2, flowchart.FlowchartNodeType.DECISION, name="large order?")
+    add_node(model, 3, flowchart.FlowchartNodeType.SUBPROCESS, name="approval", subprocess_model_id=review.id)
+    add_node(model, 4, flowchart.FlowchartNodeType.TASK, name="ship", duration=1.0)
+    add_node(model, 5, flowchart.FlowchartNodeType.END)
+    add_edge(model, 1, 2)
+    add_edge(model, 2, 3, probability=0.25)
+    add_edge(model, 2, 4, probability=0.75)
+    add_edge(model, 3, 4)
+    add_edge(model, 4, 5)
+    return model
+
+
+def test_flowchart_paths_and_cycle_times(model: flowchart.Flowchart):
+    parameters = simulation_engine.SimulationParameters(samples=4000, seed=1)
+    result = flowchart_engine.FlowchartEngine().run(model, parameters)
+
+    assert result.completed == 4000
+    paths = {tuple(path.path): path.count for path in result.paths}
+    direct = ("start1", "large order?", "ship", "end5")
+    approved = (
+        "start1",
+        "large order?",
+        "approval",
+        "approval/start1",
+        "approval/review",
+        "approval/end3",
+        "ship",
+        "end5",
+    )
+    assert set(paths) == {direct, approved}
+    assert paths[approved] == pytest.approx(1000, rel=0.1)
+    assert result.cycle_time.min == 1.0
+    assert result.cycle_time.max == 3.0
+
+
+def test_recursive_subprocess_is_rejected(tmp_path: pathlib.Path):
+    model = flowchart.Flowchart(id=str(tmp_path / "loop.pm"), model_type=process_model.ProcessModelType.FLOWCHART)
+    add_node(model, 1, flowchart.FlowchartNodeType.START)
+    add_node(model, 2, flowchart.FlowchartNodeType.SUBPROCESS, subprocess_model_id=model.id)
+    add_edge(model, 1, 2)
+    model.save(pathlib.Path(model.id))
+
+    with pytest.raises(ValueError):
+        flowchart_engine.CompiledFlowchart.compile(model)
+
+
+def test_subprocess_cache_keeps_the_latest_version(
+    review: flowchart.Flowchart, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(flowchart_engine, "SUBPROCESS_CACHE_SIZE", 2)
+    monkeypatch.setattr(flowchart_engine, "_subprocess_cache", collections.OrderedDict())
+    path = pathlib.Path(review.id)
+
+    assert flowchart_engine.load_subprocess(review.id).get_node(process_model.NodeId(2)).duration == 2.0
+    review.get_node(process_model.NodeId(2)).duration = 5.0
+    review.save(path)
+    os.utime(path, ns=(1, 1))
+    assert flowchart_engine.load_subprocess(review.id).get_node(process_model.NodeId(2)).duration == 5.0
+    assert len(flowchart_engine._subprocess_cache) == 1
+
+    for name in ("a.pm", "b.pm"):
+        review.save(tmp_path / name)
+        flowchart_engine.load_subprocess(str(tmp_path / name))
+    assert list(flowchart_engine._subprocess_cache) == [str(tmp_path / "a.pm"), str(tmp_path / "b.pm")]
+
+
+def test_subprocess_cache_is_shared_by_workers(
+    review: flowchart.Flowchart, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(flowchart_engine, "SUBPROCESS_CACHE_SIZE", 2)
+    monkeypatch.setattr(flowchart_engine, "_subprocess_cache", collections.OrderedDict())
+    paths = [str(tmp_path / name) for name in ("a.pm", "b.pm", "c.pm")]
+    for path in paths:
+        review.save(pathlib.Path(path))
+    errors = []
+
+    def load(worker: int) -> None:
+        try:
+            for i in range(100):
+                flowchart_engine.load_subprocess(paths[(worker + i) % len(paths)])
+        except Exception as error:
+            errors.append(error)
+
+    workers = [threading.Thread(target=load, args=(worker,)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert len(flowchart_engine._subprocess_cache) == 2
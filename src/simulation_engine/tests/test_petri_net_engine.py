@@ -0,0 +1,36 @@
+import random
+
+from src.process_model import petri_net
+from src.process_model import process_model
+from src.simulation_engine import petri_net_engine
+
+
+def test_incremental_enabled_transitions_match_definition():
+    rng = random.Random(42)
+    model = petri_net.PetriNet(id="random", model_type=process_model.ProcessModelType.PETRI_NET)
+    for node_id in range(40):
+        node_type = petri_net.NodeType.PLACE if node_id % 2 else petri_net.NodeType.TRANSITION
+        model.add_node(
+            petri_net.PetriNetNode(
+                id=process_model.NodeId(node_id),
+                position=process_model.Point(x=0, y=0),
+                name=f"{node_type.value}{node_id}",
+                node_type=node_type,
+                ball_count=rng.randrange(3) if node_type == petri_net.NodeType.PLACE else 0,
+            )
+        )
+    for _ in range(80):
+        start, end = rng.randrange(40), rng.randrange(40)
+        if start % 2 != end % 2:
+            model.add_edge_from_values(process_model.NodeId(start), process_model.NodeId(end))
+    net = petri_net_engine.CompiledPetriNet(model)
+    game = petri_net_engine.TokenGame(net, random.Random(1))
+
+    for _ in range(500):
+        assert sorted(game._enabled) == net.enabled_transitions(game.marking)
+        if game.step() is None:
+            break
+
+    # A restored game picks the same transitions as the game it was saved from.
+    restored = petri_net_engine.TokenGame.restore(net, game.state())
+    assert [restored.step() for _ in range(50)] == [game.step() for _ in range(50)]
@@ -0,0 +1,93 @@
+import pydantic
+import pytest
+from src.process_model import petri_net
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import replication
+from src.simulation_engine import statistics
+
+
+@pytest.fixture
+def model():
+    # A token moves back and forth between two places, unless the absorbing transition consumes it.
+    _model = petri_net.PetriNet(id="net", model_type=process_model.ProcessModelType.PETRI_NET)
+    nodes = [
+        (1, petri_net.NodeType.PLACE, 1),
+        (2, petri_net.NodeType.TRANSITION, 0),
+        (3, petri_net.NodeType.PLACE, 0),
+        (4, petri_net.NodeType.TRANSITION, 0),
+        (5, petri_net.NodeType.TRANSITION, 0),
+    ]
+    for node_id, node_type, ball_count in nodes:
+        _model.add_node(
+            petri_net.PetriNetNode(
+                id=process_model.NodeId(node_id),
+                position=process_model.Point(x=0, y=0),
+                name=f"{node_type.value}{node_id}",
+                node_type=node_type,
+                ball_count=ball_count,
+            )
+        )
+    for start, end in [(1, 2), (2, 3), (3, 4), (4, 1), (3, 5)]:
+        _model.add_edge_from_values(process_model.NodeId(start), process_model.NodeId(end))
+    return _model
+
+
+def test_streaming_statistics_merge():
+    values = [float(value) for value in range(1, 101)]
+    left, right, combined = (statistics.StreamingStatistics() for _ in range(3))
+    for value in values[:30]:
+        left.add(value)
+    for value in values[30:]:
+        right.add(value)
+    for value in values:
+        combined.add(value)
+    left.merge(right)
+
+    assert left.count == 100
+    assert left.mean == pytest.approx(50.5)
+    assert left.variance == pytest.approx(combined.variance)
+    assert left.quantile(0.5) == pytest.approx(50, rel=0.02)
+    assert left.summary().histogram == combined.summary().histogram
+
+
+def test_replications_are_independent_of_workers(model: petri_net.PetriNet):
+    engine = simulation_engine.PetriNetEngine()
+    parameters = simulation_engine.SimulationParameters(replications=400, seed=7)
+
+    serial = replication.ReplicationRunner(workers=1).run(engine, model, parameters)
+    parallel = replication.ReplicationRunner(workers=2).run(engine, model, parameters)
+
+    assert serial.replications == 400
+    assert serial.metrics.keys() == {"throughput", "deadlocked", "tokens.place1", "tokens.place3"}
+    # Every replication ends in deadlock, after an odd number of steps.
+    assert serial.metrics["deadlocked"].mean == 1
+    assert serial.metrics["throughput"].min == 2
+    assert serial.metrics["throughput"].mean == pytest.approx(parallel.metrics["throughput"].mean)
+    assert serial.metrics["throughput"].histogram == parallel.metrics["throughput"].histogram
+
+
+def test_simulator_runs_replications(model: petri_net.PetriNet):
+    simulator = simulation_engine.Simulator()
+    simulation = simulator.queue_simulation(
+        model.id, simulation_engine.SimulationParameters(replications=10, workers=1, seed=1)
+    )
+
+    result = simulator.run_simulation(simulation, model).result
+    assert isinstance(result, replication.ReplicatedSimulationResult)
+    assert result.master_seed == 1
+    assert result.metrics["throughput"].count == 10
+
+
+def test_unsupported_replications_are_rejected():
+    with pytest.raises(pydantic.ValidationError):
+        simulation_engine.SimulationParameters(replications=2, record_events=True)
+
+    simulation_engine.check_parameters(
+        process_model.ProcessModelType.PETRI_NET, simulation_engine.SimulationParameters(replications=2)
+    )
+    state_space = simulation_engine.SimulationParameters(
+        simulation_type=simulation_engine.SimulationType.STATE_SPACE, replications=2
+    )
+    with pytest.raises(ValueError):
+        simulation_engine.check_parameters(process_model.ProcessModelType.PETRI_NET, state_space)
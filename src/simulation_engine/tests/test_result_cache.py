@@ -0,0 +1,88 @@
+import pathlib
+import threading
+
+import pytest
+from src.process_model import petri_net
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import result_cache
+
+
+@pytest.fixture
+def model_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    path = tmp_path / "net.pm"
+    model = petri_net.PetriNet(id=str(path), model_type=process_model.ProcessModelType.PETRI_NET)
+    model.add_node_from_values(x=0, y=0, node_type=petri_net.NodeType.PLACE, ball_count=1)
+    model.save(path)
+    return path
+
+
+def test_queue_returns_cached_result(model_path: pathlib.Path, tmp_path: pathlib.Path):
+    simulator = simulation_engine.Simulator(result_cache=result_cache.ResultCache(tmp_path / "cache"))
+    parameters = simulation_engine.SimulationParameters(
+        simulation_type=simulation_engine.SimulationType.STATE_SPACE, seed=1
+    )
+
+    queued = simulator.queue_simulation(process_model.ModelId(str(model_path)), parameters)
+    assert queued.status() == simulation_engine.SimulationStatus.QUEUED
+    finished = simulator.run_simulation(queued)
+
+    # A new cache on the same directory sees the stored result.
+    simulator = simulation_engine.Simulator(result_cache=result_cache.ResultCache(tmp_path / "cache"))
+    cached = simulator.queue_simulation(process_model.ModelId(str(model_path)), parameters)
+    assert cached.status() == simulation_engine.SimulationStatus.FINISHED
+    assert cached.result == finished.result
+    assert isinstance(cached.result, simulation_engine.StateSpaceResult)
+
+    other_parameters = parameters.copy(update={"max_states": 2})
+    assert simulator.queue_simulation(process_model.ModelId(str(model_path)), other_parameters).status() == (
+        simulation_engine.SimulationStatus.QUEUED
+    )
+
+
+def test_unseeded_results_are_not_cached(model_path: pathlib.Path, tmp_path: pathlib.Path):
+    simulator = simulation_engine.Simulator(result_cache=result_cache.ResultCache(tmp_path / "cache"))
+    parameters = simulation_engine.SimulationParameters(simulation_type=simulation_engine.SimulationType.STATE_SPACE)
+
+    simulator.run_simulation(simulator.queue_simulation(process_model.ModelId(str(model_path)), parameters))
+    assert len(simulator.result_cache) == 0
+    assert simulator.queue_simulation(process_model.ModelId(str(model_path)), parameters).status() == (
+        simulation_engine.SimulationStatus.QUEUED
+    )
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: pathlib.Path):
+    cache = result_cache.ResultCache(tmp_path, max_entries=2)
+    cache.put("a", simulation_engine.SimulationResult())
+    cache.put("b", simulation_engine.SimulationResult())
+    assert cache.get("a") is not None
+    cache.put("c", simulation_engine.SimulationResult())
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.json", "c.json"]
+
+
+def test_cache_is_shared_by_threads(tmp_path: pathlib.Path):
+    cache = result_cache.ResultCache(tmp_path, max_entries=4)
+    errors = []
+
+    def use_cache(thread: int) -> None:
+        try:
+            for i in range(200):
+                key = str((thread + i) % 8)
+                if cache.get(key) is None:
+                    cache.put(key, simulation_engine.SimulationResult())
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=use_cache, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(cache) <= 4
+    assert cache._size == sum(cache._entries.values())
@@ -0,0 +1,70 @@
+import pytest
+from src.process_model import process_model
+from src import simulation_engine
+
+
+def submit(scheduler: simulation_engine.Scheduler, owner: str, **kwargs) -> simulation_engine.QueuedSimulation:
+    # The models do not exist, so the simulations fail immediately when run.
+    parameters = simulation_engine.SimulationParameters()
+    return scheduler.submit(process_model.ModelId(f"{owner}.pm"), parameters, owner, **kwargs)
+
+
+def run_all(scheduler: simulation_engine.Scheduler) -> list[str]:
+    owners = []
+    while (finished := scheduler.run_next(timeout=0)) is not None:
+        owners.append(finished.owner)
+    return owners
+
+
+def test_owners_share_fairly():
+    scheduler = simulation_engine.Scheduler(simulation_engine.Simulator())
+    for _ in range(4):
+        submit(scheduler, "burst")
+    submit(scheduler, "other")
+
+    # The burst was submitted first, but the other owner does not wait for all of it.
+    assert run_all(scheduler)[:3].count("other") == 1
+    assert scheduler.runs == {"burst": 4, "other": 1}
+
+
+def test_interactive_before_batch():
+    scheduler = simulation_engine.Scheduler(simulation_engine.Simulator())
+    submit(scheduler, "batch")
+    submit(scheduler, "interactive", priority=simulation_engine.Priority.INTERACTIVE)
+
+    assert run_all(scheduler) == ["interactive", "batch"]
+
+
+def test_batch_leaves_a_worker_for_interactive():
+    scheduler = simulation_engine.Scheduler(simulation_engine.Simulator(), workers=2)
+    first, second = submit(scheduler, "batch"), submit(scheduler, "batch")
+
+    assert scheduler._pick() == first
+    assert scheduler._pick() is None
+    interactive = submit(scheduler, "user", priority=simulation_engine.Priority.INTERACTIVE)
+    assert scheduler._pick() == interactive
+
+
+def test_admission_control():
+    scheduler = simulation_engine.Scheduler(simulation_engine.Simulator(), max_queued=3, max_queued_per_owner=2)
+    submit(scheduler, "a")
+    submit(scheduler, "a")
+    with pytest.raises(simulation_engine.QueueFullError):
+        submit(scheduler, "a")
+    submit(scheduler, "b")
+    with pytest.raises(simulation_engine.QueueFullError):
+        submit(scheduler, "c")
+
+    scheduler.run_next(timeout=0)
+    submit(scheduler, "c")
+
+
+def test_workers_run_queued_simulations():
+    simulator = simulation_engine.Simulator()
+    scheduler = simulation_engine.Scheduler(simulator, workers=2)
+    scheduler.start()
+    simulation = submit(scheduler, "owner")
+    while simulator.get_simulation(simulation.id).status() != simulation_engine.SimulationStatus.FAILED:
+        simulator.wait_for_changes(simulator.version, timeout=10)
+    scheduler.stop()
+    assert scheduler.runs == {"owner": 1}
@@ -0,0 +1,60 @@
+import pathlib
+import threading
+
+from src.process_model import process_model
+from src import simulation_engine
+
+
+def queue(simulator: simulation_engine.Simulator, model_id: str) -> simulation_engine.QueuedSimulation:
+    return simulator.queue_simulation(process_model.ModelId(model_id), simulation_engine.SimulationParameters())
+
+
+def test_pagination_and_filters():
+    simulator = simulation_engine.Simulator()
+    simulations = [queue(simulator, f"model{i % 2}") for i in range(7)]
+    simulator.start_simulation(simulations[4])
+
+    first_page = simulator.list_simulations(limit=3)
+    assert [simulation.id for simulation in first_page] == [6, 5, 4]
+    second_page = simulator.list_simulations(before=first_page[-1].id, limit=3)
+    assert [simulation.id for simulation in second_page] == [3, 2, 1]
+
+    assert [simulation.id for simulation in simulator.list_simulations(model_id="model0")] == [6, 4, 2, 0]
+    running = simulator.list_simulations(status=simulation_engine.SimulationStatus.RUNNING)
+    assert [simulation.id for simulation in running] == [4]
+    assert simulator.get_simulation(4) == running[0]
+
+
+def test_changes_since_version():
+    simulator = simulation_engine.Simulator()
+    first, second = queue(simulator, "model"), queue(simulator, "model")
+    version, changed = simulator.changes_since(0)
+    assert [simulation.id for simulation in changed] == [first.id, second.id]
+
+    simulator.start_simulation(first)
+    new_version, changed = simulator.changes_since(version)
+    assert new_version == version + 1
+    assert [simulation.status() for simulation in changed] == [simulation_engine.SimulationStatus.RUNNING]
+    assert simulator.changes_since(new_version) == (new_version, [])
+
+
+def test_wait_for_changes_wakes_up_on_change():
+    simulator = simulation_engine.Simulator()
+    version = simulator.version
+    timer = threading.Timer(0.05, queue, (simulator, "model"))
+    timer.start()
+
+    new_version, changed = simulator.wait_for_changes(version, timeout=10)
+    timer.join()
+    assert new_version == version + 1
+    assert len(changed) == 1
+
+
+def test_ids_are_not_reused_after_a_restart(tmp_path: pathlib.Path):
+    simulator = simulation_engine.Simulator(id_path=tmp_path / "simulation_id")
+    simulator.ID_BLOCK_SIZE = 2
+    ids = [queue(simulator, "model").id for _ in range(3)]
+    assert ids == [0, 1, 2]
+
+    simulator = simulation_engine.Simulator(id_path=tmp_path / "simulation_id")
+    assert queue(simulator, "model").id == 4
@@ -0,0 +1,104 @@
+import collections
+import threading
+
+import pytest
+from src.process_model import petri_net
+from src.process_model import process_model
+from src import simulation_engine
+from src.simulation_engine import state_space
+
+
+def add_node(model: petri_net.PetriNet, node_id: int, node_type: petri_net.NodeType, **kwargs) -> None:
+    model.add_node(
+        petri_net.PetriNetNode(
+            id=process_model.NodeId(node_id),
+            position=process_model.Point(x=0, y=0),
+            name=f"{node_type.value}{node_id}",
+            node_type=node_type,
+            **kwargs,
+        )
+    )
+
+
+def add_edge(model: petri_net.PetriNet, start: int, end: int) -> None:
+    model.add_edge_from_values(process_model.NodeId(start), process_model.NodeId(end))
+
+
+@pytest.fixture
+def model():
+    # place1 -> transition2 -> place3 (accepting), starting with two tokens.
+    _model = petri_net.PetriNet(id="net", model_type=process_model.ProcessModelType.PETRI_NET)
+    add_node(_model, 1, petri_net.NodeType.PLACE, ball_count=2)
+    add_node(_model, 2, petri_net.NodeType.TRANSITION)
+    add_node(_model, 3, petri_net.NodeType.PLACE, accepting_state="done")
+    add_edge(_model, 1, 2)
+    add_edge(_model, 2, 3)
+    return _model
+
+
+def test_bounded_net(model: petri_net.PetriNet):
+    result = state_space.PetriNetStateSpaceEngine().run(model, simulation_engine.SimulationParameters())
+
+    assert result.states == 3
+    assert result.complete
+    assert result.bounded
+    assert result.place_bounds == {"place1": 2, "place3": 2}
+    assert result.deadlocks == 1
+    assert result.deadlock_examples == [{"place1": 0, "place3": 2}]
+    assert result.reachable_accepting_places == ["place3"]
+
+
+def test_unbounded_net(model: petri_net.PetriNet):
+    # A transition without inputs produces tokens forever.
+    add_node(model, 4, petri_net.NodeType.TRANSITION)
+    add_edge(model, 4, 1)
+
+    truncated = state_space.PetriNetStateSpaceEngine().run(model, simulation_engine.SimulationParameters(max_states=50))
+    assert not truncated.complete
+    assert truncated.bounded is None
+    assert truncated.states == 50
+
+    coverability = state_space.PetriNetStateSpaceEngine().run(
+        model, simulation_engine.SimulationParameters(coverability=True)
+    )
+    assert coverability.complete
+    assert coverability.bounded is False
+    assert coverability.place_bounds == {"place1": None, "place3": None}
+    assert coverability.deadlocks == 0
+
+
+def test_results_are_cached_per_model_version(model: petri_net.PetriNet):
+    simulator = simulation_engine.Simulator()
+    parameters = simulation_engine.SimulationParameters(simulation_type=simulation_engine.SimulationType.STATE_SPACE)
+
+    first = simulator.run_simulation(simulator.queue_simulation(model.id, parameters), model).result
+    assert simulator.run_simulation(simulator.queue_simulation(model.id, parameters), model).result == first
+
+    model.get_node(process_model.NodeId(1)).ball_count = 3
+    assert simulator.run_simulation(simulator.queue_simulation(model.id, parameters), model).result.states == 4
+
+
+def test_cache_is_shared_by_workers(model: petri_net.PetriNet, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(state_space.PetriNetStateSpaceEngine, "CACHE_SIZE", 2)
+    monkeypatch.setattr(state_space.PetriNetStateSpaceEngine, "_cache", collections.OrderedDict())
+    engine = state_space.PetriNetStateSpaceEngine()
+    errors = []
+
+    def explore(worker: int) -> None:
+        try:
+            for i in range(200):
+                parameters = simulation_engine.SimulationParameters(
+                    simulation_type=simulation_engine.SimulationType.STATE_SPACE, max_states=10 + (worker + i) % 4
+                )
+                assert engine.run(model, parameters).states == 3
+        except Exception as error:
+            errors.append(error)
+
+    workers = [threading.Thread(target=explore, args=(worker,)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert len(engine._cache) == 2
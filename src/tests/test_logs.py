@@ -0,0 +1,63 @@
+import io
+import logging
+
+import pytest
+
+from src import logs
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_sampler_logs_one_in_every_per_key(caplog: pytest.LogCaptureFixture):
+    logger = logging.getLogger("test_sampler")
+    sampler = logs.Sampler(logger, every=3)
+    with caplog.at_level(logging.INFO, logger="test_sampler"):
+        for _ in range(4):
+            sampler.log("move_node", "command command_type=%s", "move_node")
+        sampler.log("undo", "undo")
+    assert caplog.messages == [
+        "command command_type=move_node sampled=1/3 count=1",
+        "command command_type=move_node sampled=1/3 count=4",
+        "undo sampled=1/3 count=1",
+    ]
+
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG, logger="test_sampler"):
+        sampler.log("move_node", "command command_type=%s", "move_node")
+    assert caplog.messages == ["command command_type=move_node"]
+
+
+def test_configure_writes_through_queue(root_logger: logging.Logger):
+    stream = io.StringIO()
+    listener = logs.configure("INFO", stream)
+    logging.getLogger("test_configure").info("joined session=%s", "model")
+    logging.getLogger("test_configure").debug("not written")
+    listener.stop()
+    assert stream.getvalue().endswith("INFO test_configure joined session=model\n")
+
+
+def test_configure_again_replaces_the_listener(root_logger: logging.Logger):
+    first_stream, second_stream = io.StringIO(), io.StringIO()
+    first_listener = logs.configure("INFO", first_stream)
+    logging.getLogger("test_configure").info("first")
+    second_listener = logs.configure("INFO", second_stream)
+    logging.getLogger("test_configure").info("second")
+    second_listener.stop()
+
+    assert first_listener._thread is None
+    assert first_stream.getvalue().endswith("first\n")
+    assert second_stream.getvalue().endswith("second\n")
+
+
+def test_set_level(root_logger: logging.Logger):
+    logs.set_level("test_set_level", "debug")
+    assert logs.levels()["test_set_level"] == "DEBUG"
+    with pytest.raises(ValueError):
+        logs.set_level("test_set_level", "chatty")
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from src import metrics
+
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+
+def test_render_counters_and_gauges(registry: metrics.Registry):
+    requests = metrics.Counter("requests_total", "Requests.", labelnames=("method",), registry=registry)
+    requests.labels("GET").inc()
+    requests.labels("GET").inc(2)
+    requests.labels('P"OST').inc()
+    metrics.Gauge("sessions", "Open sessions.", registry=registry, function=lambda: 3)
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{method="GET"} 3.0',
+        'requests_total{method="P\\"OST"} 1.0',
+        "# HELP sessions Open sessions.",
+        "# TYPE sessions gauge",
+        "sessions 3.0",
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registry: metrics.Registry):
+    histogram = metrics.Histogram("size_bytes", "Sizes.", registry=registry, buckets=(10, 100))
+    for value in [5, 10, 50, 1000]:
+        histogram.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'size_bytes_bucket{le="10.0"} 2.0',
+        'size_bytes_bucket{le="100.0"} 3.0',
+        'size_bytes_bucket{le="+Inf"} 4.0',
+        "size_bytes_sum 1065.0",
+        "size_bytes_count 4.0",
+    ]
+
+
+def test_labels_must_match(registry: metrics.Registry):
+    counter = metrics.Counter("commands_total", "Commands.", labelnames=("command_type",), registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("move_node", "extra")
+    with pytest.raises(ValueError):
+        metrics.Counter("commands_total", "Commands again.", registry=registry)
+
+
+def test_serve(registry: metrics.Registry):
+    metrics.Gauge("sessions", "Open sessions.", registry=registry).set(2)
+
+    async def scrape(path: str) -> bytes:
+        server = await metrics.serve("127.0.0.1", 0, registry)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname())
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response
+
+    response = asyncio.run(scrape("/metrics"))
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert response.endswith(b"sessions 2.0\n")
+    assert asyncio.run(scrape("/")).startswith(b"HTTP/1.1 404")
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from src import profiling
+
+
+def busy(name: str, stop: threading.Event) -> None:
+    while not stop.is_set():
+        spin()
+
+
+def spin() -> None:
+    deadline = time.perf_counter() + 0.001
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_profile_only_matching_calls():
+    profiler = profiling.Profiler(interval=0.001)
+    stop = threading.Event()
+    threads = [threading.Thread(target=busy, args=(name, stop)) for name in ["profiled", "other"]]
+    for thread in threads:
+        thread.start()
+    try:
+        profile = profiler.start(
+            "busy", profiling.in_call(busy, lambda frame_locals: frame_locals["name"] == "profiled"), 0.2
+        )
+        assert profile.done.wait(5)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert profile.samples > 0
+    # Samples of the other thread would double the samples at the same interval.
+    assert profile.samples < 0.2 / 0.001 * 1.5
+    for line in profile.folded().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("busy (")
+        assert int(count) > 0
+    assert any(";spin (" in line for line in profile.folded().splitlines())
+    assert profiler._thread is None
+
+
+def test_active_profiles_are_limited():
+    profiler = profiling.Profiler(interval=0.001)
+    profiler.MAX_ACTIVE = 1
+    profile = profiler.start("nothing", lambda frame: False, 0.05)
+    with pytest.raises(profiling.TooManyProfilesError):
+        profiler.start("nothing", lambda frame: False, 0.05)
+
+    assert profile.done.wait(5)
+    profiler.start("nothing", lambda frame: False, 0)